@@ -1,15 +1,26 @@
 """
 Main Flask application for the Multi-Agent Chatbot system
 """
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash, g, Response
 from flask_cors import CORS
+import hmac
 import os
 import logging
+import random
 import secrets
+import sys
+import threading
+from contextlib import nullcontext
 from functools import wraps
 import time
 
-from server.multi_agent_system import setup_swarm, process_query
+from server.admission import AdmissionRejected, admission_controller
+from server.config import (
+    SWARM_WARMUP, SQL_ASYNC_ENABLED, ADMISSION_ENABLED, RESPONSE_COMPRESSION_ENABLED, RESPONSE_COMPRESSION_MIN_BYTES,
+    PROFILE_ADMIN_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_SAMPLE_MEMORY
+)
+from server.profiling import RequestProfile, profile_store, to_folded
+from server.utils.compression import choose_encoding, compress, compute_etag
 
 # Configure logging
 logging.basicConfig(
@@ -26,14 +37,41 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes session lifetime
 # Only allow CORS for API endpoints
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# Initialize the swarm once
-try:
-    logger.info("Initializing global swarm...")
-    global_swarm = setup_swarm()
-    logger.info("Global swarm initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize global swarm: {str(e)}")
-    global_swarm = None
+# The swarm pulls in LangGraph, LangChain, Snowflake and GitHub, so it is built
+# on first use (or by a warm-up thread) instead of at import time
+global_swarm = None
+swarm_error = None
+swarm_lock = threading.Lock()
+swarm_warmup_thread = None
+
+def get_global_swarm():
+    """Build the shared swarm on first call and return it (None if setup failed)"""
+    global global_swarm, swarm_error
+    if global_swarm is None:
+        with swarm_lock:
+            if global_swarm is None:
+                from server.multi_agent_system import setup_swarm
+                try:
+                    logger.info("Initializing global swarm...")
+                    global_swarm = setup_swarm()
+                    swarm_error = None
+                    logger.info("Global swarm initialized successfully")
+                except Exception as e:
+                    logger.error(f"Failed to initialize global swarm: {str(e)}")
+                    swarm_error = str(e)
+    return global_swarm
+
+def start_swarm_warmup():
+    """Build the swarm in a background thread so startup does not wait for it"""
+    global swarm_warmup_thread
+    if global_swarm is None and (swarm_warmup_thread is None or not swarm_warmup_thread.is_alive()):
+        swarm_warmup_thread = threading.Thread(target=get_global_swarm, name="swarm-warmup", daemon=True)
+        swarm_warmup_thread.start()
+
+if SWARM_WARMUP == 'background':
+    start_swarm_warmup()
+elif SWARM_WARMUP == 'eager':
+    get_global_swarm()
 
 # Store a mapping of thread_ids to their respective swarm instances
 thread_swarms = {}
@@ -52,6 +90,80 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def is_profile_admin():
+    """Whether the request carries the profiling admin token (X-Admin-Token)"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(PROFILE_ADMIN_TOKEN) and hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode())
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_profile_admin():
+            return jsonify({'status': 'error', 'message': 'Not found'}), 404
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.before_request
+def start_request_profile():
+    """Profile requests sent by an admin with X-Profile (cpu or memory) and a sample of chat requests"""
+    requested = request.headers.get('X-Profile', '').lower()
+    if requested and is_profile_admin():
+        trigger, memory = 'header', requested == 'memory'
+    elif PROFILE_SAMPLE_RATE > 0 and request.path == '/api/chat' and random.random() < PROFILE_SAMPLE_RATE:
+        trigger, memory = 'sampled', PROFILE_SAMPLE_MEMORY
+    else:
+        return
+    label = f"{request.method} {request.path}"
+    g.profile = RequestProfile(label, session.get('user_id'), trigger, memory).start()
+
+def _save_request_profile(status_code):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return None
+    profile_store.save(profile.stop(), status_code)
+    logger.info(f"Saved profile {profile.profile_id} of {profile.label} ({profile.duration_ms} ms)")
+    return profile
+
+# Registered before the compression hook so that it runs after it and the profile includes compression
+@app.after_request
+def finish_request_profile(response):
+    profile = _save_request_profile(response.status_code)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.profile_id
+    return response
+
+@app.teardown_request
+def discard_request_profile(exc):
+    # Requests that failed before after_request ran still stop their profiler
+    _save_request_profile(500)
+
+@app.after_request
+def compress_api_response(response):
+    """Compress JSON API responses and answer repeated GETs with 304 Not Modified"""
+    if (not RESPONSE_COMPRESSION_ENABLED or not request.path.startswith('/api/')
+            or response.direct_passthrough or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers or response.status_code not in (200, 201)):
+        return response
+
+    body = response.get_data()
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if len(body) < RESPONSE_COMPRESSION_MIN_BYTES:
+        encoding = None
+
+    if request.method == 'GET':
+        etag = compute_etag(body, encoding)
+        response.set_etag(etag)
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            response.set_data(b'')
+            return response
+
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     error = None
@@ -127,18 +239,10 @@ def chat():
         query = data.get('message', '')
         user_id = session.get('user_id', 'default_user')  # Use session user ID
         thread_id = data.get('thread_id', 'default_thread')
+        structured = data.get('format') == 'structured'
 
         logger.info(f"Received chat request from user {user_id}, thread {thread_id}")
 
-        # Create a new swarm instance for each thread if it doesn't exist
-        thread_key = f"{user_id}:{thread_id}"
-        if thread_key not in thread_swarms:
-            logger.info(f"Creating new swarm for thread {thread_key}")
-            if global_swarm:
-                thread_swarms[thread_key] = global_swarm
-            else:
-                thread_swarms[thread_key] = setup_swarm()
-
         # Determine agent flow based on query content
         if "python" in query.lower():
             all_trans = [
@@ -152,22 +256,64 @@ def chat():
         else:
             all_trans = []
 
-        final_response = ''
-        agent_outputs = {}
+        # Chains make four model calls, so they queue separately from single queries
+        lane = 'long' if len(all_trans) > 1 else 'short'
+        admission = admission_controller.admit(user_id, lane, cost=max(1, len(all_trans))) \
+            if ADMISSION_ENABLED else nullcontext()
+        with admission:
+            from server.multi_agent_system import setup_swarm, process_query
+
+            # Create a new swarm instance for each thread if it doesn't exist
+            thread_key = f"{user_id}:{thread_id}"
+            if thread_key not in thread_swarms:
+                logger.info(f"Creating new swarm for thread {thread_key}")
+                swarm = get_global_swarm()
+                if swarm:
+                    thread_swarms[thread_key] = swarm
+                else:
+                    thread_swarms[thread_key] = setup_swarm()
+
+            final_response = ''
+            agent_outputs = {}
+            test_results = None
+            artifacts = {}
+            # Structured clients get per-agent sections instead of one concatenated string
+            sections = [] if structured else None
         
-        if all_trans:
-            # Process through all the agents in sequence
-            for i in range(len(all_trans)):
-                query = all_trans[i]
-                response, agent_outputs = process_query(thread_swarms[thread_key], query, user_id, thread_id, agent_outputs)
-                final_response += response + "\n\n"
-        else:
-            # Just process the single query directly
-            final_response, agent_outputs = process_query(thread_swarms[thread_key], query, user_id, thread_id, {})
-
-        return jsonify({
-            'response': final_response
+            if all_trans:
+                # Process through all the agents in sequence
+                for i in range(len(all_trans)):
+                    query = all_trans[i]
+                    response, agent_outputs = process_query(
+                        thread_swarms[thread_key], query, user_id, thread_id, agent_outputs,
+                        upcoming=all_trans[i + 1:], sections=sections
+                    )
+                    final_response += response + "\n\n"
+                    # Later stages reset agent_outputs, so keep the test results now
+                    test_results = agent_outputs.get('qa_results', test_results)
+                    artifacts.update(agent_outputs.get('artifacts', {}))
+            else:
+                # Just process the single query directly
+                final_response, agent_outputs = process_query(
+                    thread_swarms[thread_key], query, user_id, thread_id, {}, sections=sections
+                )
+                artifacts.update(agent_outputs.get('artifacts', {}))
+
+        result = {'sections': sections} if structured else {'response': final_response}
+        # Also rendered as a "tests" block in the QA section of structured responses
+        if test_results is not None:
+            result['test_results'] = test_results
+        if artifacts:
+            result['artifacts'] = artifacts
+        return jsonify(result)
+    except AdmissionRejected as e:
+        logger.info(f"Shedding chat request from user {user_id}: {e.reason}")
+        response = jsonify({
+            'error': e.reason,
+            'response': f"The service is busy. Please retry in {e.retry_after} seconds."
         })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         return jsonify({
@@ -185,10 +331,26 @@ def reset_chat():
 
         # Reset the swarm for this thread
         thread_key = f"{user_id}:{thread_id}"
+
+        # Nothing can be in flight if the agent system was never loaded
+        multi_agent_system = sys.modules.get('server.multi_agent_system')
+        if multi_agent_system is not None:
+            # A per-thread swarm takes the thread's history with it; the global one keeps it
+            swarm = thread_swarms.get(thread_key)
+            multi_agent_system.reset_thread_state(
+                user_id, thread_id, swarm if swarm is not None and swarm is global_swarm else None
+            )
         if thread_key in thread_swarms:
             logger.info(f"Resetting swarm for thread {thread_key}")
             del thread_swarms[thread_key]
 
+        # Stop warehouse queries the thread still has running (from any worker)
+        if SQL_ASYNC_ENABLED:
+            from server.utils.async_queries import async_queries
+            cancelled = async_queries.cancel_thread(user_id, thread_id)
+            if cancelled:
+                logger.info(f"Cancelled {cancelled} running queries for thread {thread_key}")
+
         return jsonify({
             'status': 'success',
             'message': 'Chat history reset'
@@ -200,13 +362,159 @@ def reset_chat():
             'message': f"Error resetting chat: {str(e)}"
         }), 500
 
+@app.route('/api/queries', methods=['GET'])
+@login_required
+def list_queries():
+    """List the user's asynchronous queries, optionally for one thread"""
+    from server.utils.async_queries import async_queries
+
+    user_id = session.get('user_id', 'default_user')
+    thread_id = request.args.get('thread_id')
+    return jsonify({'queries': async_queries.list(user_id, thread_id)})
+
+@app.route('/api/queries/<query_id>', methods=['GET'])
+@login_required
+def get_query(query_id):
+    """Status and, once finished, results of an asynchronous query (?wait=N long-polls)"""
+    from server.utils.async_queries import async_queries
+
+    user_id = session.get('user_id', 'default_user')
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), 30.0)
+    except ValueError:
+        wait = 0.0
+    result = async_queries.get(query_id, user_id, wait=wait)
+    if result is None:
+        return jsonify({'status': 'error', 'message': 'Unknown query'}), 404
+    return jsonify(result)
+
+@app.route('/api/queries/<query_id>', methods=['DELETE'])
+@login_required
+def cancel_query(query_id):
+    """Cancel a running asynchronous query"""
+    from server.utils.async_queries import async_queries
+
+    user_id = session.get('user_id', 'default_user')
+    if not async_queries.cancel(query_id, user_id):
+        return jsonify({'status': 'error', 'message': 'Query is unknown or no longer running'}), 404
+    return jsonify({'status': 'success', 'message': 'Query cancelled'})
+
+@app.route('/api/artifacts', methods=['GET'])
+@login_required
+def list_artifacts():
+    """List the artifacts the user's conversations produced (?thread_id=, ?kind=)"""
+    from server.utils.artifact_store import artifact_store
+
+    user_id = session.get('user_id', 'default_user')
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    artifacts = artifact_store.list(user_id, request.args.get('thread_id'), request.args.get('kind'), limit)
+    return jsonify({'artifacts': artifacts})
+
+@app.route('/api/artifacts/<artifact_hash>', methods=['GET'])
+@login_required
+def get_artifact(artifact_hash):
+    """Content and metadata of an artifact by hash, hash prefix or artifact: reference"""
+    from server.utils.artifact_store import artifact_store
+
+    user_id = session.get('user_id', 'default_user')
+    info = artifact_store.info(artifact_hash)
+    if info is None or not artifact_store.is_owner(info['hash'], user_id):
+        return jsonify({'status': 'error', 'message': 'Unknown artifact'}), 404
+    content = artifact_store.get(info['hash'])
+    if content is None:
+        return jsonify({'status': 'error', 'message': 'Artifact was evicted'}), 410
+    # last_access is left out so the entity tag stays stable
+    info.pop('last_access')
+    response = jsonify({**info, 'content': content})
+    # Content-addressed, so the body behind a full hash never changes
+    if info['hash'] == artifact_hash:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """Summaries of the most recent request profiles (admin only)"""
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        limit = 100
+    return jsonify({'profiles': profile_store.list(limit)})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def download_profile(profile_id):
+    """One request profile as JSON, or as collapsed stacks for flame graph tools with ?format=folded"""
+    data = profile_store.load(profile_id)
+    if data is None:
+        return jsonify({'status': 'error', 'message': 'Unknown profile'}), 404
+    if request.args.get('format') == 'folded':
+        return Response(to_folded(data), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename="{profile_id}.folded"'
+        })
+    return jsonify(data)
+
+@app.route('/api/metrics', methods=['GET'])
+@login_required
+def metrics():
+    """Report runtime counters of the subsystems that have been loaded"""
+    data = {'swarm_ready': global_swarm is not None}
+
+    if ADMISSION_ENABLED:
+        data['admission'] = admission_controller.get_stats()
+
+    endpoint_pool = sys.modules.get('server.agents.endpoint_pool')
+    if endpoint_pool is not None:
+        data['model_endpoints'] = endpoint_pool.get_endpoint_stats()
+
+    output_budget = sys.modules.get('server.agents.output_budget')
+    if output_budget is not None:
+        data['output_budgets'] = output_budget.get_output_budget_stats()
+
+    model_tiering = sys.modules.get('server.agents.model_tiering')
+    if model_tiering is not None:
+        data['model_tiers'] = model_tiering.get_tiering_stats()
+
+    multi_agent_system = sys.modules.get('server.multi_agent_system')
+    if multi_agent_system is not None:
+        data['speculation'] = multi_agent_system.speculative_executor.get_stats()
+
+    async_query_module = sys.modules.get('server.utils.async_queries')
+    if async_query_module is not None:
+        data['async_queries'] = async_query_module.async_queries.get_stats()
+
+    artifact_store_module = sys.modules.get('server.utils.artifact_store')
+    if artifact_store_module is not None:
+        data['artifacts'] = artifact_store_module.artifact_store.get_stats()
+
+    return jsonify(data)
+
 @app.route('/health', methods=['GET'])
 def health_check():
+    """Liveness: the web process is up, whether or not the swarm is ready"""
     return jsonify({
         'status': 'healthy',
         'message': 'Backend service is running'
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: the agent swarm has been built and can serve chat requests"""
+    if global_swarm is not None:
+        return jsonify({
+            'status': 'ready',
+            'message': 'Agent swarm is initialized'
+        })
+
+    start_swarm_warmup()
+    return jsonify({
+        'status': 'error' if swarm_error else 'warming',
+        'message': swarm_error or 'Agent swarm is initializing'
+    }), 503
+
 
 # For running locally
 if __name__ == '__main__':
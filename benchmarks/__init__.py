@@ -0,0 +1,3 @@
+"""
+Offline benchmark and load-test harness for the multi-agent chatbot system
+"""
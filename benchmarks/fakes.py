@@ -0,0 +1,328 @@
+"""
+Local stand-ins for Snowflake and GitHub used by the benchmark harness
+"""
+import enum
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+SCHEMA_DDL = """
+CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT, email TEXT, signup_date TEXT, country TEXT);
+CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, order_date TEXT, total_amount REAL, status TEXT);
+CREATE TABLE products (product_id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL, in_stock INTEGER);
+CREATE TABLE order_items (order_id INTEGER, product_id INTEGER, quantity INTEGER, unit_price REAL);
+"""
+
+COUNTRIES = ["US", "IN", "DE", "GB", "FR", "BR", "JP", "CA"]
+CATEGORIES = ["books", "games", "garden", "kitchen", "toys"]
+STATUSES = ["pending", "shipped", "delivered", "cancelled"]
+
+
+def build_sqlite_database(path=":memory:", customers=1000, products=200, orders=5000, seed=7):
+    """
+    Create and seed a SQLite database that mirrors DATABASE_SCHEMA
+
+    Parameters:
+    path (str): SQLite database path (defaults to an in-memory database)
+    customers (int): Number of customer rows to generate
+    products (int): Number of product rows to generate
+    orders (int): Number of order rows to generate
+    seed (int): Random seed so runs are reproducible
+
+    Returns:
+    sqlite3.Connection: The seeded connection
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript(SCHEMA_DDL)
+
+    start = date(2023, 1, 1)
+    conn.executemany(
+        "INSERT INTO customers VALUES (?, ?, ?, ?, ?)",
+        [
+            (i, f"Customer {i}", f"customer{i}@example.com",
+             (start + timedelta(days=rng.randint(0, 365))).isoformat(), rng.choice(COUNTRIES))
+            for i in range(1, customers + 1)
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO products VALUES (?, ?, ?, ?, ?)",
+        [
+            (i, f"Product {i}", rng.choice(CATEGORIES), round(rng.uniform(1, 200), 2), rng.randint(0, 1))
+            for i in range(1, products + 1)
+        ],
+    )
+
+    order_rows = []
+    item_rows = []
+    for order_id in range(1, orders + 1):
+        total = 0.0
+        for _ in range(rng.randint(1, 4)):
+            product_id = rng.randint(1, products)
+            quantity = rng.randint(1, 5)
+            unit_price = round(rng.uniform(1, 200), 2)
+            total += quantity * unit_price
+            item_rows.append((order_id, product_id, quantity, unit_price))
+        order_rows.append((
+            order_id, rng.randint(1, customers),
+            (start + timedelta(days=rng.randint(0, 540))).isoformat(),
+            round(total, 2), rng.choice(STATUSES),
+        ))
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", order_rows)
+    conn.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?)", item_rows)
+    conn.commit()
+    return conn
+
+
+class SQLiteQueryRunner:
+    """
+    Drop-in replacement for execute_snowflake_query backed by SQLite
+
+    Returns the same result dictionaries as the Snowflake implementation.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.query_count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sql_query):
+        try:
+            with self._lock:
+                self.query_count += 1
+                cursor = self.conn.execute(sql_query)
+                column_names = [desc[0].upper() for desc in cursor.description]
+                results = cursor.fetchall()
+            return {
+                "column_names": column_names,
+                "data": results,
+                "row_count": len(results),
+                "status": "success"
+            }
+        except Exception as e:
+            return {
+                "error": str(e),
+                "status": "error"
+            }
+
+
+class FakeQueryStatus(enum.Enum):
+    RUNNING = "RUNNING"
+    SUCCESS = "SUCCESS"
+    FAILED_WITH_ERROR = "FAILED_WITH_ERROR"
+    ABORTED = "ABORTED"
+
+
+class FakeSnowflakeServer:
+    """
+    Executes queries against SQLite the way a warehouse would, with query IDs
+
+    Every query takes at least latency seconds. Asynchronous queries run on a
+    timer thread and can be cancelled until they complete.
+    """
+
+    def __init__(self, conn, latency=0.0):
+        self.conn = conn
+        self.latency = latency
+        self.queries = {}
+        self.query_count = 0
+        self._lock = threading.Lock()
+
+    def run(self, sql_query):
+        """Execute synchronously; returns (description, rows)"""
+        with self._lock:
+            self.query_count += 1
+            cursor = self.conn.execute(sql_query)
+            description = [(desc[0].upper(),) + tuple(desc[1:]) for desc in cursor.description]
+            return description, cursor.fetchall()
+
+    def submit(self, sql_query):
+        query_id = str(uuid.uuid4())
+        query = {"status": FakeQueryStatus.RUNNING, "description": None, "rows": None, "error": None}
+        with self._lock:
+            self.queries[query_id] = query
+
+        def finish():
+            if query["status"] is not FakeQueryStatus.RUNNING:
+                return
+            try:
+                query["description"], query["rows"] = self.run(sql_query)
+                query["status"] = FakeQueryStatus.SUCCESS
+            except Exception as e:
+                query["error"] = str(e)
+                query["status"] = FakeQueryStatus.FAILED_WITH_ERROR
+
+        timer = threading.Timer(self.latency, finish)
+        timer.daemon = True
+        timer.start()
+        return query_id
+
+    def cancel(self, query_id):
+        query = self.queries.get(query_id)
+        if query is not None and query["status"] is FakeQueryStatus.RUNNING:
+            query["status"] = FakeQueryStatus.ABORTED
+            return f"query [{query_id}] terminated."
+        return f"query [{query_id}] not running."
+
+
+class FakeSnowflakeCursor:
+    """Subset of snowflake.connector cursors used by database_utils and async_queries."""
+
+    def __init__(self, server):
+        self.server = server
+        self.description = None
+        self.sfqid = None
+        self._rows = []
+
+    def execute(self, sql_query, params=None):
+        cancel = re.match(r"\s*SELECT\s+SYSTEM\$CANCEL_QUERY", sql_query, re.IGNORECASE)
+        if cancel:
+            self.description, self._rows = [("STATUS",)], [(self.server.cancel(params[0]),)]
+            return self
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.description, self._rows = self.server.run(sql_query)
+        return self
+
+    def execute_async(self, sql_query, params=None):
+        self.sfqid = self.server.submit(sql_query)
+        return {"queryId": self.sfqid}
+
+    def get_results_from_sfqid(self, query_id):
+        query = self.server.queries[query_id]
+        if query["status"] is not FakeQueryStatus.SUCCESS:
+            raise RuntimeError(f"Query {query_id} has status {query['status'].name}")
+        self.description, self._rows = query["description"], list(query["rows"])
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeSnowflakeConnection:
+    """Subset of snowflake.connector connections, including the async status API."""
+
+    def __init__(self, server):
+        self.server = server
+        self._closed = False
+
+    def cursor(self):
+        return FakeSnowflakeCursor(self.server)
+
+    def get_query_status(self, query_id):
+        return self.server.queries[query_id]["status"]
+
+    def get_query_status_throw_if_error(self, query_id):
+        query = self.server.queries[query_id]
+        if query["status"] is FakeQueryStatus.FAILED_WITH_ERROR:
+            raise RuntimeError(query["error"])
+        if query["status"] is FakeQueryStatus.ABORTED:
+            raise RuntimeError(f"Query {query_id} was aborted")
+        return query["status"]
+
+    def is_still_running(self, status):
+        return status is FakeQueryStatus.RUNNING
+
+    def is_an_error(self, status):
+        return status in (FakeQueryStatus.FAILED_WITH_ERROR, FakeQueryStatus.ABORTED)
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
+
+def install_fake_connector(conn, latency=0.0):
+    """
+    Point the Snowflake connection pool at a SQLite-backed fake connector
+
+    Unlike install_fakes this keeps the real query path (pool, cache,
+    validation and asynchronous submission) and only replaces the connector.
+
+    Parameters:
+    conn (sqlite3.Connection): Seeded SQLite connection
+    latency (float): Seconds every query takes
+
+    Returns:
+    FakeSnowflakeServer: The fake warehouse (exposes query_count and queries)
+    """
+    import server.utils as utils
+
+    server = FakeSnowflakeServer(conn, latency)
+    database_module = sys.modules[utils.process_and_execute_sql_query.__module__]
+    database_module.connection_pool._connect = lambda: FakeSnowflakeConnection(server)
+    return server
+
+
+class FakeContentFile:
+    def __init__(self, path):
+        self.path = path
+        self.name = path.rsplit("/", 1)[-1]
+        self.type = "file"
+
+
+class FakeRepo:
+    """In-memory repository supporting the calls made by github_utils."""
+
+    def __init__(self, name):
+        self.name = name
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def get_contents(self, path, ref=None):
+        with self._lock:
+            prefix = path.rstrip("/") + "/"
+            items = [FakeContentFile(p) for p in self.files if p.startswith(prefix)]
+        if not items:
+            raise FileNotFoundError(path)
+        return items
+
+    def create_file(self, path, message, content, branch=None):
+        with self._lock:
+            if path in self.files:
+                raise FileExistsError(path)
+            self.files[path] = content
+        return {"path": path}
+
+
+class FakeGithub:
+    """Stand-in for github.Github that keeps repositories in memory."""
+
+    repos = {}
+    _lock = threading.Lock()
+
+    def __init__(self, token=None):
+        self.token = token
+
+    def get_repo(self, name):
+        with FakeGithub._lock:
+            return FakeGithub.repos.setdefault(name, FakeRepo(name))
+
+
+def install_fakes(conn):
+    """
+    Patch the database and GitHub utilities to use the local stand-ins
+
+    Parameters:
+    conn (sqlite3.Connection): Seeded SQLite connection
+
+    Returns:
+    SQLiteQueryRunner: The installed query runner (exposes query_count)
+    """
+    import server.utils as utils
+
+    runner = SQLiteQueryRunner(conn)
+    database_module = sys.modules[utils.process_and_execute_sql_query.__module__]
+    database_module.execute_snowflake_query = runner
+
+    github_module = sys.modules[utils.push_md_to_github_with_auto_numbering.__module__]
+    github_module.Github = FakeGithub
+    return runner
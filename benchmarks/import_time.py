@@ -0,0 +1,71 @@
+"""
+Import-time benchmark for app.py
+
+Runs `python -X importtime` in a fresh interpreter and reports the total
+import time plus the slowest top-level packages. Use --with-swarm to include
+building the swarm, which shows what lazy loading saves at boot.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --with-swarm
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def measure(statement, cwd):
+    """
+    Run statement under -X importtime and aggregate the cumulative times
+
+    Parameters:
+    statement (str): Python code to execute
+    cwd (str): Working directory (the repository root)
+
+    Returns:
+    dict: Mapping of top-level package name to cumulative microseconds
+    """
+    env = dict(os.environ, SWARM_WARMUP="lazy")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+
+    packages = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        # Nested imports are indented by two extra spaces per level
+        if raw_name[1:] == name:
+            packages[name] = packages.get(name, 0) + int(cumulative)
+    if completed.returncode != 0:
+        print(completed.stderr.splitlines()[-1] if completed.stderr else "import failed", file=sys.stderr)
+    return packages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--with-swarm", action="store_true", help="Also build the swarm after importing app")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    args = parser.parse_args(argv)
+
+    from server.utils.format_utils import build_table_string
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    statement = "import app; app.get_global_swarm()" if args.with_swarm else "import app"
+    packages = measure(statement, root)
+
+    total = sum(packages.values())
+    rows = [
+        [name, f"{us / 1000:.1f}", f"{100.0 * us / total:.1f}" if total else "0.0"]
+        for name, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+    ]
+    print(f"{statement!r}: {total / 1000:.1f} ms total import time")
+    print(build_table_string(rows, ["package", "cumulative_ms", "percent"]))
+
+
+if __name__ == "__main__":
+    main()
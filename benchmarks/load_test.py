@@ -0,0 +1,344 @@
+"""
+Offline load test for the multi-agent chatbot
+
+Starts app.py against a mock Hugging Face endpoint, a SQLite stand-in for
+Snowflake and an in-memory GitHub, then drives /api/chat with concurrent
+synthetic users across the python, sql and default routes.
+
+Usage:
+    python -m benchmarks.load_test --users 8 --requests 20 --latency-ms 50
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import requests
+
+from benchmarks.fakes import build_sqlite_database, install_fakes
+from benchmarks.mock_hf_server import MockHFServer
+
+ENDPOINT_VARIABLES = [
+    "PROJECT_MANAGER_ENDPOINT",
+    "SOFTWARE_ENGINEER_ENDPOINT",
+    "DATA_ENGINEER_ENDPOINT",
+    "QA_TESTER_ENDPOINT",
+    "DEPLOYMENT_ENGINEER_ENDPOINT",
+]
+
+ROUTE_QUERIES = {
+    "python": [
+        "Write a python function to calculate the factorial of a number",
+        "Write a python function that reverses a string",
+        "Write a python function to check whether a number is prime",
+    ],
+    "sql": [
+        "Write sql to count customers per country",
+        "Write sql for the top 5 customers by total order amount",
+        "Write sql for monthly revenue in 2023",
+    ],
+    "default": [
+        "Show me the number of orders by status",
+        "Which product categories sell the most?",
+    ],
+}
+
+
+def percentile(values, pct):
+    """
+    Return the pct-th percentile of values using linear interpolation
+
+    Parameters:
+    values (list): Observations
+    pct (float): Percentile between 0 and 100
+
+    Returns:
+    float: The percentile, or 0.0 when values is empty
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def current_rss_mb():
+    """Return the resident set size of this process in MB (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+class StageTimer:
+    """Thread-safe collector of per-stage durations."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds):
+        with self._lock:
+            self.samples.setdefault(label, []).append(seconds)
+
+    def wrap(self, label, func, label_fn=None):
+        """Return func wrapped so every call is timed under label."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                name = label_fn(*args, **kwargs) if label_fn else label
+                self.record(name, time.perf_counter() - start)
+        return wrapper
+
+
+def instrument(app_module, timer):
+    """
+    Wrap the hot paths of the application with stage timers
+
+    Parameters:
+    app_module (module): The imported app module (its swarm is built first)
+    timer (StageTimer): Collector receiving the samples
+    """
+    app_module.get_global_swarm()
+
+    import server.multi_agent_system as system_module
+    import server.utils as utils
+    from server.agents.huggingface_agent import HuggingFaceAgent
+
+    classify_query = system_module.classify_query
+    database_module = sys.modules[utils.process_and_execute_sql_query.__module__]
+
+    # app.py resolves process_query from the module on every request
+    system_module.process_query = timer.wrap(
+        "process_query", system_module.process_query,
+        label_fn=lambda swarm, query, *a, **k: f"process_query[{classify_query(query)}]",
+    )
+    HuggingFaceAgent._call = timer.wrap("model_call", HuggingFaceAgent._call)
+    database_module.execute_snowflake_query = timer.wrap(
+        "sql_execute", database_module.execute_snowflake_query
+    )
+    system_module.build_table_string = timer.wrap("format_table", system_module.build_table_string)
+    system_module.push_md_to_github_with_auto_numbering = timer.wrap(
+        "github_push", system_module.push_md_to_github_with_auto_numbering
+    )
+
+
+class SyntheticUser(threading.Thread):
+    """A logged-in user that sends chat requests in a loop."""
+
+    def __init__(self, index, base_url, requests_per_user, route_weights, results, seed):
+        super().__init__(daemon=True)
+        self.index = index
+        self.base_url = base_url
+        self.requests_per_user = requests_per_user
+        self.route_weights = route_weights
+        self.results = results
+        self.rng = random.Random(seed + index)
+        self.session = requests.Session()
+        self.shed = 0
+
+    def register(self):
+        username = f"bench_user_{self.index}"
+        self.session.post(f"{self.base_url}/register", data={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "bench",
+            "confirm_password": "bench",
+        })
+
+    def run(self):
+        self.register()
+        routes = list(self.route_weights)
+        weights = [self.route_weights[r] for r in routes]
+        for n in range(self.requests_per_user):
+            route = self.rng.choices(routes, weights)[0]
+            query = self.rng.choice(ROUTE_QUERIES[route])
+            start = time.perf_counter()
+            try:
+                response = self.session.post(f"{self.base_url}/api/chat", json={
+                    "message": query,
+                    "thread_id": f"bench_thread_{self.index}",
+                })
+                ok = response.status_code == 200
+                if response.status_code == 429:
+                    self.shed += 1
+            except requests.RequestException:
+                ok = False
+            self.results.append((route, time.perf_counter() - start, ok))
+
+
+def parse_route_weights(spec):
+    """Parse 'python=1,sql=2,default=1' into a dict of weights."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() in ROUTE_QUERIES:
+            weights[name.strip()] = float(value or 1)
+    return weights or {route: 1.0 for route in ROUTE_QUERIES}
+
+
+def summarize(label, samples):
+    """Build one report row for a list of durations in seconds."""
+    ms = [s * 1000 for s in samples]
+    return [
+        label,
+        len(ms),
+        f"{(sum(ms) / len(ms)) if ms else 0:.1f}",
+        f"{percentile(ms, 50):.1f}",
+        f"{percentile(ms, 95):.1f}",
+        f"{percentile(ms, 99):.1f}",
+    ]
+
+
+def run_benchmark(args):
+    """
+    Run the load test and return the report dictionary
+
+    Parameters:
+    args (argparse.Namespace): Parsed command line options
+
+    Returns:
+    dict: Throughput, latency percentiles, stage breakdowns and memory growth
+    """
+    mock = MockHFServer(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        output_tokens=args.output_tokens,
+    ).start()
+
+    # Point every agent at the mock endpoint before the config module is imported
+    for variable in ENDPOINT_VARIABLES:
+        os.environ[variable] = mock.url
+    os.environ.setdefault("HF_API_KEY", "benchmark")
+    os.environ.setdefault("GITHUB_REPO", "bench/bench")
+    os.environ.setdefault("GITHUB_BRANCH", "main")
+    os.environ.setdefault("SCHEMA_CATALOG_ENABLED", "false")
+    os.environ.setdefault("SWARM_WARMUP", "lazy")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before_import = current_rss_mb()
+
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    runner = install_fakes(build_sqlite_database())
+    timer = StageTimer()
+    instrument(app_module, timer)
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    rss_start = current_rss_mb()
+    snapshot_start = tracemalloc.take_snapshot() if args.tracemalloc else None
+
+    results = []
+    route_weights = parse_route_weights(args.routes)
+    users = [
+        SyntheticUser(i, base_url, args.requests, route_weights, results, args.seed)
+        for i in range(args.users)
+    ]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+
+    rss_end = current_rss_mb()
+    top_growth = []
+    if args.tracemalloc:
+        snapshot_end = tracemalloc.take_snapshot()
+        for stat in snapshot_end.compare_to(snapshot_start, "lineno")[:10]:
+            top_growth.append({"site": str(stat.traceback), "size_diff_kb": stat.size_diff / 1024})
+        tracemalloc.stop()
+
+    server.shutdown()
+    mock.stop()
+
+    by_route = {}
+    for route, seconds, ok in results:
+        by_route.setdefault(route, []).append(seconds)
+
+    return {
+        "config": vars(args),
+        "requests": len(results),
+        "errors": sum(1 for _, _, ok in results if not ok),
+        "shed": sum(user.shed for user in users),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "latency": {
+            "all": summarize("all", [s for _, s, _ in results]),
+            **{route: summarize(route, samples) for route, samples in sorted(by_route.items())},
+        },
+        "stages": {label: summarize(label, samples) for label, samples in sorted(timer.samples.items())},
+        "model_requests": mock.request_count,
+        "sql_queries": runner.query_count,
+        "memory": {
+            "rss_before_import_mb": rss_before_import,
+            "rss_start_mb": rss_start,
+            "rss_end_mb": rss_end,
+            "rss_growth_mb": rss_end - rss_start,
+            "top_growth": top_growth,
+        },
+    }
+
+
+def print_report(report):
+    """Print the benchmark report as ASCII tables."""
+    from server.utils.format_utils import build_table_string
+
+    headers = ["name", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"]
+    print(f"\nRequests: {report['requests']}  errors: {report['errors']} (shed: {report['shed']})  "
+          f"elapsed: {report['elapsed_s']:.2f}s  throughput: {report['throughput_rps']:.2f} req/s")
+    print(f"Model requests: {report['model_requests']}  SQL queries: {report['sql_queries']}")
+    print("\nEnd-to-end latency by route")
+    print(build_table_string(list(report["latency"].values()), headers))
+    print("\nPer-stage breakdown")
+    print(build_table_string(list(report["stages"].values()), headers))
+
+    memory = report["memory"]
+    print(f"\nRSS: {memory['rss_before_import_mb']:.1f} MB before import, "
+          f"{memory['rss_start_mb']:.1f} MB at start, {memory['rss_end_mb']:.1f} MB at end "
+          f"(growth {memory['rss_growth_mb']:+.1f} MB)")
+    for entry in memory["top_growth"]:
+        print(f"  {entry['size_diff_kb']:+10.1f} KB  {entry['site']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="Concurrent synthetic users")
+    parser.add_argument("--requests", type=int, default=10, help="Chat requests per user")
+    parser.add_argument("--routes", default="python=1,sql=2,default=1", help="Route mix weights")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mock model base latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Mock model latency jitter")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="Mock model token rate")
+    parser.add_argument("--output-tokens", type=int, default=128, help="Tokens generated per call")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for the route mix")
+    parser.add_argument("--tracemalloc", action="store_true", help="Report top allocation growth sites")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Mock Hugging Face inference server used by the benchmark harness
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canned responses for each agent role, keyed by the keyword that selects them
+CANNED_RESPONSES = {
+    "project": (
+        "- Development: implement the requested function\n"
+        "- Testing: write assert based test cases\n"
+        "- Documentation: describe usage and parameters"
+    ),
+    "software": (
+        "```python\n"
+        "def factorial(n):\n"
+        "    if n < 0:\n"
+        "        raise ValueError('n must be non-negative')\n"
+        "    result = 1\n"
+        "    for i in range(2, n + 1):\n"
+        "        result *= i\n"
+        "    return result\n"
+        "```"
+    ),
+    "tester": (
+        "```python\n"
+        "assert factorial(0) == 1\n"
+        "assert factorial(1) == 1\n"
+        "assert factorial(5) == 120\n"
+        "```"
+    ),
+    "deployment": (
+        "# factorial\n\n"
+        "Computes the factorial of a non-negative integer.\n\n"
+        "## Parameters\n\n- `n` (int): the input value\n\n"
+        "## Returns\n\n- int: `n!`"
+    ),
+    "sql": (
+        "```sql\n"
+        "SELECT country, COUNT(*) AS customer_count\n"
+        "FROM customers\n"
+        "GROUP BY country\n"
+        "ORDER BY customer_count DESC\n"
+        "```"
+    ),
+}
+
+
+def pick_canned_response(prompt):
+    """
+    Choose the canned response whose keyword appears last in the prompt
+
+    The prompt contains the whole thread history, so the most recent keyword
+    is the one that reflects the current stage.
+
+    Parameters:
+    prompt (str): The prompt sent to the model endpoint
+
+    Returns:
+    str: The canned response text
+    """
+    lowered = prompt.lower()
+    best_key = "sql"
+    best_pos = -1
+    for key in CANNED_RESPONSES:
+        pos = lowered.rfind(key)
+        if pos > best_pos:
+            best_key, best_pos = key, pos
+    return CANNED_RESPONSES[best_key]
+
+
+class MockHFServer:
+    """
+    Threaded HTTP server that mimics a Hugging Face text-generation endpoint
+
+    Each request sleeps for a base latency (plus jitter) followed by the time it
+    would take to stream the requested number of tokens at the configured rate.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=50.0, jitter_ms=10.0,
+                 tokens_per_sec=200.0, output_tokens=128):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/generate"
+
+    def _service_time(self, max_new_tokens):
+        """Return the simulated generation time in seconds for one request."""
+        tokens = min(self.output_tokens, max_new_tokens)
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        generation = tokens / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        return max(latency, 0.0) / 1000.0 + generation
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = {}
+
+                prompt = str(payload.get("inputs", ""))
+                parameters = payload.get("parameters", {}) or {}
+
+                with server._lock:
+                    server.request_count += 1
+
+                max_new_tokens = parameters.get("max_new_tokens") or server.output_tokens
+                time.sleep(server._service_time(max_new_tokens))
+
+                result = {"generated_text": pick_canned_response(prompt)}
+                if parameters.get("details"):
+                    result["details"] = {
+                        "finish_reason": "length" if server.output_tokens > max_new_tokens else "eos_token",
+                        "generated_tokens": min(server.output_tokens, max_new_tokens),
+                    }
+                body = json.dumps([result]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep benchmark output readable
+                pass
+
+        return Handler
+
+    def start(self):
+        """Start serving in a background daemon thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server and release the socket."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,87 @@
+"""
+Per-turn cost of process_query on long conversation threads
+
+Drives process_query with an in-memory swarm whose invoke is O(1) and returns
+the whole replayed thread, like the checkpointer does. With incremental
+scanning the per-turn cost should stay flat as the thread grows; pass
+--full-rescan to reproduce the old behaviour of re-walking every message.
+
+Usage:
+    python -m benchmarks.thread_scan --turns 500
+"""
+import argparse
+import contextlib
+import os
+import time
+
+from benchmarks.load_test import percentile
+
+
+class FakeMessage:
+    def __init__(self, type, content, name=None):
+        self.type = type
+        self.content = content
+        self.name = name
+
+
+class FakeSwarm:
+    """Swarm stand-in that appends one user and one AI message per invoke."""
+
+    def __init__(self):
+        self.threads = {}
+
+    def invoke(self, state, config):
+        thread = self.threads.setdefault(config["configurable"]["thread_id"], [])
+        thread.append(FakeMessage("human", state["messages"][0]["content"]))
+        thread.append(FakeMessage("ai", "```sql\nSELECT 1\n```", name="data_engineer"))
+        return {"messages": thread}
+
+
+def run(turns, bucket, full_rescan):
+    """
+    Time each turn of a single growing thread
+
+    Returns:
+        list: Rows of [turns, mean_us, p95_us] per bucket of turns
+    """
+    import server.multi_agent_system as system
+
+    # Keep SQL execution and table formatting out of the measurement
+    system.process_and_execute_sql_query = lambda text: {"status": "error", "error": "disabled"}
+
+    swarm = FakeSwarm()
+    timings = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for turn in range(turns):
+            if full_rescan:
+                system.processed_message_counts.clear()
+            start = time.perf_counter()
+            system.process_query(swarm, f"query {turn}", "bench_user", "bench_thread", {})
+            timings.append((time.perf_counter() - start) * 1e6)
+
+    rows = []
+    for offset in range(0, turns, bucket):
+        chunk = timings[offset:offset + bucket]
+        rows.append([
+            f"{offset + 1}-{offset + len(chunk)}",
+            f"{sum(chunk) / len(chunk):.1f}",
+            f"{percentile(chunk, 95):.1f}",
+        ])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500, help="Turns in the conversation thread")
+    parser.add_argument("--bucket", type=int, default=50, help="Turns per report row")
+    parser.add_argument("--full-rescan", action="store_true", help="Re-walk the whole thread every turn")
+    args = parser.parse_args(argv)
+
+    from server.utils.format_utils import build_table_string
+
+    rows = run(args.turns, args.bucket, args.full_rescan)
+    print(build_table_string(rows, ["turns", "mean_us", "p95_us"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -42,3 +42,121 @@ Tables:
 # Flask application settings
 SECRET_KEY = os.environ.get('SECRET_KEY', os.urandom(24).hex())
 SESSION_LIFETIME = 1800  # 30 minutes session lifetime
+
+# Speculative prefetch of downstream agent stages
+SPECULATIVE_PREFETCH_ENABLED = os.environ.get('SPECULATIVE_PREFETCH_ENABLED', 'false').lower() == 'true'
+SPECULATIVE_MAX_WORKERS = int(os.environ.get('SPECULATIVE_MAX_WORKERS', '4'))
+
+# Agent prompt templates ("agent=version,..." selects non-default template versions)
+PROMPT_VERSIONS = os.environ.get('PROMPT_VERSIONS', '')
+PROMPT_INJECT_SCHEMA = os.environ.get('PROMPT_INJECT_SCHEMA', 'true').lower() == 'true'
+
+# Snowflake connection pool and schema catalog
+SF_POOL_SIZE = int(os.environ.get('SF_POOL_SIZE', '4'))
+SCHEMA_CATALOG_ENABLED = os.environ.get('SCHEMA_CATALOG_ENABLED', 'true').lower() == 'true'
+SCHEMA_CACHE_PATH = os.environ.get('SCHEMA_CACHE_PATH', os.path.join('.cache', 'schema_catalog.json'))
+SCHEMA_CACHE_TTL = int(os.environ.get('SCHEMA_CACHE_TTL', '900'))  # seconds
+SCHEMA_MAX_TABLES = int(os.environ.get('SCHEMA_MAX_TABLES', '8'))
+
+# Pre-execution SQL validation
+SQL_DEFAULT_LIMIT = int(os.environ.get('SQL_DEFAULT_LIMIT', '1000'))  # 0 disables LIMIT injection
+SQL_MAX_SCAN_BYTES = int(os.environ.get('SQL_MAX_SCAN_BYTES', '0'))  # 0 disables the EXPLAIN cost guard
+
+# Swarm construction at startup: 'background' (warm-up thread), 'eager' or 'lazy' (first request)
+SWARM_WARMUP = os.environ.get('SWARM_WARMUP', 'background').lower()
+
+# Cache shared between worker processes (TTLs in seconds; 0 disables the cache)
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH', os.path.join('.cache', 'shared_cache.sqlite3'))
+SHARED_CACHE_MAX_ENTRIES = int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', '10000'))
+GENERATION_CACHE_TTL = int(os.environ.get('GENERATION_CACHE_TTL', '0'))
+SQL_CACHE_TTL = int(os.environ.get('SQL_CACHE_TTL', '0'))
+
+# Adaptive per-agent output budgets (max_new_tokens = p95 of recent lengths + margin)
+OUTPUT_BUDGET_ENABLED = os.environ.get('OUTPUT_BUDGET_ENABLED', 'true').lower() == 'true'
+OUTPUT_BUDGET_MARGIN = float(os.environ.get('OUTPUT_BUDGET_MARGIN', '0.25'))
+OUTPUT_BUDGET_MIN_SAMPLES = int(os.environ.get('OUTPUT_BUDGET_MIN_SAMPLES', '20'))
+OUTPUT_BUDGET_FLOOR = int(os.environ.get('OUTPUT_BUDGET_FLOOR', '256'))
+OUTPUT_BUDGET_WINDOW = int(os.environ.get('OUTPUT_BUDGET_WINDOW', '200'))
+
+# Model endpoint replicas: comma-separated URLs per agent (default: the single endpoint above)
+def _replica_urls(variable, default):
+    urls = [url.strip() for url in os.environ.get(variable, default).split(',') if url.strip()]
+    return urls or ([default] if default else [])
+
+PROJECT_MANAGER_ENDPOINTS = _replica_urls('PROJECT_MANAGER_ENDPOINTS', PROJECT_MANAGER_ENDPOINT)
+SOFTWARE_ENGINEER_ENDPOINTS = _replica_urls('SOFTWARE_ENGINEER_ENDPOINTS', SOFTWARE_ENGINEER_ENDPOINT)
+DATA_ENGINEER_ENDPOINTS = _replica_urls('DATA_ENGINEER_ENDPOINTS', DATA_ENGINEER_ENDPOINT)
+QA_TESTER_ENDPOINTS = _replica_urls('QA_TESTER_ENDPOINTS', QA_TESTER_ENDPOINT)
+DEPLOYMENT_ENGINEER_ENDPOINTS = _replica_urls('DEPLOYMENT_ENGINEER_ENDPOINTS', DEPLOYMENT_ENGINEER_ENDPOINT)
+
+# Hedged requests and per-replica circuit breakers
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_DELAY_MS = float(os.environ.get('HEDGE_MIN_DELAY_MS', '200'))
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_POOL_SIZE = int(os.environ.get('HEDGE_POOL_SIZE', '32'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+MODEL_REQUEST_TIMEOUT = float(os.environ.get('MODEL_REQUEST_TIMEOUT', '300'))
+
+# Model tiering: light requests go to a smaller, faster endpoint and escalate on invalid output
+TIERING_ENABLED = os.environ.get('TIERING_ENABLED', 'false').lower() == 'true'
+PROJECT_MANAGER_SMALL_ENDPOINTS = _replica_urls('PROJECT_MANAGER_SMALL_ENDPOINTS', '')
+SOFTWARE_ENGINEER_SMALL_ENDPOINTS = _replica_urls('SOFTWARE_ENGINEER_SMALL_ENDPOINTS', '')
+DATA_ENGINEER_SMALL_ENDPOINTS = _replica_urls('DATA_ENGINEER_SMALL_ENDPOINTS', '')
+QA_TESTER_SMALL_ENDPOINTS = _replica_urls('QA_TESTER_SMALL_ENDPOINTS', '')
+DEPLOYMENT_ENGINEER_SMALL_ENDPOINTS = _replica_urls('DEPLOYMENT_ENGINEER_SMALL_ENDPOINTS', '')
+TIER_MAX_SMALL_COMPLEXITY = float(os.environ.get('TIER_MAX_SMALL_COMPLEXITY', '12'))
+TIER_MIN_SMALL_SUCCESS_RATE = float(os.environ.get('TIER_MIN_SMALL_SUCCESS_RATE', '0.7'))
+TIER_SUCCESS_WINDOW = int(os.environ.get('TIER_SUCCESS_WINDOW', '50'))
+TIER_EXPLORATION_INTERVAL = int(os.environ.get('TIER_EXPLORATION_INTERVAL', '10'))
+
+# Sandboxed execution of generated tests after the QA stage
+CODE_EXECUTION_ENABLED = os.environ.get('CODE_EXECUTION_ENABLED', 'false').lower() == 'true'
+CODE_EXECUTION_WORKERS = int(os.environ.get('CODE_EXECUTION_WORKERS', str(min(4, os.cpu_count() or 1))))
+CODE_EXECUTION_CPU_SECONDS = int(os.environ.get('CODE_EXECUTION_CPU_SECONDS', '5'))
+CODE_EXECUTION_MEMORY_MB = int(os.environ.get('CODE_EXECUTION_MEMORY_MB', '512'))
+CODE_EXECUTION_TIMEOUT = float(os.environ.get('CODE_EXECUTION_TIMEOUT', '10'))
+CODE_EXECUTION_MAX_CASES = int(os.environ.get('CODE_EXECUTION_MAX_CASES', '50'))
+CODE_EXECUTION_MAX_PROCESSES = int(os.environ.get('CODE_EXECUTION_MAX_PROCESSES', '4'))
+
+# Asynchronous Snowflake queries: submit, poll by query ID, fetch results later
+SQL_ASYNC_ENABLED = os.environ.get('SQL_ASYNC_ENABLED', 'false').lower() == 'true'
+SQL_ASYNC_WAIT_SECONDS = float(os.environ.get('SQL_ASYNC_WAIT_SECONDS', '10'))
+SQL_ASYNC_POLL_INTERVAL = float(os.environ.get('SQL_ASYNC_POLL_INTERVAL', '0.5'))
+SQL_ASYNC_MAX_POLL_INTERVAL = float(os.environ.get('SQL_ASYNC_MAX_POLL_INTERVAL', '5'))
+SQL_ASYNC_RESULT_TTL = float(os.environ.get('SQL_ASYNC_RESULT_TTL', '3600'))
+
+# Admission control for /api/chat: concurrency caps, fair queuing and load shedding
+def _weights(variable, default):
+    pairs = (item.split(':', 1) for item in os.environ.get(variable, default).split(',') if ':' in item)
+    return {name.strip(): float(weight) for name, weight in pairs}
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '4'))
+ADMISSION_PER_USER_LIMIT = int(os.environ.get('ADMISSION_PER_USER_LIMIT', '2'))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get('ADMISSION_MAX_QUEUE_DEPTH', '32'))
+ADMISSION_PER_USER_QUEUE = int(os.environ.get('ADMISSION_PER_USER_QUEUE', '4'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '60'))
+ADMISSION_LANE_WEIGHTS = _weights('ADMISSION_LANE_WEIGHTS', 'short:3,long:1')
+ADMISSION_USER_WEIGHTS = _weights('ADMISSION_USER_WEIGHTS', '')
+
+# Compressed API responses (gzip, or brotli when installed) with entity tags
+RESPONSE_COMPRESSION_ENABLED = os.environ.get('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true'
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', '500'))
+RESPONSE_COMPRESSION_LEVEL = int(os.environ.get('RESPONSE_COMPRESSION_LEVEL', '6'))
+
+# Content-addressed store of generated code, tests, SQL and docs
+ARTIFACT_STORE_ENABLED = os.environ.get('ARTIFACT_STORE_ENABLED', 'true').lower() == 'true'
+ARTIFACT_STORE_PATH = os.environ.get('ARTIFACT_STORE_PATH', os.path.join('.cache', 'artifacts'))
+ARTIFACT_STORE_MAX_BYTES = int(float(os.environ.get('ARTIFACT_STORE_MAX_MB', '512')) * 1024 * 1024)
+# Hand a stage the reference of the previous stage's output instead of repeating its text
+ARTIFACT_REFERENCE_HANDOFF = os.environ.get('ARTIFACT_REFERENCE_HANDOFF', 'false').lower() == 'true'
+
+# Opt-in request profiling: X-Profile header with X-Admin-Token, or a sampled fraction of chat requests
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SAMPLE_MEMORY = os.environ.get('PROFILE_SAMPLE_MEMORY', 'false').lower() == 'true'
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_PATH = os.environ.get('PROFILE_PATH', os.path.join('.cache', 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '100'))
@@ -0,0 +1,79 @@
+"""
+Gunicorn configuration for the multi-process production server
+
+    gunicorn -c gunicorn.conf.py app:application
+
+The app and its agent swarm are loaded once in the master process before the
+workers are forked, so workers share the compiled graph copy-on-write. Workers
+are recycled after a number of requests or when their RSS grows too large.
+"""
+import gc
+import os
+
+# Build the swarm synchronously in the master; a warm-up thread would not
+# survive the fork
+os.environ.setdefault("SWARM_WARMUP", "lazy")
+
+
+def _available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", len(_available_cpus())))
+worker_class = "gthread"
+# Requests beyond ADMISSION_MAX_CONCURRENT wait for a slot on their own thread
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+preload_app = True
+
+# Agent chains make several model calls in a row
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+
+# Recycle workers after this many requests (jittered so they do not restart together)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# Recycle a worker once its resident memory exceeds this many MB (0 disables)
+max_worker_rss_mb = int(os.environ.get("GUNICORN_MAX_WORKER_RSS_MB", "0"))
+
+# Pin each worker to one CPU of the master's affinity set
+pin_workers = os.environ.get("GUNICORN_PIN_WORKERS", "false").lower() == "true"
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def when_ready(server):
+    """Build the swarm in the master and freeze the heap before forking workers"""
+    import app
+
+    app.get_global_swarm()
+    # Move everything allocated so far out of the collector's reach so that
+    # garbage collection in the workers does not touch (and copy) these pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("Agent swarm preloaded in master (pid %s)", os.getpid())
+
+
+def post_fork(server, worker):
+    if pin_workers and hasattr(os, "sched_setaffinity"):
+        cpus = _available_cpus()
+        cpu = cpus[worker.age % len(cpus)]
+        os.sched_setaffinity(0, {cpu})
+        server.log.info("Worker %s pinned to CPU %s", worker.pid, cpu)
+
+
+def post_request(worker, req, environ, resp):
+    if max_worker_rss_mb and _rss_mb() > max_worker_rss_mb:
+        worker.log.info("Worker %s exceeded %s MB RSS; recycling", worker.pid, max_worker_rss_mb)
+        worker.alive = False
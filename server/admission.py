@@ -0,0 +1,252 @@
+"""
+Admission control and fair scheduling of chat requests
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from server.utils.stats import percentile
+from server.config import (
+    ADMISSION_MAX_CONCURRENT, ADMISSION_PER_USER_LIMIT, ADMISSION_MAX_QUEUE_DEPTH, ADMISSION_PER_USER_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT, ADMISSION_LANE_WEIGHTS, ADMISSION_USER_WEIGHTS
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; retry_after is the suggested wait in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_id", "lane", "start_tag", "finish_tag", "enqueued_at", "admitted")
+
+    def __init__(self, user_id, lane, start_tag, finish_tag):
+        self.user_id = user_id
+        self.lane = lane
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.perf_counter()
+        self.admitted = False
+
+
+class AdmissionController:
+    """
+    Limits how many chat requests run at once and decides who goes next
+
+    - At most max_concurrent requests run, and at most per_user_limit per user.
+    - Waiting requests sit in lanes (e.g. short sql queries vs. long python
+      chains). Free slots are shared between lanes in proportion to
+      lane_weights, so short queries are not stuck behind chains and chains
+      still make progress.
+    - Within a lane, users are served by weighted fair queuing: each request
+      gets a virtual finish tag of max(lane clock, user's last tag) + cost /
+      weight, and the smallest tag goes first. A user firing many expensive
+      requests pushes only their own tags back.
+    - Requests are shed with AdmissionRejected when the queue is full, when the
+      user already has per_user_queue requests waiting, or after waiting
+      queue_timeout seconds.
+    - Requests for a lane that is not configured go to default_lane ("short"
+      when configured, otherwise the first lane).
+
+    Raises:
+    ValueError: If there are no lanes or a lane or user weight is not positive
+    """
+
+    def __init__(self, max_concurrent=4, per_user_limit=2, max_queue_depth=32, per_user_queue=4,
+                 queue_timeout=60.0, lane_weights=None, user_weights=None, default_lane="short"):
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.max_queue_depth = max_queue_depth
+        self.per_user_queue = per_user_queue
+        self.queue_timeout = queue_timeout
+        self.lane_weights = dict(lane_weights or {"short": 3, "long": 1})
+        self.user_weights = dict(user_weights or {})
+        for kind, weights in (("lane", self.lane_weights), ("user", self.user_weights)):
+            for name, weight in weights.items():
+                if not weight > 0:
+                    raise ValueError(f"Admission {kind} weight of {name!r} must be positive, got {weight}")
+        self.default_lane = default_lane if default_lane in self.lane_weights else next(iter(self.lane_weights))
+        self._condition = threading.Condition()
+        self._queues = {lane: [] for lane in self.lane_weights}
+        self._virtual_time = {lane: 0.0 for lane in self.lane_weights}
+        self._last_finish = {}
+        self._lane_served = {lane: 0 for lane in self.lane_weights}
+        self._active = 0
+        self._active_by_user = {}
+        self._service_time = {lane: None for lane in self.lane_weights}
+        self._waits = {lane: deque(maxlen=500) for lane in self.lane_weights}
+        self.stats = {"admitted": 0, "shed_queue_full": 0, "shed_user_queue": 0, "shed_timeout": 0,
+                      "background_admitted": 0, "background_refused": 0}
+
+    def _queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _lane(self, lane):
+        """Return lane if it is configured, otherwise the default lane"""
+        return lane if lane in self._queues else self.default_lane
+
+    def _retry_after(self, lane):
+        """Rough seconds until a slot frees up for a new request in lane"""
+        service = self._service_time[lane] or 5.0
+        backlog = self._queued() + self._active
+        return max(1, int(math.ceil(service * backlog / max(1, self.max_concurrent))))
+
+    def _dispatch(self):
+        """Admit waiting requests while there are free slots (called with the lock held)"""
+        admitted = False
+        while self._active < self.max_concurrent:
+            if not all(self._queues.values()):
+                # Lane shares only matter under contention; an idle lane earns no credit
+                self._lane_served = {lane: 0 for lane in self._queues}
+            best = None
+            # Lane furthest behind its share of slots goes first
+            for lane in sorted(self._queues, key=lambda l: self._lane_served[l] / self.lane_weights[l]):
+                eligible = [w for w in self._queues[lane]
+                            if self._active_by_user.get(w.user_id, 0) < self.per_user_limit]
+                if eligible:
+                    best = min(eligible, key=lambda w: w.finish_tag)
+                    break
+            if best is None:
+                break
+            self._queues[best.lane].remove(best)
+            self._lane_served[best.lane] += 1
+            self._virtual_time[best.lane] = max(self._virtual_time[best.lane], best.start_tag)
+            self._start(best)
+            admitted = True
+        if admitted:
+            self._condition.notify_all()
+
+    def _start(self, waiter):
+        waiter.admitted = True
+        self._active += 1
+        self._active_by_user[waiter.user_id] = self._active_by_user.get(waiter.user_id, 0) + 1
+        self.stats["admitted"] += 1
+        self._waits[waiter.lane].append(time.perf_counter() - waiter.enqueued_at)
+
+    def acquire(self, user_id, lane="short", cost=1.0):
+        """
+        Wait until the request may run
+
+        Parameters:
+        user_id (str): User making the request
+        lane (str): Priority lane of the request; unknown lanes use the default lane
+        cost (float): Relative amount of work (e.g. number of agent stages)
+
+        Returns:
+        The admission ticket to pass to release()
+
+        Raises:
+        AdmissionRejected: If the request is shed
+        """
+        lane = self._lane(lane)
+        with self._condition:
+            queue = self._queues[lane]
+            if self._queued() >= self.max_queue_depth:
+                self.stats["shed_queue_full"] += 1
+                raise AdmissionRejected("Server is busy", self._retry_after(lane))
+            if sum(1 for q in self._queues.values() for w in q if w.user_id == user_id) >= self.per_user_queue:
+                self.stats["shed_user_queue"] += 1
+                raise AdmissionRejected("Too many requests waiting for this user", self._retry_after(lane))
+
+            weight = self.user_weights.get(user_id, 1.0)
+            key = (lane, user_id)
+            start = max(self._virtual_time[lane], self._last_finish.get(key, 0.0))
+            waiter = _Waiter(user_id, lane, start, start + cost / weight)
+            self._last_finish[key] = waiter.finish_tag
+            queue.append(waiter)
+            self._dispatch()
+
+            deadline = time.perf_counter() + self.queue_timeout
+            while not waiter.admitted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    queue.remove(waiter)
+                    self.stats["shed_timeout"] += 1
+                    raise AdmissionRejected("Timed out waiting for a free slot", self._retry_after(lane))
+                self._condition.wait(remaining)
+            return waiter
+
+    def try_acquire(self, user_id, lane="short"):
+        """
+        Take a free slot without waiting, for optional background work
+
+        Only succeeds when nothing is queued, so background work never runs
+        ahead of waiting requests. The slot counts against the same limits.
+
+        Returns:
+        The admission ticket to pass to release(), or None if no slot is free
+        """
+        lane = self._lane(lane)
+        with self._condition:
+            if (self._queued() or self._active >= self.max_concurrent
+                    or self._active_by_user.get(user_id, 0) >= self.per_user_limit):
+                self.stats["background_refused"] += 1
+                return None
+            ticket = _Waiter(user_id, lane, 0.0, 0.0)
+            ticket.admitted = True
+            self._active += 1
+            self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+            self.stats["background_admitted"] += 1
+            return ticket
+
+    def release(self, ticket, service_seconds=None):
+        """Free the slot of an admitted request"""
+        with self._condition:
+            self._active -= 1
+            remaining = self._active_by_user.get(ticket.user_id, 1) - 1
+            if remaining:
+                self._active_by_user[ticket.user_id] = remaining
+            else:
+                self._active_by_user.pop(ticket.user_id, None)
+            if service_seconds is not None:
+                previous = self._service_time[ticket.lane]
+                self._service_time[ticket.lane] = service_seconds if previous is None else \
+                    0.8 * previous + 0.2 * service_seconds
+            if not self._active and not self._queued():
+                # Idle: forget old finish tags so the map does not grow without bound
+                self._last_finish.clear()
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, user_id, lane="short", cost=1.0):
+        """Context manager around acquire() and release()"""
+        ticket = self.acquire(user_id, lane, cost)
+        start = time.perf_counter()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket, time.perf_counter() - start)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self.stats)
+            stats["active"] = self._active
+            stats["queued"] = {lane: len(queue) for lane, queue in self._queues.items()}
+            stats["queue_wait_ms"] = {
+                lane: {
+                    "p50": round(percentile(waits, 50) * 1000, 1),
+                    "p95": round(percentile(waits, 95) * 1000, 1),
+                } if waits else None
+                for lane, waits in self._waits.items()
+            }
+            stats["service_seconds"] = {lane: round(value, 2) if value is not None else None
+                                        for lane, value in self._service_time.items()}
+        stats["shed"] = stats["shed_queue_full"] + stats["shed_user_queue"] + stats["shed_timeout"]
+        return stats
+
+
+# Shared by chat requests and the background work they start (e.g. speculative prefetches)
+admission_controller = AdmissionController(
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    per_user_limit=ADMISSION_PER_USER_LIMIT,
+    max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+    per_user_queue=ADMISSION_PER_USER_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    lane_weights=ADMISSION_LANE_WEIGHTS,
+    user_weights=ADMISSION_USER_WEIGHTS
+)
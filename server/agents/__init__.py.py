@@ -7,11 +7,13 @@ from server.agents.software_engineer import get_software_engineer_agent
 from server.agents.data_engineer import get_data_engineer_agent
 from server.agents.qa_tester import get_qa_tester_agent
 from server.agents.deployment_engineer import get_deployment_engineer_agent
+from server.agents.prompt_registry import prompt_registry
 
 __all__ = [
     'get_project_manager_agent',
     'get_software_engineer_agent',
     'get_data_engineer_agent',
     'get_qa_tester_agent',
-    'get_deployment_engineer_agent'
+    'get_deployment_engineer_agent',
+    'prompt_registry'
 ]
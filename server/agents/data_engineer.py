@@ -2,17 +2,48 @@
 Data Engineer agent implementation
 """
 from server.agents.huggingface_agent import HuggingFaceAgent
-from server.config import DATA_ENGINEER_ENDPOINT, HF_API_KEY, DATABASE_SCHEMA
+from server.agents.model_tiering import configure_tiering
+from server.agents.prompt_registry import prompt_registry
+from server.config import DATA_ENGINEER_ENDPOINT, DATA_ENGINEER_ENDPOINTS, DATA_ENGINEER_SMALL_ENDPOINTS, HF_API_KEY, PROMPT_INJECT_SCHEMA, SCHEMA_CATALOG_ENABLED
+from server.utils.database_utils import extract_sql_from_query
+from server.utils.schema_catalog import schema_catalog
 from langgraph.prebuilt import create_react_agent
 from langchain_core.runnables import RunnableConfig
 
+DATA_ENGINEER_PROMPT = "Generate a Sql query based on user requirement:"
+
+# Stop generating at the closing fence of the ```sql block
+DATA_ENGINEER_STOP_SEQUENCES = ["\n```\n"]
+
+# With the schema catalog enabled the relevant tables are added per request instead
+prompt_registry.register(
+    "data_engineer",
+    DATA_ENGINEER_PROMPT,
+    inject_schema=PROMPT_INJECT_SCHEMA and not SCHEMA_CATALOG_ENABLED
+)
+
+def _latest_user_text(messages):
+    """Return the content of the most recent user message"""
+    for message in reversed(messages):
+        if isinstance(message, dict):
+            if message.get("role") == "user" or message.get("type") == "human":
+                return str(message.get("content", ""))
+        elif getattr(message, "type", None) == "human":
+            return str(message.content)
+    return ""
+
 def get_data_engineer_prompt(state: dict, config: RunnableConfig) -> list:
     """
     Define the system prompt for the data engineer agent
     """
-    system_prompt = f"""Generate a Sql query based on user requirement: 
-    """
-    return [{"role": "system", "content": system_prompt}] + state["messages"]
+    context = None
+    if SCHEMA_CATALOG_ENABLED:
+        context = schema_catalog.schema_for_query(_latest_user_text(state["messages"]))
+    return prompt_registry.build_messages("data_engineer", state, context=context)
+
+def _has_sql_block(text):
+    """Small-model output is usable when it contains a ```sql block"""
+    return extract_sql_from_query(text) is not None
 
 def get_data_engineer_agent(tools):
     """
@@ -27,11 +58,17 @@ def get_data_engineer_agent(tools):
     # Initialize the model
     model = HuggingFaceAgent(
         endpoint_url=DATA_ENGINEER_ENDPOINT,
+        endpoint_urls=DATA_ENGINEER_ENDPOINTS,
         api_key=HF_API_KEY,
         temperature=0.1,
-        max_tokens=8192
+        max_tokens=8192,
+        agent_name="data_engineer",
+        stop_sequences=DATA_ENGINEER_STOP_SEQUENCES
     )
     
+    # Light requests may be answered by the smaller model
+    configure_tiering("data_engineer", DATA_ENGINEER_SMALL_ENDPOINTS, validator=_has_sql_block)
+    
     # Create and return the agent
     return create_react_agent(
         model,
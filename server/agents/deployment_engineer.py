@@ -2,17 +2,21 @@
 Deployment Engineer agent implementation
 """
 from server.agents.huggingface_agent import HuggingFaceAgent
-from server.config import DEPLOYMENT_ENGINEER_ENDPOINT, HF_API_KEY
+from server.agents.model_tiering import configure_tiering
+from server.agents.prompt_registry import prompt_registry
+from server.config import DEPLOYMENT_ENGINEER_ENDPOINT, DEPLOYMENT_ENGINEER_ENDPOINTS, DEPLOYMENT_ENGINEER_SMALL_ENDPOINTS, HF_API_KEY
 from langgraph.prebuilt import create_react_agent
 from langchain_core.runnables import RunnableConfig
 
+DEPLOYMENT_ENGINEER_PROMPT = "Generate the documentation for the given deployed code"
+
+prompt_registry.register("deployment_engineer", DEPLOYMENT_ENGINEER_PROMPT)
+
 def get_deployment_engineer_prompt(state: dict, config: RunnableConfig) -> list:
     """
     Define the system prompt for the deployment engineer agent
     """
-    system_prompt = """ Generate the documentation for the given deployed code
-    """
-    return [{"role": "system", "content": system_prompt}] + state["messages"]
+    return prompt_registry.build_messages("deployment_engineer", state)
 
 def get_deployment_engineer_agent(tools):
     """
@@ -27,11 +31,16 @@ def get_deployment_engineer_agent(tools):
     # Initialize the model
     model = HuggingFaceAgent(
         endpoint_url=DEPLOYMENT_ENGINEER_ENDPOINT,
+        endpoint_urls=DEPLOYMENT_ENGINEER_ENDPOINTS,
         api_key=HF_API_KEY,
         temperature=0.1,
-        max_tokens=8192
+        max_tokens=8192,
+        agent_name="deployment_engineer"
     )
     
+    # Light requests may be answered by the smaller model
+    configure_tiering("deployment_engineer", DEPLOYMENT_ENGINEER_SMALL_ENDPOINTS)
+    
     # Create and return the agent
     return create_react_agent(
         model,
@@ -0,0 +1,291 @@
+"""
+Replica pools for model endpoints with hedged requests and circuit breakers
+"""
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from server.utils.stats import percentile
+from server.config import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, HEDGE_ENABLED, HEDGE_MIN_DELAY_MS,
+    HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, HEDGE_POOL_SIZE
+)
+
+# Requests (primary and hedges) run on this shared pool
+_executor = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="model-request")
+
+# Cleared for calls that must not take extra replica capacity (speculative prefetches)
+_hedging_allowed = contextvars.ContextVar("hedging_allowed", default=True)
+
+
+@contextmanager
+def without_hedging():
+    """Send the model calls made inside the block to one replica at a time"""
+    token = _hedging_allowed.set(False)
+    try:
+        yield
+    finally:
+        _hedging_allowed.reset(token)
+
+
+class AttemptCancelled(Exception):
+    """Raised by a request function that stopped because its result is no longer needed"""
+
+
+class ReplicaUnavailable(Exception):
+    """Raised when a replica's breaker refuses a request that was already scheduled"""
+
+
+class CircuitBreaker:
+    """
+    Ejects a replica after consecutive failures and probes it again later
+
+    closed: requests flow. open: the replica is skipped until reset_seconds
+    have passed. half_open: a single probe request is let through while other
+    requests keep skipping the replica; the probe's success closes the breaker
+    and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        """Whether allow_request() would let a request through, without claiming the probe"""
+        with self._lock:
+            if self.state == "open":
+                return time.time() - self.opened_at >= self.reset_seconds
+            return self.state == "closed" or not self._probing
+
+    def allow_request(self):
+        """Whether a request may be sent now; in half_open this claims the single probe"""
+        with self._lock:
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a claimed probe whose request was abandoned before it had an outcome"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Record a failure; returns True when this failure ejected the replica"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.time()
+                return True
+            return False
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=200)
+        self.requests = 0
+        self.failures = 0
+
+
+class EndpointPool:
+    """
+    Sends requests to one of several replicas of the same model
+
+    The primary replica is chosen round-robin among replicas whose breaker is
+    closed. If it has not answered within the hedge delay (a percentile of
+    recent latencies), a duplicate request goes to the next replica and the
+    first successful answer wins. The loser is cancelled: dropped if it has not
+    started, otherwise its cancellation event is set so the request function
+    can abandon it. A failed request fails over to the next replica immediately.
+    """
+
+    def __init__(self, urls):
+        self.replicas = [Replica(url) for url in urls]
+        self._round_robin = itertools.count()
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "ejections": 0, "errors": 0,
+                      "cancelled": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _candidates(self):
+        """
+        Replicas to try, in order, starting at the round-robin position
+
+        Returns:
+            tuple: (replicas, forced) where forced means every replica is
+            ejected and the first one is tried regardless of its breaker
+        """
+        start = next(self._round_robin) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        healthy = [replica for replica in ordered if replica.breaker.available()]
+        if healthy:
+            return healthy, False
+        # With every replica ejected, trying one beats failing outright
+        return ordered[:1], True
+
+    def hedge_delay(self):
+        """Seconds to wait for the primary before hedging, or None if not yet known"""
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            samples = list(self._latencies)
+        return max(HEDGE_MIN_DELAY_MS / 1000.0, percentile(samples, HEDGE_PERCENTILE))
+
+    def _attempt(self, replica, fn, cancelled, forced=False):
+        """Run fn against one replica and record the outcome"""
+        # The breaker is consulted when the attempt starts, so a queued attempt
+        # that is cancelled never holds a half-open replica's probe
+        if not replica.breaker.allow_request() and not forced:
+            raise ReplicaUnavailable(f"Model replica {replica.url} is not accepting requests")
+        start = time.perf_counter()
+        with self._lock:
+            replica.requests += 1
+        try:
+            result = fn(replica.url, cancelled)
+        except AttemptCancelled:
+            replica.breaker.release()
+            raise
+        except Exception:
+            with self._lock:
+                replica.failures += 1
+            if replica.breaker.record_failure():
+                print(f"Ejecting model replica {replica.url} after repeated failures")
+                self._count("ejections")
+            raise
+        elapsed = time.perf_counter() - start
+        replica.breaker.record_success()
+        with self._lock:
+            replica.latencies.append(elapsed)
+            self._latencies.append(elapsed)
+        return result
+
+    def _submit(self, futures, replica, fn, forced=False):
+        cancelled = threading.Event()
+        futures[_executor.submit(self._attempt, replica, fn, cancelled, forced)] = (replica, cancelled)
+
+    def execute(self, fn):
+        """
+        Call fn(url, cancelled) on the replicas with hedging and failover
+
+        Args:
+            fn: Callable taking a replica URL and a threading.Event and returning
+                the result (raises on failure). The event is set when another
+                attempt has already won; fn should then stop and raise
+                AttemptCancelled.
+
+        Returns:
+            The result of the first successful attempt
+        """
+        self._count("requests")
+        candidates, forced = self._candidates()
+        if len(self.replicas) == 1:
+            return self._attempt(candidates[0], fn, threading.Event(), forced)
+
+        futures = {}
+        primary = candidates.pop(0)
+        self._submit(futures, primary, fn, forced)
+        hedged = False
+        hedge_replica = None
+        last_error = None
+
+        while futures:
+            delay = self.hedge_delay() if HEDGE_ENABLED and _hedging_allowed.get() and not hedged and candidates \
+                else None
+            done, _ = wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Primary is slower than usual: race a duplicate on another replica
+                hedged = True
+                self._count("hedges")
+                hedge_replica = candidates.pop(0)
+                self._submit(futures, hedge_replica, fn)
+                continue
+
+            for future in done:
+                replica, _ = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    if candidates and not futures:
+                        self._count("failovers")
+                        self._submit(futures, candidates.pop(0), fn)
+                    continue
+
+                if replica is hedge_replica:
+                    self._count("hedge_wins")
+                for other, (_, cancelled) in futures.items():
+                    if not other.cancel():
+                        cancelled.set()
+                    self._count("cancelled")
+                return result
+
+        self._count("errors")
+        raise last_error
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            replicas = [
+                {
+                    "url": replica.url,
+                    "state": replica.breaker.state,
+                    "requests": replica.requests,
+                    "failures": replica.failures,
+                    "p50_ms": round(percentile(replica.latencies, 50) * 1000, 1) if replica.latencies else None,
+                    "p95_ms": round(percentile(replica.latencies, 95) * 1000, 1) if replica.latencies else None,
+                }
+                for replica in self.replicas
+            ]
+        delay = self.hedge_delay()
+        stats["hedge_rate"] = stats["hedges"] / stats["requests"] if stats["requests"] else 0.0
+        stats["hedge_delay_ms"] = round(delay * 1000, 1) if delay is not None else None
+        return {**stats, "replicas": replicas}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(urls):
+    """Return the shared pool for a list of replica URLs"""
+    key = tuple(urls)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = EndpointPool(key)
+        return pool
+
+
+def get_endpoint_stats():
+    """Return hedge, failover and per-replica counters for every pool"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {",".join(urls): pool.snapshot() for urls, pool in pools.items()}
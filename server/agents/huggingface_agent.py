@@ -1,26 +1,43 @@
 import requests
 import json
+import threading
+import time
 from langchain_core.language_models import BaseLLM
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun
 from typing import Any, Dict, List, Mapping, Optional, Union
-from server.config import HF_API_KEY
+from server.config import (
+    HF_API_KEY, GENERATION_CACHE_TTL, OUTPUT_BUDGET_ENABLED, MODEL_REQUEST_TIMEOUT, TIERING_ENABLED
+)
+from server.agents.endpoint_pool import AttemptCancelled, get_endpoint_pool
+from server.agents.model_tiering import get_tiering_policy
+from server.agents.output_budget import estimate_tokens, get_output_budget
+from server.profiling import profiled
+from server.utils.shared_cache import shared_cache, make_cache_key
 
 class HuggingFaceAgent(BaseLLM):
     """Custom LLM class for Hugging Face API with LangChain integration."""
     
     endpoint_url: str
+    endpoint_urls: List[str] = []
     api_key: str = HF_API_KEY
     temperature: float = 0.1
     max_tokens: int = 8192
+    agent_name: str = ""
+    stop_sequences: List[str] = []
     
     def __init__(self, endpoint_url: str, **kwargs):
         """Initialize the HuggingFaceAgent."""
         super().__init__(**kwargs)
         self.endpoint_url = endpoint_url
+        # Replicas of the same model; requests are hedged and failed over between them
+        self.endpoint_urls = list(kwargs.get("endpoint_urls") or [endpoint_url])
         self.api_key = kwargs.get("api_key", HF_API_KEY)
         self.temperature = kwargs.get("temperature", 0.1)
         self.max_tokens = kwargs.get("max_tokens", 8192)
+        self.agent_name = kwargs.get("agent_name", "")
+        self.stop_sequences = list(kwargs.get("stop_sequences", []))
     
+    @profiled("model_call")
     def _call(
         self,
         prompt: str,
@@ -29,6 +46,124 @@ class HuggingFaceAgent(BaseLLM):
         **kwargs: Any,
     ) -> str:
         """Call the Hugging Face API to generate text based on the prompt."""
+        stops = list(dict.fromkeys((stop or []) + self.stop_sequences))
+        parameters = {
+            "temperature": self.temperature,
+            "do_sample": True
+        }
+        if stops:
+            parameters["stop"] = stops
+        
+        # Add any extra parameters from kwargs
+        for key, value in kwargs.items():
+            if key not in parameters:
+                parameters[key] = value
+        
+        # Identical prompts may already have been answered by any worker
+        cache_key = None
+        if GENERATION_CACHE_TTL > 0:
+            cache_key = make_cache_key(self.endpoint_urls, prompt, parameters)
+            cached = shared_cache.get("generation", cache_key)
+            if cached is not None:
+                return cached
+
+        policy = get_tiering_policy(self.agent_name) if TIERING_ENABLED and self.agent_name else None
+
+        try:
+            text = None
+            if policy is not None and policy.choose_tier(prompt) == "small":
+                text = self._call_small_tier(policy, prompt, parameters)
+            if text is None:
+                start = time.perf_counter()
+                text = self._call_large_tier(prompt, parameters)
+                if policy is not None:
+                    policy.record("large", time.perf_counter() - start)
+
+            if cache_key is not None:
+                shared_cache.set("generation", cache_key, text, GENERATION_CACHE_TTL)
+            return text
+            
+        except Exception as e:
+            print(f"Error calling Hugging Face API: {str(e)}")
+            return f"Error: {str(e)}"
+
+    def _call_large_tier(self, prompt: str, parameters: Dict[str, Any]) -> str:
+        """Generate with the agent's own endpoints within its learned output budget"""
+        # Ask for no more tokens than this agent's responses usually need
+        budget = None
+        max_new_tokens = self.max_tokens
+        if OUTPUT_BUDGET_ENABLED and self.agent_name:
+            budget = get_output_budget(self.agent_name, self.max_tokens)
+            max_new_tokens = budget.current()
+
+        text, finish_reason, generated_tokens, matched_stop = self._generate(prompt, parameters, max_new_tokens)
+
+        # Output cut off by the learned budget: report it and retry at the ceiling
+        if budget and max_new_tokens < self.max_tokens and self._hit_token_limit(
+            text, finish_reason, generated_tokens, max_new_tokens
+        ):
+            print(f"{self.agent_name} output reached its budget of {max_new_tokens} tokens; "
+                  f"retrying with {self.max_tokens}")
+            budget.record("truncated")
+            text, finish_reason, generated_tokens, matched_stop = self._generate(prompt, parameters, self.max_tokens)
+
+        if finish_reason == "stop_sequence":
+            if budget:
+                budget.record("stop_sequence")
+            text = self._restore_stop_sequence(text, matched_stop)
+        if budget:
+            budget.observe(generated_tokens or estimate_tokens(text))
+        return text
+
+    def _call_small_tier(self, policy, prompt: str, parameters: Dict[str, Any]) -> Optional[str]:
+        """
+        Generate with the agent's small model
+
+        Returns:
+            str: The output, or None when it failed validation and the large model should answer
+        """
+        start = time.perf_counter()
+        try:
+            text, finish_reason, generated_tokens, matched_stop = self._generate(
+                prompt, parameters, self.max_tokens, urls=policy.small_urls
+            )
+        except Exception as e:
+            print(f"Small model for {self.agent_name} failed ({str(e)}); escalating")
+            policy.record("small", time.perf_counter() - start, valid=False)
+            return None
+
+        if finish_reason == "stop_sequence":
+            text = self._restore_stop_sequence(text, matched_stop)
+        valid = not self._hit_token_limit(text, finish_reason, generated_tokens, self.max_tokens) \
+            and policy.validate(text)
+        policy.record("small", time.perf_counter() - start, valid=valid)
+        if not valid:
+            print(f"Small model output for {self.agent_name} failed validation; escalating")
+            return None
+        return text
+
+    def _generate(self, prompt: str, parameters: Dict[str, Any], max_new_tokens: int,
+                  urls: Optional[List[str]] = None):
+        """
+        Send one generation request to the agent's replicas (or to the given URLs)
+
+        Returns:
+            tuple: (generated_text, finish_reason or None, generated_tokens or None,
+                    the stop sequence that ended generation or None)
+        """
+        pool = get_endpoint_pool(urls or self.endpoint_urls)
+        return pool.execute(lambda url, cancelled: self._post(url, prompt, parameters, max_new_tokens, cancelled))
+
+    def _post(self, url: str, prompt: str, parameters: Dict[str, Any], max_new_tokens: int,
+              cancelled: Optional[threading.Event] = None):
+        """
+        Send one generation request to a single replica
+
+        The response is streamed so that a request whose result is no longer
+        needed (cancelled is set, e.g. a hedge that lost) can be abandoned by
+        closing the connection, which also stops the generation on the
+        endpoint. Endpoints that do not stream answer with plain JSON.
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -37,34 +172,91 @@ class HuggingFaceAgent(BaseLLM):
         payload = {
             "inputs": prompt,
             "parameters": {
-                "temperature": self.temperature,
-                "max_new_tokens": self.max_tokens,
-                "do_sample": True
-            }
+                **parameters,
+                "max_new_tokens": max_new_tokens,
+                "details": True
+            },
+            "stream": True
         }
-        
-        # Add any extra parameters from kwargs
-        for key, value in kwargs.items():
-            if key not in payload["parameters"]:
-                payload["parameters"][key] = value
-        
+
+        response = requests.post(
+            url,
+            headers=headers,
+            data=json.dumps(payload),
+            timeout=MODEL_REQUEST_TIMEOUT,
+            stream=True
+        )
         try:
-            response = requests.post(
-                self.endpoint_url,
-                headers=headers,
-                data=json.dumps(payload)
-            )
             response.raise_for_status()
-            
-            # Extract and return the generated text
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0:
-                return result[0].get("generated_text", "")
-            return result.get("generated_text", "")
-            
-        except Exception as e:
-            print(f"Error calling Hugging Face API: {str(e)}")
-            return f"Error: {str(e)}"
+            if response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                result, tokens_text = self._read_stream(response, cancelled)
+            else:
+                result = response.json()
+                if isinstance(result, list) and len(result) > 0:
+                    result = result[0]
+                tokens_text = "".join(token.get("text", "") for token in
+                                      (result.get("details") or {}).get("tokens") or [])
+        finally:
+            # Closing an unfinished stream drops the connection and the generation
+            response.close()
+
+        # Extract the generated text and, when reported, why generation stopped
+        details = result.get("details") or {}
+        finish_reason = details.get("finish_reason")
+        matched_stop = None
+        if finish_reason == "stop_sequence":
+            # The generated tokens end with the stop sequence that matched
+            matched_stop = max((stop for stop in parameters.get("stop", []) if tokens_text.endswith(stop)),
+                               key=len, default=None)
+        return (
+            result.get("generated_text", ""),
+            finish_reason,
+            details.get("generated_tokens"),
+            matched_stop,
+        )
+
+    @staticmethod
+    def _read_stream(response, cancelled: Optional[threading.Event]):
+        """
+        Read server-sent token events until the final one, which carries the generated text
+
+        Returns:
+            tuple: (final event, text of all generated tokens)
+        """
+        tokens = []
+        for line in response.iter_lines():
+            if cancelled is not None and cancelled.is_set():
+                raise AttemptCancelled("Generation no longer needed")
+            if not line.startswith(b"data:"):
+                continue
+            event = json.loads(line[len(b"data:"):])
+            if event.get("error"):
+                raise RuntimeError(event["error"])
+            tokens.append((event.get("token") or {}).get("text", ""))
+            if event.get("generated_text") is not None:
+                return event, "".join(tokens)
+        raise RuntimeError("Generation stream ended without a result")
+
+    @staticmethod
+    def _hit_token_limit(text: str, finish_reason: Optional[str], generated_tokens: Optional[int],
+                         max_new_tokens: int) -> bool:
+        """Whether generation stopped because it ran out of tokens"""
+        if finish_reason is not None:
+            return finish_reason == "length"
+        if generated_tokens is not None:
+            return generated_tokens >= max_new_tokens
+        return estimate_tokens(text) >= 0.9 * max_new_tokens
+
+    @staticmethod
+    def _restore_stop_sequence(text: str, stop: Optional[str]) -> str:
+        """
+        Re-append the stop sequence that ended generation for endpoints that strip it
+
+        Nothing is appended when the matched stop sequence is unknown.
+        """
+        if stop and not (text.endswith(stop) or text.rstrip().endswith(stop.strip())):
+            return text + stop
+        return text
     
     @property
     def _llm_type(self) -> str:
@@ -76,6 +268,9 @@ class HuggingFaceAgent(BaseLLM):
         """Return identifying parameters."""
         return {
             "endpoint_url": self.endpoint_url,
+            "endpoint_urls": self.endpoint_urls,
             "temperature": self.temperature,
-            "max_tokens": self.max_tokens
+            "max_tokens": self.max_tokens,
+            "agent_name": self.agent_name,
+            "stop_sequences": self.stop_sequences
         }
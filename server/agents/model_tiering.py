@@ -0,0 +1,169 @@
+"""
+Routing of agent stages between small and large model tiers
+"""
+import math
+import re
+import threading
+from collections import deque
+from server.config import (
+    TIER_EXPLORATION_INTERVAL, TIER_MAX_SMALL_COMPLEXITY, TIER_MIN_SMALL_SUCCESS_RATE, TIER_SUCCESS_WINDOW
+)
+
+# Words that tend to mark requests needing the larger model
+COMPLEX_TERMS = {
+    "join", "joins", "window", "partition", "recursive", "pivot", "subquery", "cte", "rank",
+    "cumulative", "rolling", "percentile", "optimize", "optimise", "concurrent", "async",
+    "thread", "class", "classes", "api", "parser", "algorithm", "dynamic", "graph", "cache",
+}
+
+LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-*]|\d+[.)])\s+", re.MULTILINE)
+
+
+def latest_request(prompt):
+    """Return the text after the last "Human:" turn of a rendered chat prompt"""
+    index = prompt.rfind("Human:")
+    return prompt[index + len("Human:"):] if index >= 0 else prompt
+
+
+def complexity_score(prompt):
+    """
+    Score how demanding the latest request in a prompt is
+
+    Combines the request length (log-scaled), complex-sounding terms, the
+    number of enumerated requirements and embedded code blocks.
+
+    Args:
+        prompt: Rendered prompt sent to the model
+
+    Returns:
+        float: Higher means more complex
+    """
+    request = latest_request(prompt)
+    words = re.findall(r"[a-z_]+", request.lower())
+    score = math.log2(1 + len(words))
+    score += 2 * sum(1 for word in words if word in COMPLEX_TERMS)
+    score += len(LIST_ITEM_PATTERN.findall(request))
+    # Two points per fenced code block (each block has two fences)
+    score += request.count("```")
+    return score
+
+
+class TieringPolicy:
+    """
+    Chooses the small or large tier for each call of one agent
+
+    The small tier is used when the request scores at most max_complexity and
+    the small tier's recent validation success rate is high enough. Every
+    exploration_interval-th call that would otherwise be kept on the large
+    tier because of a low success rate goes to the small tier anyway, so the
+    rate can recover.
+    """
+
+    def __init__(self, agent_name, small_urls, validator=None, max_complexity=TIER_MAX_SMALL_COMPLEXITY,
+                 min_success_rate=TIER_MIN_SMALL_SUCCESS_RATE, window=TIER_SUCCESS_WINDOW,
+                 exploration_interval=TIER_EXPLORATION_INTERVAL):
+        self.agent_name = agent_name
+        self.small_urls = list(small_urls)
+        self.validator = validator
+        self.max_complexity = max_complexity
+        self.min_success_rate = min_success_rate
+        self.exploration_interval = exploration_interval
+        self._outcomes = deque(maxlen=window)
+        self._held_back = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "small": {"calls": 0, "seconds": 0.0},
+            "large": {"calls": 0, "seconds": 0.0},
+            "escalations": 0,
+        }
+
+    def success_rate(self):
+        with self._lock:
+            if not self._outcomes:
+                return 1.0
+            return sum(self._outcomes) / len(self._outcomes)
+
+    def choose_tier(self, prompt):
+        """Return "small" or "large" for this prompt"""
+        if not self.small_urls or complexity_score(prompt) > self.max_complexity:
+            return "large"
+        if self.success_rate() >= self.min_success_rate:
+            return "small"
+        with self._lock:
+            self._held_back += 1
+            explore = self.exploration_interval and self._held_back % self.exploration_interval == 0
+        return "small" if explore else "large"
+
+    def validate(self, text):
+        """Whether a small-tier output is usable as is"""
+        if not text or text.startswith("Error:"):
+            return False
+        return self.validator(text) if self.validator else True
+
+    def record(self, tier, seconds, valid=None):
+        """Record a call's latency and, for the small tier, whether it validated"""
+        with self._lock:
+            self.stats[tier]["calls"] += 1
+            self.stats[tier]["seconds"] += seconds
+            if valid is not None:
+                self._outcomes.append(1 if valid else 0)
+                if not valid:
+                    self.stats["escalations"] += 1
+
+    def snapshot(self):
+        success_rate = self.success_rate()
+        with self._lock:
+            result = {"escalations": self.stats["escalations"], "small_success_rate": success_rate}
+            for tier in ("small", "large"):
+                calls = self.stats[tier]["calls"]
+                result[tier] = {
+                    "calls": calls,
+                    "mean_ms": round(1000 * self.stats[tier]["seconds"] / calls, 1) if calls else None,
+                }
+            small_calls = self.stats["small"]["calls"]
+            result["escalation_rate"] = self.stats["escalations"] / small_calls if small_calls else 0.0
+        return result
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def configure_tiering(agent_name, small_urls, validator=None):
+    """
+    Register the tiering policy of an agent (called from the agent factories)
+
+    Swarm rebuilds call this again with the same URLs; the existing policy is
+    kept then, so its learned small-tier success rate and counters survive.
+
+    Args:
+        agent_name: Name of the agent
+        small_urls: Replica URLs of the small tier (empty disables tiering)
+        validator: Callable returning True when a small-tier output is usable
+
+    Returns:
+        The TieringPolicy, or None when the agent has no small tier
+    """
+    small_urls = [url for url in small_urls if url]
+    with _policies_lock:
+        if not small_urls:
+            _policies.pop(agent_name, None)
+            return None
+        policy = _policies.get(agent_name)
+        if policy is not None and policy.small_urls == small_urls:
+            policy.validator = validator
+            return policy
+        policy = _policies[agent_name] = TieringPolicy(agent_name, small_urls, validator)
+        return policy
+
+
+def get_tiering_policy(agent_name):
+    with _policies_lock:
+        return _policies.get(agent_name)
+
+
+def get_tiering_stats():
+    """Return per-tier latency and escalation counters for every agent"""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {name: policy.snapshot() for name, policy in policies.items()}
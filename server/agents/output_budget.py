@@ -0,0 +1,81 @@
+"""
+Per-agent output token budgets learned from observed response lengths
+"""
+import math
+import threading
+from collections import deque
+from server.utils.stats import percentile
+from server.config import (
+    OUTPUT_BUDGET_FLOOR, OUTPUT_BUDGET_MARGIN, OUTPUT_BUDGET_MIN_SAMPLES, OUTPUT_BUDGET_WINDOW
+)
+
+
+def estimate_tokens(text):
+    """Rough token count for endpoints that do not report generated_tokens"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+class OutputBudget:
+    """
+    Tracks an agent's recent response lengths and derives its max_new_tokens
+
+    Until min_samples responses have been seen the configured ceiling is used.
+    After that the budget is the p95 of the recent window plus a margin,
+    clamped between floor and ceiling.
+    """
+
+    def __init__(self, ceiling, margin=OUTPUT_BUDGET_MARGIN, min_samples=OUTPUT_BUDGET_MIN_SAMPLES,
+                 floor=OUTPUT_BUDGET_FLOOR, window=OUTPUT_BUDGET_WINDOW):
+        self.ceiling = ceiling
+        self.margin = margin
+        self.min_samples = min_samples
+        self.floor = min(floor, ceiling)
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "truncated": 0, "stop_sequence": 0}
+
+    def current(self):
+        """Return the max_new_tokens to request for the next call"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.ceiling
+            samples = list(self._samples)
+        p95 = percentile(samples, 95)
+        return max(self.floor, min(self.ceiling, int(p95 * (1 + self.margin))))
+
+    def observe(self, tokens):
+        """Record the length of a complete (not truncated) response"""
+        with self._lock:
+            self._samples.append(tokens)
+            self.stats["calls"] += 1
+
+    def record(self, outcome):
+        """Count an early-termination outcome ('truncated' or 'stop_sequence')"""
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            samples = len(self._samples)
+        return {**stats, "samples": samples, "budget": self.current(), "ceiling": self.ceiling}
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_output_budget(agent_name, ceiling):
+    """Return the shared budget tracker for an agent, creating it on first use"""
+    with _budgets_lock:
+        budget = _budgets.get(agent_name)
+        if budget is None:
+            budget = _budgets[agent_name] = OutputBudget(ceiling)
+        return budget
+
+
+def get_output_budget_stats():
+    """Return budget and early-termination counters for every agent"""
+    with _budgets_lock:
+        budgets = dict(_budgets)
+    return {name: budget.snapshot() for name, budget in budgets.items()}
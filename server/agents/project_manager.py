@@ -2,17 +2,21 @@
 Project Manager agent implementation
 """
 from server.agents.huggingface_agent import HuggingFaceAgent
-from server.config import PROJECT_MANAGER_ENDPOINT, HF_API_KEY
+from server.agents.model_tiering import configure_tiering
+from server.agents.prompt_registry import prompt_registry
+from server.config import PROJECT_MANAGER_ENDPOINT, PROJECT_MANAGER_ENDPOINTS, PROJECT_MANAGER_SMALL_ENDPOINTS, HF_API_KEY
 from langgraph.prebuilt import create_react_agent
 from langchain_core.runnables import RunnableConfig
 
+PROJECT_MANAGER_PROMPT = "Break down the given task into development, testing and documentation"
+
+prompt_registry.register("project_manager", PROJECT_MANAGER_PROMPT)
+
 def get_project_manager_prompt(state: dict, config: RunnableConfig) -> list:
     """
     Define the system prompt for the project manager agent
     """
-    system_prompt = """ Break down the given task into development, testing and documentation 
-    """
-    return [{"role": "system", "content": system_prompt}] + state["messages"]
+    return prompt_registry.build_messages("project_manager", state)
 
 def get_project_manager_agent(tools):
     """
@@ -27,11 +31,16 @@ def get_project_manager_agent(tools):
     # Initialize the model
     model = HuggingFaceAgent(
         endpoint_url=PROJECT_MANAGER_ENDPOINT,
+        endpoint_urls=PROJECT_MANAGER_ENDPOINTS,
         api_key=HF_API_KEY,
         temperature=0.1,
-        max_tokens=8192
+        max_tokens=8192,
+        agent_name="project_manager"
     )
     
+    # Light requests may be answered by the smaller model
+    configure_tiering("project_manager", PROJECT_MANAGER_SMALL_ENDPOINTS)
+    
     # Create and return the agent
     return create_react_agent(
         model,
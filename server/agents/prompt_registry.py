@@ -0,0 +1,128 @@
+"""
+Registry of precompiled, versioned system prompts for the agents
+"""
+import threading
+from langchain_core.messages import SystemMessage
+from server.config import DATABASE_SCHEMA, PROMPT_VERSIONS
+
+SCHEMA_SECTION = "\n\nDatabase schema:\n{schema}"
+
+
+class PromptRegistry:
+    """
+    Compiles each agent's system prompt once and hands out the same message object
+
+    Templates are registered per agent and version. Compilation (whitespace
+    normalisation and optional schema injection) happens once per template, so
+    every graph step sees a byte-identical system prefix. Endpoints that support
+    prefix/KV caching can then reuse it across requests.
+    """
+
+    def __init__(self, schema="", active_versions=None):
+        self.schema = schema.strip()
+        self._templates = {}
+        self._compiled = {}
+        self._active = dict(active_versions or {})
+        self._lock = threading.Lock()
+
+    def register(self, agent_name, template, version="v1", inject_schema=False):
+        """
+        Register a system prompt template for an agent
+
+        Args:
+            agent_name: Name of the agent (e.g. "data_engineer")
+            template: System prompt text
+            version: Version label of the template
+            inject_schema: Append the database schema to the compiled prompt
+        """
+        with self._lock:
+            self._templates[(agent_name, version)] = (template, inject_schema)
+            self._compiled.pop((agent_name, version), None)
+            self._active.setdefault(agent_name, version)
+
+    def set_active_version(self, agent_name, version):
+        """Select which registered version of an agent's prompt is used"""
+        with self._lock:
+            if (agent_name, version) not in self._templates:
+                raise KeyError(f"No prompt version '{version}' registered for {agent_name}")
+            self._active[agent_name] = version
+
+    def validate(self):
+        """
+        Check that every selected prompt version is registered
+
+        Call once all agents have registered their templates, so a bad
+        PROMPT_VERSIONS value fails at startup instead of on the first request.
+
+        Raises:
+            ValueError: If an active version names an unknown agent or version
+        """
+        with self._lock:
+            missing = sorted(f"{agent_name}={version}" for agent_name, version in self._active.items()
+                             if (agent_name, version) not in self._templates)
+            registered = sorted(f"{agent_name}={version}" for agent_name, version in self._templates)
+        if missing:
+            raise ValueError(
+                f"PROMPT_VERSIONS selects prompt versions that are not registered: {', '.join(missing)} "
+                f"(registered: {', '.join(registered)})"
+            )
+
+    def get_system_message(self, agent_name, version=None):
+        """
+        Return the compiled system message for an agent
+
+        Args:
+            agent_name: Name of the agent
+            version: Optional version label; defaults to the active version
+
+        Returns:
+            The cached SystemMessage for the agent and version
+        """
+        key = (agent_name, version or self._active.get(agent_name, "v1"))
+        message = self._compiled.get(key)
+        if message is None:
+            with self._lock:
+                message = self._compiled.get(key)
+                if message is None:
+                    message = self._compile(*key)
+                    self._compiled[key] = message
+        return message
+
+    def _compile(self, agent_name, version):
+        if (agent_name, version) not in self._templates:
+            raise KeyError(f"No prompt version '{version}' registered for {agent_name}")
+        template, inject_schema = self._templates[(agent_name, version)]
+        content = " ".join(template.split())
+        if inject_schema and self.schema:
+            content += SCHEMA_SECTION.format(schema=self.schema)
+        return SystemMessage(content=content)
+
+    def build_messages(self, agent_name, state, context=None):
+        """
+        Build the message list for a graph step with a stable system prefix
+
+        Args:
+            agent_name: Name of the agent
+            state: Graph state holding the conversation messages
+            context: Optional per-request text placed after the shared prefix
+
+        Returns:
+            List of messages starting with the cached system message
+        """
+        prefix = [self.get_system_message(agent_name)]
+        if context:
+            prefix.append(SystemMessage(content=context))
+        return prefix + state["messages"]
+
+
+def _parse_versions(spec):
+    """Parse "agent=version,agent=version" into a dict"""
+    versions = {}
+    for part in spec.split(","):
+        agent_name, _, version = part.partition("=")
+        if agent_name.strip() and version.strip():
+            versions[agent_name.strip()] = version.strip()
+    return versions
+
+
+prompt_registry = PromptRegistry(schema=DATABASE_SCHEMA, active_versions=_parse_versions(PROMPT_VERSIONS))
@@ -2,17 +2,25 @@
 QA Tester agent implementation
 """
 from server.agents.huggingface_agent import HuggingFaceAgent
-from server.config import QA_TESTER_ENDPOINT, HF_API_KEY
+from server.agents.model_tiering import configure_tiering
+from server.agents.prompt_registry import prompt_registry
+from server.config import QA_TESTER_ENDPOINT, QA_TESTER_ENDPOINTS, QA_TESTER_SMALL_ENDPOINTS, HF_API_KEY
 from langgraph.prebuilt import create_react_agent
 from langchain_core.runnables import RunnableConfig
 
+QA_TESTER_PROMPT = "Generate the testcases for the given code"
+
+prompt_registry.register("qa_tester", QA_TESTER_PROMPT)
+
 def get_qa_tester_prompt(state: dict, config: RunnableConfig) -> list:
     """
     Define the system prompt for the QA tester agent
     """
-    system_prompt = """Generate the testcases for the given code
-    """
-    return [{"role": "system", "content": system_prompt}] + state["messages"]
+    return prompt_registry.build_messages("qa_tester", state)
+
+def _has_assertions(text):
+    """Small-model output is usable when it contains test assertions"""
+    return "assert" in text
 
 def get_qa_tester_agent(tools):
     """
@@ -27,11 +35,16 @@ def get_qa_tester_agent(tools):
     # Initialize the model
     model = HuggingFaceAgent(
         endpoint_url=QA_TESTER_ENDPOINT,
+        endpoint_urls=QA_TESTER_ENDPOINTS,
         api_key=HF_API_KEY,
         temperature=0.1,
-        max_tokens=8192
+        max_tokens=8192,
+        agent_name="qa_tester"
     )
     
+    # Light requests may be answered by the smaller model
+    configure_tiering("qa_tester", QA_TESTER_SMALL_ENDPOINTS, validator=_has_assertions)
+    
     # Create and return the agent
     return create_react_agent(
         model,
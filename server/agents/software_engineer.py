@@ -1,16 +1,23 @@
 from server.agents.huggingface_agent import HuggingFaceAgent
-from server.config import SOFTWARE_ENGINEER_ENDPOINT, HF_API_KEY
+from server.agents.model_tiering import configure_tiering
+from server.agents.prompt_registry import prompt_registry
+from server.config import SOFTWARE_ENGINEER_ENDPOINT, SOFTWARE_ENGINEER_ENDPOINTS, SOFTWARE_ENGINEER_SMALL_ENDPOINTS, HF_API_KEY
 from langgraph.prebuilt import create_react_agent
 from langchain_core.runnables import RunnableConfig
 
+SOFTWARE_ENGINEER_PROMPT = "Generate a Python code based on user requirement"
+
+prompt_registry.register("software_engineer", SOFTWARE_ENGINEER_PROMPT)
+
 def get_software_engineer_prompt(state: dict, config: RunnableConfig) -> list:
     """
     Define the system prompt for the software engineer agent
     """
-    system_prompt = """
-    Generate a Python code based on user requirement 
-    """
-    return [{"role": "system", "content": system_prompt}] + state["messages"]
+    return prompt_registry.build_messages("software_engineer", state)
+
+def _has_python_code(text):
+    """Small-model output is usable when it contains Python code"""
+    return "```python" in text or "def " in text
 
 def get_software_engineer_agent(tools):
     """
@@ -25,11 +32,16 @@ def get_software_engineer_agent(tools):
     # Initialize the model
     model = HuggingFaceAgent(
         endpoint_url=SOFTWARE_ENGINEER_ENDPOINT,
+        endpoint_urls=SOFTWARE_ENGINEER_ENDPOINTS,
         api_key=HF_API_KEY,
         temperature=0.1,
-        max_tokens=8192
+        max_tokens=8192,
+        agent_name="software_engineer"
     )
     
+    # Light requests may be answered by the smaller model
+    configure_tiering("software_engineer", SOFTWARE_ENGINEER_SMALL_ENDPOINTS, validator=_has_python_code)
+    
     # Create and return the agent
     return create_react_agent(
         model,
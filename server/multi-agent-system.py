@@ -1,7 +1,10 @@
 """
 Multi-agent system implementation for the chatbot
 """
+import functools
+import threading
 import traceback
+import uuid
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph_swarm import create_handoff_tool, create_swarm
 from langchain_core.tools import tool
@@ -13,11 +16,31 @@ from server.agents import (
     get_qa_tester_agent,
     get_deployment_engineer_agent
 )
+from server.agents.prompt_registry import prompt_registry
 
+# Every agent module has registered its prompts by now; reject a PROMPT_VERSIONS
+# value naming a template that does not exist before the first chat request
+prompt_registry.validate()
+
+from server.config import (
+    SPECULATIVE_PREFETCH_ENABLED, SPECULATIVE_MAX_WORKERS, CODE_EXECUTION_ENABLED, SQL_ASYNC_ENABLED,
+    SQL_ASYNC_WAIT_SECONDS, ARTIFACT_STORE_ENABLED, ARTIFACT_REFERENCE_HANDOFF, ADMISSION_ENABLED
+)
+from server.admission import admission_controller
+from server.agents.endpoint_pool import without_hedging
+from server.profiling import profiled
+from server.speculation import SpeculativeExecutor
 from server.utils import (
     process_and_execute_sql_query,
+    process_and_submit_sql_query,
     push_md_to_github_with_auto_numbering,
-    build_table_string
+    build_table_string,
+    build_table_columns,
+    split_message_blocks,
+    code_runner,
+    format_test_report,
+    artifact_store,
+    make_reference
 )
 
 def setup_swarm():
@@ -103,7 +126,182 @@ def setup_swarm():
     swarm = builder.compile(checkpointer=checkpointer)
     return swarm
 
-def process_query(swarm, query, user_id, thread_id, agent_outputs=None):
+# Stage whose output is prepended to the input of each downstream stage
+STAGE_INPUT_SOURCE = {
+    'se': 'pm',
+    'qa': 'se',
+    'dp': 'se',
+}
+
+# Kind of artifact each stage produces
+STAGE_ARTIFACT_KIND = {
+    'pm': 'plan',
+    'se': 'code',
+    'qa': 'tests',
+    'dp': 'docs',
+    'de': 'sql',
+}
+
+speculative_executor = SpeculativeExecutor(max_workers=SPECULATIVE_MAX_WORKERS)
+
+# Number of checkpointed messages already attributed to agents, per
+# "user_id:thread_id" checkpoint thread, so each invocation only scans the
+# messages it added. Entries are dropped with the thread's history.
+processed_message_counts = {}
+processed_message_lock = threading.Lock()
+
+def classify_query(query):
+    """
+    Determine which agent stage a query is routed to based on its keywords
+
+    Parameters:
+        query (str): The query text
+
+    Returns:
+        str: One of 'pm', 'se', 'qa', 'dp' or 'de'
+    """
+    lowered = query.lower()
+    if "project" in lowered:
+        return 'pm'
+    elif "software" in lowered:
+        return 'se'
+    elif "tester" in lowered:
+        return 'qa'
+    elif "deployment" in lowered:
+        return 'dp'
+    # Default to data engineer for other queries
+    return 'de'
+
+def build_stage_input(agent_type, query, agent_outputs, inline=False):
+    """
+    Build the text sent to the swarm for a stage, prefixed with the output of
+    the stage it depends on when that output is available
+
+    With ARTIFACT_REFERENCE_HANDOFF, a source output that was stored as an
+    artifact and is the most recent response in the thread is replaced by its
+    compact reference, since the model sees it as the last message anyway. An
+    older output (e.g. the code when the tests came after it) is always sent in
+    full, as is everything when inline=True, for runs on a scratch thread that
+    does not hold the earlier messages.
+    """
+    source = STAGE_INPUT_SOURCE.get(agent_type)
+    if not (source and source in agent_outputs and agent_outputs[source]):
+        return query
+    artifact_hash = agent_outputs.get('artifacts', {}).get(source)
+    if (ARTIFACT_REFERENCE_HANDOFF and artifact_hash and not inline
+            and agent_outputs.get('last_stage') == source):
+        reference = make_reference(artifact_hash, STAGE_ARTIFACT_KIND[source])
+        return f"[{reference}: the {STAGE_ARTIFACT_KIND[source]} in the previous agent's response] {query}"
+    return str(agent_outputs[source]) + " " + query
+
+def _discard_scratch_thread(swarm, scratch_thread_id):
+    """
+    Drop the checkpoints of a thread (e.g. a speculative scratch thread) if the saver supports it
+
+    Returns:
+        bool: True if the checkpoints were deleted
+    """
+    checkpointer = getattr(swarm, 'checkpointer', None)
+    if checkpointer is not None and hasattr(checkpointer, 'delete_thread'):
+        try:
+            checkpointer.delete_thread(scratch_thread_id)
+            return True
+        except Exception as e:
+            print(f"Error discarding thread {scratch_thread_id}: {str(e)}")
+    return False
+
+def _run_speculative_stage(swarm, stage_input, user_id, scratch_thread_id):
+    """
+    Invoke the swarm for a stage on a scratch thread so the real thread is untouched
+
+    The speculation takes an admission slot like a chat request, but only when
+    one is free right away, and its model calls are not hedged, so prefetching
+    never takes capacity from requests that are running or waiting.
+    """
+    ticket = admission_controller.try_acquire(user_id, 'long') if ADMISSION_ENABLED else None
+    if ADMISSION_ENABLED and ticket is None:
+        raise RuntimeError("No free admission slot for speculation")
+    try:
+        with without_hedging():
+            res = swarm.invoke(
+                {"messages": [{"role": "user", "content": stage_input}]},
+                {"configurable": {"thread_id": scratch_thread_id, "user_id": user_id}, "recursion_limit": 100},
+            )
+    finally:
+        if ticket is not None:
+            admission_controller.release(ticket)
+    return res, scratch_thread_id
+
+def _commit_speculative_result(swarm, res, config):
+    """Append the messages produced on a scratch thread to the real conversation thread"""
+    messages = res.get('messages', [])
+    ai_names = [getattr(m, 'name', None) for m in messages if getattr(m, 'type', None) == "ai"]
+    as_node = next((name for name in reversed(ai_names) if name), None)
+    swarm.update_state(config, {"messages": messages}, as_node=as_node)
+
+def schedule_downstream_stages(swarm, completed_stage, upcoming, user_id, thread_id, agent_outputs):
+    """
+    Prefetch the upcoming stages whose input is fully determined by the output
+    of the stage that just completed
+
+    Parameters:
+        swarm: The swarm object containing the agent system
+        completed_stage (str): Agent type whose output was just committed
+        upcoming (list): Queries that will be processed next in this chain
+        user_id (str): Unique identifier for the user
+        thread_id (str): Unique identifier for the conversation thread
+        agent_outputs (dict): Outputs committed so far
+    """
+    if not SPECULATIVE_PREFETCH_ENABLED or not upcoming or not agent_outputs.get(completed_stage):
+        return
+
+    thread_key = f"{user_id}:{thread_id}"
+    previous_stage = completed_stage
+    for upcoming_query in upcoming:
+        stage = classify_query(upcoming_query)
+        preceding, previous_stage = previous_stage, stage
+        if STAGE_INPUT_SOURCE.get(stage) != completed_stage:
+            continue
+
+        # Claimed by the input the real stage will build once the stages
+        # before it have run; the scratch thread has no history, so the
+        # speculation itself needs the full text
+        stage_input = build_stage_input(stage, upcoming_query, {**agent_outputs, 'last_stage': preceding})
+        scratch_input = build_stage_input(stage, upcoming_query, agent_outputs, inline=True)
+        scratch_thread_id = f"{thread_key}:speculative:{stage}:{uuid.uuid4().hex[:8]}"
+        print(f"Prefetching stage {stage} for thread {thread_key}")
+        speculative_executor.schedule(
+            thread_key,
+            stage,
+            stage_input,
+            functools.partial(_run_speculative_stage, swarm, scratch_input, user_id, scratch_thread_id),
+            on_discard=lambda future, sid=scratch_thread_id: _discard_scratch_thread(swarm, sid),
+        )
+
+def reset_thread_state(user_id, thread_id, shared_swarm=None):
+    """
+    Cancel any in-flight work for a conversation thread and clear its history
+
+    The processed message count is only dropped together with the thread's
+    history. If a shared swarm keeps serving the thread and its saver cannot
+    delete the thread's checkpoints, the history is replayed on the next
+    invocation, so the count (which already points at its end) is kept and
+    those old messages are not attributed to agents again.
+
+    Parameters:
+        user_id (str): Owner of the thread
+        thread_id (str): Conversation thread being reset
+        shared_swarm: Swarm whose checkpointer keeps serving the thread after the
+            reset, or None when the thread's history is discarded with its swarm
+    """
+    thread_key = f"{user_id}:{thread_id}"
+    speculative_executor.cancel(thread_key)
+    if shared_swarm is None or _discard_scratch_thread(shared_swarm, thread_key):
+        with processed_message_lock:
+            processed_message_counts.pop(thread_key, None)
+
+@profiled("process_query")
+def process_query(swarm, query, user_id, thread_id, agent_outputs=None, upcoming=None, sections=None):
     """
     Process a query through the agent swarm system and return only the last message
     from the appropriate agent.
@@ -114,6 +312,11 @@ def process_query(swarm, query, user_id, thread_id, agent_outputs=None):
         user_id (str): Unique identifier for the user
         thread_id (str): Unique identifier for the conversation thread
         agent_outputs (dict): Dictionary to store outputs from different agents
+        upcoming (list): Queries that will follow this one in the same chain; used
+            to prefetch downstream stages as soon as their input is known
+        sections (list): When given, a structured section (agent name plus text,
+            code, table and test blocks) is appended for the response; SQL
+            results are then added as column arrays instead of an ASCII table
 
     Returns:
         tuple: (formatted_response, updated_agent_outputs)
@@ -124,64 +327,56 @@ def process_query(swarm, query, user_id, thread_id, agent_outputs=None):
         if agent_outputs is None:
             agent_outputs = {}
 
+        # Checkpoints are per user: two users may both use thread "default"
+        thread_key = f"{user_id}:{thread_id}"
+        config = {"configurable": {"thread_id": thread_key, "user_id": user_id}, "recursion_limit": 100}
+
         # Determine which agent to use based on keywords in the query
-        if "project" in query.lower():
-            res = swarm.invoke(
-                {"messages": [{"role": "user", "content": query}]},
-                {"configurable": {"thread_id": thread_id, "user_id": user_id}, "recursion_limit": 100},
-            )
-            agent_type = 'pm'
+        agent_type = classify_query(query)
+        if agent_type == 'pm':
             agent_outputs['pm'] = ""
-
-        elif "software" in query.lower():
-            # Use project manager output if available
-            combined_input = query
-            if 'pm' in agent_outputs and agent_outputs['pm']:
-                combined_input = str(agent_outputs['pm']) + " " + query
-
-            res = swarm.invoke(
-                {"messages": [{"role": "user", "content": combined_input}]},
-                {"configurable": {"thread_id": thread_id, "user_id": user_id}, "recursion_limit": 100},
-            )
-            agent_type = 'se'
-
-        elif "tester" in query.lower():
-            # Use software engineer output if available
-            combined_input = query
-            if 'se' in agent_outputs and agent_outputs['se']:
-                combined_input = str(agent_outputs['se']) + " " + query
-
+        combined_input = build_stage_input(agent_type, query, agent_outputs)
+
+        # Use a prefetched result when one was started with the same input, and
+        # drop speculations that are no longer part of the plan
+        res = None
+        speculative = False
+        speculation = speculative_executor.claim(thread_key, agent_type, combined_input)
+        speculative_executor.retain(thread_key, {classify_query(q) for q in (upcoming or [])})
+        if speculation is not None:
+            try:
+                res, scratch_thread_id = speculation.result()
+                _discard_scratch_thread(swarm, scratch_thread_id)
+                _commit_speculative_result(swarm, res, config)
+                speculative = True
+                print(f"Using prefetched result for stage {agent_type}")
+            except Exception as e:
+                print(f"Discarding speculative result for stage {agent_type}: {str(e)}")
+                res = None
+
+        if res is None:
             res = swarm.invoke(
                 {"messages": [{"role": "user", "content": combined_input}]},
-                {"configurable": {"thread_id": thread_id, "user_id": user_id}, "recursion_limit": 100},
+                config,
             )
-            agent_type = 'qa'
-
-        elif "deployment" in query.lower():
-            # Use software engineer output if available
-            combined_input = query
-            if 'se' in agent_outputs and agent_outputs['se']:
-                combined_input = str(agent_outputs['se']) + " " + query
-
-            res = swarm.invoke(
-                {"messages": [{"role": "user", "content": combined_input}]},
-                {"configurable": {"thread_id": thread_id, "user_id": user_id}, "recursion_limit": 100},
-            )
-            agent_type = 'dp'
-
-        else:
-            # Default to data engineer for other queries
-            res = swarm.invoke(
-                {"messages": [{"role": "user", "content": query}]},
-                {"configurable": {"thread_id": thread_id, "user_id": user_id}, "recursion_limit": 100},
-            )
-            agent_type = 'de'
-
-        print(f"Full message: {res}")
 
         # Get messages from the response
         messages = res.get('messages', [])
 
+        # The checkpointer replays the whole thread, so only scan the messages
+        # added by this invocation. A scratch thread from a speculation holds
+        # only its own messages; they were appended to the real thread above.
+        with processed_message_lock:
+            processed = processed_message_counts.get(thread_key, 0)
+            if speculative:
+                start = 0
+                processed_message_counts[thread_key] = processed + len(messages)
+            else:
+                # A shorter thread means the history was replaced; rescan it
+                start = processed if processed <= len(messages) else 0
+                processed_message_counts[thread_key] = len(messages)
+        new_messages = messages[start:]
+
         # Initialize variables to track the last message
         last_agent_message = None
         last_agent_name = None
@@ -189,7 +384,7 @@ def process_query(swarm, query, user_id, thread_id, agent_outputs=None):
         count = 0
         
         # Skip the first message which is the user query
-        for i, message in enumerate(messages[1:], 1):
+        for i, message in enumerate(new_messages[1:], 1):
             if isinstance(message, dict):
                 # Extract relevant information
                 msg_type = message.get('type')
@@ -227,24 +422,76 @@ def process_query(swarm, query, user_id, thread_id, agent_outputs=None):
                         elif agent_type == 'de':
                             agent_outputs['de'] = message.content
 
+        # Record the stage's output so later stages, responses and publishing can refer to it by hash
+        artifact_hash = None
+        if ARTIFACT_STORE_ENABLED and last_agent_message:
+            content = dp_final[count] if agent_type == 'dp' else last_agent_message
+            artifact_hash = artifact_store.put(content, STAGE_ARTIFACT_KIND[agent_type], user_id, thread_id, agent_type)
+            if artifact_hash:
+                agent_outputs.setdefault('artifacts', {})[agent_type] = artifact_hash
+        agent_outputs['last_stage'] = agent_type
+
+        # Start the next stages while this one is formatted and post-processed
+        schedule_downstream_stages(swarm, agent_type, upcoming, user_id, thread_id, agent_outputs)
+
         # Format only the last message
         formatted_response = ""
         if last_agent_message and last_agent_name:
-            formatted_response = f"Agent: {last_agent_name.replace('_', ' ').upper()}\n\n{last_agent_message}"
+            agent_label = last_agent_name.replace('_', ' ').upper()
+            formatted_response = f"Agent: {agent_label}\n\n{last_agent_message}"
+            section = {"agent": agent_label, "blocks": split_message_blocks(last_agent_message)}
+            if artifact_hash:
+                section["artifact"] = artifact_hash
+            if sections is not None:
+                sections.append(section)
 
             # Handle special case for data engineer - execute SQL and add results
             if agent_type == 'de':
-                result = process_and_execute_sql_query(last_agent_message)
-                if result["status"] == "success":
+                if SQL_ASYNC_ENABLED:
+                    # Long-running queries keep running after the response is sent
+                    result = process_and_submit_sql_query(
+                        last_agent_message, user_id, thread_id, wait=SQL_ASYNC_WAIT_SECONDS
+                    )
+                else:
+                    result = process_and_execute_sql_query(last_agent_message)
+                if result["status"] == "success" and sections is not None:
+                    # Structured clients render the table themselves
+                    section["blocks"].append(build_table_columns(result['data'], result['column_names']))
+                elif result["status"] == "success":
                     table_str = build_table_string(result['data'], result['column_names'])
                     formatted_response += f"\n\n```\n{table_str}\n```"
+                elif result["status"] == "running":
+                    agent_outputs['query_id'] = result['query_id']
+                    section["blocks"].append({"type": "query", "query_id": result['query_id'], "status": "running"})
+                    formatted_response += (
+                        f"\n\nQuery {result['query_id']} is still running. "
+                        f"Fetch its results from /api/queries/{result['query_id']}."
+                    )
+            # Run the generated tests against the generated code
+            elif agent_type == 'qa' and CODE_EXECUTION_ENABLED and agent_outputs.get('se'):
+                test_results = code_runner.run_tests(agent_outputs['se'], last_agent_message)
+                agent_outputs['qa_results'] = test_results
+                formatted_response += f"\n\n```\n{format_test_report(test_results)}\n```"
+                section["blocks"].append({"type": "tests", **test_results})
             elif agent_type == 'dp':
                 if count > 0:
                     dp_final[count] = dp_final[count].replace(dp_final[count - 1], "")
-                push_md_to_github_with_auto_numbering(
-                    content=dp_final[count],
-                    commit_message="Daily Status Commits"
-                )
+                published = artifact_store.get_publication(artifact_hash, user_id) if artifact_hash else None
+                if published:
+                    # This user already pushed identical documentation
+                    print(f"Documentation already published to {published}")
+                elif artifact_hash:
+                    github_path = push_md_to_github_with_auto_numbering(
+                        artifact_hash=artifact_hash,
+                        commit_message=f"Daily Status Commits ({make_reference(artifact_hash, 'docs')})"
+                    )
+                    if github_path:
+                        artifact_store.record_publication(artifact_hash, user_id, github_path)
+                else:
+                    push_md_to_github_with_auto_numbering(
+                        content=dp_final[count],
+                        commit_message="Daily Status Commits"
+                    )
                 count += 1
 
         return formatted_response, agent_outputs
@@ -252,4 +499,7 @@ def process_query(swarm, query, user_id, thread_id, agent_outputs=None):
     except Exception as e:
         print(f"Error in process_query: {str(e)}")
         traceback.print_exc()
-        return f"Error processing your request: {str(e)}", agent_outputs if 'agent_outputs' in locals() else {}
+        message = f"Error processing your request: {str(e)}"
+        if sections is not None:
+            sections.append({"agent": "ERROR", "blocks": [{"type": "text", "text": message}]})
+        return message, agent_outputs if 'agent_outputs' in locals() else {}
@@ -0,0 +1,325 @@
+"""
+Opt-in profiling of individual API requests
+
+A profiled request gets a sampling profiler: a background thread records the
+stacks of the threads working on the request every few milliseconds, so the
+request itself runs unmodified. Functions decorated with @profiled (model
+calls, SQL execution, table formatting, ...) additionally record their call
+counts and wall time, and enrol the thread they run on for sampling; agent
+steps that LangGraph runs on its worker threads are covered that way.
+Optionally, tracemalloc snapshots taken before and after the request show
+where memory was allocated.
+
+Finished profiles are written as JSON files to a local directory.
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from server.config import PROFILE_PATH, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES
+
+# Deepest stack recorded per sample
+MAX_STACK_DEPTH = 64
+
+# Allocation sites kept from the tracemalloc comparison
+MEMORY_TOP_LINES = 25
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+# tracemalloc is process-wide; it runs while any memory profile does
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+
+def _fold_stack(frame):
+    """Render a frame's stack root-first as 'func (file:line);func (file:line);...'"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfile:
+    """
+    Profile of one request
+
+    Parameters:
+    label (str): What is being profiled, e.g. 'POST /api/chat'
+    user_id (str): User making the request
+    trigger (str): 'header' or 'sampled'
+    memory (bool): Also compare tracemalloc snapshots taken at start and stop
+    interval_ms (float): Milliseconds between stack samples
+    """
+
+    def __init__(self, label, user_id=None, trigger="header", memory=False, interval_ms=PROFILE_INTERVAL_MS):
+        now = time.time()
+        # Sortable by start time, which is how the store finds the oldest profiles
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        self.profile_id = f"{stamp}{int(now % 1 * 1000):03d}-{uuid.uuid4().hex[:8]}"
+        self.label = label
+        self.user_id = user_id
+        self.trigger = trigger
+        self.memory = memory
+        self.interval = interval_ms / 1000.0
+        self.samples = Counter()
+        self.sections = {}
+        self.memory_report = None
+        self.started_at = None
+        self.duration_ms = None
+        self._start = None
+        self._threads = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._snapshot = None
+        self._token = None
+
+    def start(self):
+        """Start sampling the current thread and make this the active profile of the current context"""
+        if self.memory:
+            _start_tracemalloc()
+            self._snapshot = tracemalloc.take_snapshot()
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._enrol(threading.get_ident())
+        self._token = _active_profile.set(self)
+        self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.profile_id}", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        """Stop sampling; safe to call more than once"""
+        if self._stopped.is_set():
+            return self
+        self._stopped.set()
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        if self._token is not None:
+            try:
+                _active_profile.reset(self._token)
+            except ValueError:
+                # Stopped from a different context than it was started in
+                _active_profile.set(None)
+        self._sampler.join()
+        if self.memory:
+            self.memory_report = self._compare_snapshots()
+            _stop_tracemalloc()
+        return self
+
+    def _compare_snapshots(self):
+        current, peak = tracemalloc.get_traced_memory()
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+        after = tracemalloc.take_snapshot().filter_traces(ignored)
+        before = self._snapshot.filter_traces(ignored)
+        self._snapshot = None
+        top = after.compare_to(before, "lineno")[:MEMORY_TOP_LINES]
+        return {
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            # Allocations of concurrent requests show up here as well
+            "top_allocations": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in top
+            ],
+        }
+
+    def _enrol(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] += 1
+
+    def _leave(self, thread_id):
+        with self._lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                thread_ids = list(self._threads)
+            frames = sys._current_frames()
+            stacks = [_fold_stack(frames[thread_id]) for thread_id in thread_ids if thread_id in frames]
+            with self._lock:
+                self.samples.update(stacks)
+
+    @contextmanager
+    def section(self, name):
+        """Time a named section and sample the thread running it"""
+        thread_id = threading.get_ident()
+        self._enrol(thread_id)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._leave(thread_id)
+            with self._lock:
+                entry = self.sections.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+                entry["calls"] += 1
+                entry["seconds"] += elapsed
+                entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+
+    def to_dict(self):
+        with self._lock:
+            samples = self.samples.most_common()
+            sections = {name: {"calls": entry["calls"], "total_ms": round(entry["seconds"] * 1000, 1),
+                               "max_ms": round(entry["max_seconds"] * 1000, 1)}
+                        for name, entry in self.sections.items()}
+        return {
+            "id": self.profile_id,
+            "label": self.label,
+            "user_id": self.user_id,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "interval_ms": self.interval * 1000,
+            "sample_count": sum(count for _, count in samples),
+            "sections": sections,
+            "stacks": [{"stack": stack, "count": count} for stack, count in samples],
+            "memory": self.memory_report,
+        }
+
+
+def get_active_profile():
+    """Return the profile of the request running in the current context, if any"""
+    return _active_profile.get()
+
+
+def profiled(name):
+    """
+    Decorator recording calls of a function in the active request profile
+
+    Costs a single context variable lookup when no profile is active.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _active_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            with profile.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ProfileStore:
+    """
+    Directory of saved profiles, one JSON file each, keeping the newest max_files
+
+    Parameters:
+    path (str): Directory the profiles are written to
+    max_files (int): Number of profiles kept; older ones are deleted
+    """
+
+    def __init__(self, path=PROFILE_PATH, max_files=PROFILE_MAX_FILES):
+        self.path = path
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _file(self, profile_id):
+        # Profile IDs are generated by RequestProfile; refuse anything else
+        if not profile_id or not all(c.isalnum() or c == "-" for c in profile_id):
+            return None
+        return os.path.join(self.path, f"{profile_id}.json")
+
+    def save(self, profile, status_code=None):
+        """Write a stopped profile to disk and prune the oldest ones"""
+        data = profile.to_dict()
+        data["status_code"] = status_code
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            path = self._file(profile.profile_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+            self._prune()
+        except OSError as e:
+            print(f"Error saving profile {profile.profile_id}: {str(e)}")
+
+    def _prune(self):
+        with self._lock:
+            names = sorted(name for name in os.listdir(self.path) if name.endswith(".json"))
+            for name in names[:max(0, len(names) - self.max_files)]:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id):
+        """Return a saved profile, or None if it does not exist"""
+        path = self._file(profile_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self, limit=100):
+        """Return summaries (without stacks) of the newest saved profiles"""
+        if not os.path.isdir(self.path):
+            return []
+        names = sorted((name for name in os.listdir(self.path) if name.endswith(".json")), reverse=True)
+        summaries = []
+        for name in names[:limit]:
+            data = self.load(name[:-len(".json")])
+            if data is None:
+                continue
+            summaries.append({key: data.get(key) for key in
+                              ("id", "label", "user_id", "trigger", "started_at", "duration_ms", "status_code",
+                               "sample_count")})
+            summaries[-1]["memory"] = data.get("memory") is not None
+            summaries[-1]["sections"] = data.get("sections")
+        return summaries
+
+
+def to_folded(profile_data):
+    """
+    Render a saved profile's samples in the collapsed-stack format read by
+    flamegraph.pl, speedscope and similar tools
+
+    Parameters:
+    profile_data (dict): A profile as returned by ProfileStore.load
+
+    Returns:
+    str: One 'stack count' line per distinct stack
+    """
+    return "\n".join(f"{entry['stack']} {entry['count']}" for entry in profile_data.get("stacks", [])) + "\n"
+
+
+profile_store = ProfileStore()
@@ -0,0 +1,109 @@
+"""
+Speculative prefetch of downstream agent stages
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SpeculativeExecutor:
+    """
+    Runs downstream agent stages in the background before they are requested
+
+    Each pending speculation is keyed by thread key and stage, and remembers the
+    exact stage input it was started with. A stage is only claimed when the real
+    request arrives with the same input; otherwise the speculation is discarded.
+    Futures that have not started yet are cancelled; running ones finish in the
+    background and their results are dropped. A claimed speculation that is
+    still queued behind others is cancelled too, so the real stage runs inline
+    instead of waiting for unrelated prefetches.
+    """
+
+    def __init__(self, max_workers=4):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {"scheduled": 0, "hits": 0, "misses": 0, "not_started": 0, "cancelled": 0}
+
+    def schedule(self, thread_key, stage, stage_input, fn, on_discard=None):
+        """
+        Start fn in the background as a speculation of stage
+
+        Parameters:
+        thread_key (str): The "user_id:thread_id" key of the conversation
+        stage (str): Agent type the speculation stands in for (e.g. 'qa')
+        stage_input (str): The exact input the stage will be invoked with
+        fn (callable): Zero-argument callable producing the stage result
+        on_discard (callable): Optional callback receiving the future if it is discarded
+        """
+        with self._lock:
+            stages = self._pending.setdefault(thread_key, {})
+            existing = stages.get(stage)
+            if existing and existing[0] == stage_input:
+                return existing[1]
+
+            future = self._pool.submit(fn)
+            stages[stage] = (stage_input, future, on_discard)
+            self.stats["scheduled"] += 1
+
+        if existing:
+            self._discard(existing)
+        return future
+
+    def claim(self, thread_key, stage, stage_input):
+        """
+        Take the speculation for stage if it was started with the same input
+
+        Returns:
+            Future or None: The speculative future (running or finished), or
+            None on a miss or when it had not started yet
+        """
+        with self._lock:
+            entry = self._pending.get(thread_key, {}).pop(stage, None)
+
+        if entry is None:
+            return None
+        if entry[0] != stage_input:
+            with self._lock:
+                self.stats["misses"] += 1
+            self._discard(entry)
+            return None
+
+        _, future, on_discard = entry
+        if future.cancel():
+            with self._lock:
+                self.stats["not_started"] += 1
+            if on_discard:
+                future.add_done_callback(on_discard)
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+        return future
+
+    def retain(self, thread_key, stages):
+        """Cancel every pending speculation for thread_key whose stage is not in stages."""
+        with self._lock:
+            pending = self._pending.get(thread_key, {})
+            dropped = [pending.pop(stage) for stage in list(pending) if stage not in stages]
+            if not pending:
+                self._pending.pop(thread_key, None)
+
+        for entry in dropped:
+            self._discard(entry)
+
+    def cancel(self, thread_key):
+        """Cancel all pending speculations for a conversation thread."""
+        self.retain(thread_key, ())
+
+    def _discard(self, entry):
+        _, future, on_discard = entry
+        with self._lock:
+            self.stats["cancelled"] += 1
+        future.cancel()
+        if on_discard:
+            future.add_done_callback(on_discard)
+
+    def get_stats(self):
+        """Return a copy of the hit/miss counters."""
+        with self._lock:
+            return dict(self.stats)
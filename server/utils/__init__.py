@@ -1,11 +1,34 @@
-from server.utils.database import extract_sql_from_query, execute_snowflake_query, process_and_execute_sql_query
-from server.utils.github_utils import push_md_to_github_with_auto_numbering
-from server.utils.format_utils import build_table_string
-
-__all__ = [
-    'extract_sql_from_query',
-    'execute_snowflake_query',
-    'process_and_execute_sql_query',
-    'push_md_to_github_with_auto_numbering',
-    'build_table_string'
-]
+"""
+Utility functions for the multi-agent chatbot system
+
+Submodules pull in heavy dependencies (Snowflake connector, PyGithub, sqlparse),
+so exported names are resolved lazily on first attribute access.
+"""
+import importlib
+
+_EXPORTS = {
+    'extract_sql_from_query': 'server.utils.database',
+    'execute_snowflake_query': 'server.utils.database',
+    'process_and_execute_sql_query': 'server.utils.database',
+    'push_md_to_github_with_auto_numbering': 'server.utils.github_utils',
+    'build_table_string': 'server.utils.format_utils',
+    'build_table_columns': 'server.utils.format_utils',
+    'split_message_blocks': 'server.utils.format_utils',
+    'schema_catalog': 'server.utils.schema_catalog',
+    'validate_sql': 'server.utils.sql_validation',
+    'code_runner': 'server.utils.code_runner',
+    'format_test_report': 'server.utils.code_runner',
+    'async_queries': 'server.utils.async_queries',
+    'process_and_submit_sql_query': 'server.utils.async_queries',
+    'artifact_store': 'server.utils.artifact_store',
+    'make_reference': 'server.utils.artifact_store'
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
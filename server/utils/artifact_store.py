@@ -0,0 +1,316 @@
+"""
+Content-addressed store for generated code, tests, SQL and documentation
+
+Each artifact is saved once on disk under the SHA-256 of its content, so an
+output that is generated again (or by another worker) is deduplicated rather
+than stored twice. A SQLite index records the kind, size and last access of
+every blob and which user, thread and stage produced it. Once the blobs exceed
+the disk quota, the least recently used ones are evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from server.config import ARTIFACT_STORE_PATH, ARTIFACT_STORE_MAX_BYTES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    hash TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access);
+CREATE TABLE IF NOT EXISTS artifact_owners (
+    hash TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (hash, user_id, thread_id, stage)
+);
+CREATE INDEX IF NOT EXISTS artifact_owners_user ON artifact_owners (user_id, thread_id);
+CREATE TABLE IF NOT EXISTS artifact_publications (
+    hash TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    location TEXT NOT NULL,
+    published_at REAL NOT NULL,
+    PRIMARY KEY (hash, user_id)
+);
+"""
+
+# Characters of the hash used in references handed between stages
+REFERENCE_LENGTH = 16
+
+
+def make_reference(artifact_hash, kind):
+    """Return the compact reference of an artifact, e.g. artifact:code:1f3a9c0d2b4e6f81"""
+    return f"artifact:{kind}:{artifact_hash[:REFERENCE_LENGTH]}"
+
+
+class ArtifactStore:
+    """
+    Disk-backed, content-addressed artifact store with an LRU disk quota
+
+    Blobs live at <path>/blobs/<first two hash characters>/<hash> and are
+    written atomically, so concurrent writers of the same content are safe.
+    Every process (and thread) opens its own index connection, as in the
+    shared cache, so preforked workers see each other's artifacts.
+
+    Parameters:
+    path (str): Directory holding the blobs and the index
+    max_bytes (int): Disk quota of the blobs; least recently used ones are evicted beyond it
+    """
+
+    def __init__(self, path=ARTIFACT_STORE_PATH, max_bytes=ARTIFACT_STORE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"stored": 0, "deduplicated": 0, "hits": 0, "misses": 0, "evicted": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(self.path, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.path, "index.sqlite3"), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _blob_path(self, artifact_hash):
+        return os.path.join(self.path, "blobs", artifact_hash[:2], artifact_hash)
+
+    def _write_blob(self, artifact_hash, data):
+        path = self._blob_path(artifact_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, content, kind, user_id=None, thread_id=None, stage=None):
+        """
+        Store an artifact, or just record its use when the same content is already stored
+
+        Parameters:
+        content (str): The artifact text
+        kind (str): What the artifact is, e.g. 'code', 'tests', 'sql' or 'docs'
+        user_id (str): User the artifact was generated for
+        thread_id (str): Conversation thread it was generated in
+        stage (str): Agent stage that produced it
+
+        Returns:
+        str or None: The artifact hash, or None if it could not be stored
+        """
+        if not content:
+            return None
+        data = content.encode("utf-8")
+        artifact_hash = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        try:
+            conn = self._connection()
+            exists = conn.execute("SELECT 1 FROM artifacts WHERE hash = ?", (artifact_hash,)).fetchone()
+            if exists and os.path.exists(self._blob_path(artifact_hash)):
+                conn.execute("UPDATE artifacts SET last_access = ? WHERE hash = ?", (now, artifact_hash))
+                self._count("deduplicated")
+            else:
+                self._write_blob(artifact_hash, data)
+                conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (hash, kind, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (artifact_hash, kind, len(data), now, now),
+                )
+                self._count("stored")
+                self.evict(keep=artifact_hash)
+            if user_id is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO artifact_owners (hash, user_id, thread_id, stage, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (artifact_hash, user_id, thread_id or "", stage or "", now),
+                )
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error storing artifact: {str(e)}")
+            return None
+        return artifact_hash
+
+    def resolve(self, hash_or_prefix):
+        """Return the full hash for a hash or reference prefix, or None if unknown or ambiguous"""
+        prefix = (hash_or_prefix or "").rsplit(":", 1)[-1].lower()
+        if len(prefix) < 8 or not all(c in "0123456789abcdef" for c in prefix):
+            return None
+        try:
+            rows = self._connection().execute(
+                "SELECT hash FROM artifacts WHERE hash >= ? AND hash < ? LIMIT 2", (prefix, prefix + "g")
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading artifact index: {str(e)}")
+            return None
+        return rows[0][0] if len(rows) == 1 else None
+
+    def get(self, hash_or_prefix):
+        """
+        Return the content of an artifact
+
+        Parameters:
+        hash_or_prefix (str): Full hash, hash prefix or reference of the artifact
+
+        Returns:
+        str or None: The content, or None if the artifact is unknown or was evicted
+        """
+        artifact_hash = self.resolve(hash_or_prefix)
+        if artifact_hash is None:
+            self._count("misses")
+            return None
+        try:
+            with open(self._blob_path(artifact_hash), "rb") as f:
+                content = f.read().decode("utf-8")
+            self._connection().execute(
+                "UPDATE artifacts SET last_access = ? WHERE hash = ?", (time.time(), artifact_hash)
+            )
+        except FileNotFoundError:
+            # Blob removed behind the index's back
+            self._forget([artifact_hash])
+            self._count("misses")
+            return None
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error reading artifact {artifact_hash}: {str(e)}")
+            return None
+        self._count("hits")
+        return content
+
+    def info(self, hash_or_prefix):
+        """Return the kind, size and timestamps of an artifact, or None if unknown"""
+        artifact_hash = self.resolve(hash_or_prefix)
+        if artifact_hash is None:
+            return None
+        row = self._connection().execute(
+            "SELECT hash, kind, size, created_at, last_access FROM artifacts WHERE hash = ?",
+            (artifact_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"hash": row[0], "kind": row[1], "size": row[2], "created_at": row[3], "last_access": row[4]}
+
+    def record_publication(self, artifact_hash, user_id, location):
+        """Remember that a user published an artifact (e.g. its path on GitHub)"""
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO artifact_publications (hash, user_id, location, published_at) "
+                "VALUES (?, ?, ?, ?)",
+                (artifact_hash, user_id, location, time.time()),
+            )
+        except sqlite3.Error as e:
+            print(f"Error recording publication of artifact {artifact_hash}: {str(e)}")
+
+    def get_publication(self, artifact_hash, user_id):
+        """Return where the user published the artifact, or None if they have not"""
+        try:
+            row = self._connection().execute(
+                "SELECT location FROM artifact_publications WHERE hash = ? AND user_id = ?", (artifact_hash, user_id)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading artifact index: {str(e)}")
+            return None
+        return row[0] if row else None
+
+    def list(self, user_id, thread_id=None, kind=None, limit=50):
+        """
+        Return the most recent artifacts a user's conversations produced
+
+        Parameters:
+        user_id (str): Owner of the artifacts
+        thread_id (str): Only artifacts of this thread, when given
+        kind (str): Only artifacts of this kind, when given
+        limit (int): Maximum number of entries
+
+        Returns:
+        list: Dicts with hash, kind, size, thread_id, stage and created_at, newest first
+        """
+        query = ("SELECT a.hash, a.kind, a.size, o.thread_id, o.stage, o.created_at "
+                 "FROM artifact_owners o JOIN artifacts a ON a.hash = o.hash WHERE o.user_id = ?")
+        params = [user_id]
+        if thread_id is not None:
+            query += " AND o.thread_id = ?"
+            params.append(thread_id)
+        if kind is not None:
+            query += " AND a.kind = ?"
+            params.append(kind)
+        query += " ORDER BY o.created_at DESC LIMIT ?"
+        params.append(limit)
+        rows = self._connection().execute(query, params).fetchall()
+        return [{"hash": r[0], "kind": r[1], "size": r[2], "thread_id": r[3], "stage": r[4], "created_at": r[5]}
+                for r in rows]
+
+    def is_owner(self, artifact_hash, user_id):
+        """Whether one of the user's conversations produced the artifact"""
+        row = self._connection().execute(
+            "SELECT 1 FROM artifact_owners WHERE hash = ? AND user_id = ? LIMIT 1", (artifact_hash, user_id)
+        ).fetchone()
+        return row is not None
+
+    def _forget(self, hashes, conn=None):
+        conn = conn or self._connection()
+        for artifact_hash in hashes:
+            conn.execute("DELETE FROM artifacts WHERE hash = ?", (artifact_hash,))
+            conn.execute("DELETE FROM artifact_owners WHERE hash = ?", (artifact_hash,))
+            conn.execute("DELETE FROM artifact_publications WHERE hash = ?", (artifact_hash,))
+
+    def evict(self, keep=None):
+        """
+        Delete least recently used blobs (except keep) until the store is back under its disk quota
+
+        The index rows are removed in one transaction before any blob is
+        unlinked, so other workers never resolve an artifact whose blob is gone.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            victims = []
+            if total > self.max_bytes:
+                # Evict down to 90% of the quota so the next few writes do not evict again
+                target = self.max_bytes * 0.9
+                for artifact_hash, size in conn.execute("SELECT hash, size FROM artifacts ORDER BY last_access"):
+                    if total <= target:
+                        break
+                    if artifact_hash == keep:
+                        continue
+                    victims.append(artifact_hash)
+                    total -= size
+                self._forget(victims, conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for artifact_hash in victims:
+            try:
+                os.remove(self._blob_path(artifact_hash))
+            except FileNotFoundError:
+                pass
+        self._count("evicted", len(victims))
+        return len(victims)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        try:
+            count, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts"
+            ).fetchone()
+        except sqlite3.Error:
+            count, total = None, None
+        stats.update({"artifacts": count, "bytes": total, "max_bytes": self.max_bytes})
+        return stats
+
+
+artifact_store = ArtifactStore()
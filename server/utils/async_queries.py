@@ -0,0 +1,350 @@
+"""
+Asynchronous Snowflake query submission with background status polling
+
+Queries are submitted with the connector's execute_async, which returns as
+soon as Snowflake has accepted the query. One poller thread per process then
+checks every in-flight query by ID over a single pooled connection and fetches
+the results of those that finish, so a worker can have many queries running
+without holding a thread or connection for each.
+
+Query ownership and final status are recorded in the shared cache, so any
+worker can report on, fetch the results of, or cancel a query that another
+worker submitted.
+Snowflake keeps query results for 24 hours.
+"""
+import os
+import threading
+import time
+from server.profiling import profiled
+from server.utils.database_utils import connection_pool, extract_sql_from_query
+from server.utils.sql_validation import validate_sql
+from server.utils.shared_cache import shared_cache
+from server.config import SQL_ASYNC_POLL_INTERVAL, SQL_ASYNC_MAX_POLL_INTERVAL, SQL_ASYNC_RESULT_TTL
+
+
+class QueryRecord:
+    """State of one submitted query"""
+
+    def __init__(self, query_id, sql, user_id, thread_id, submitted_at=None):
+        self.query_id = query_id
+        self.sql = sql
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.status = "running"
+        self.submitted_at = submitted_at or time.time()
+        self.finished_at = None
+        self.result = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def finish(self, status, result):
+        """Mark the query finished; returns False if it already was (e.g. cancelled meanwhile)"""
+        with self._lock:
+            if self.done.is_set():
+                return False
+            self.status = status
+            self.result = result
+            self.finished_at = time.time()
+            self.done.set()
+            return True
+
+    def snapshot(self, include_result=True):
+        data = {
+            "query_id": self.query_id,
+            "status": self.status,
+            "sql": self.sql,
+            "thread_id": self.thread_id,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result and self.result is not None:
+            data.update(self.result)
+        return data
+
+
+class AsyncQueryManager:
+    """
+    Submits queries asynchronously and tracks them until they finish
+
+    Parameters:
+    pool: Connection pool providing connection() (the Snowflake pool by default)
+    poll_interval (float): Initial seconds between status checks
+    max_poll_interval (float): Upper bound of the backed-off interval
+    result_ttl (float): Seconds finished queries are kept before being forgotten
+    """
+
+    def __init__(self, pool=connection_pool, poll_interval=SQL_ASYNC_POLL_INTERVAL,
+                 max_poll_interval=SQL_ASYNC_MAX_POLL_INTERVAL, result_ttl=SQL_ASYNC_RESULT_TTL):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.result_ttl = result_ttl
+        self._records = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._poller = None
+        self._pid = None
+        self.stats = {"submitted": 0, "success": 0, "error": 0, "cancelled": 0, "polls": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _finish(self, record, status, result):
+        """Finish a record once and publish its final status to the other workers"""
+        if record.finish(status, result):
+            self._count(status)
+            self._remember(record, new=False)
+
+    def _ensure_poller(self):
+        # The poller thread does not survive a fork
+        with self._lock:
+            if self._poller is None or self._pid != os.getpid() or not self._poller.is_alive():
+                self._pid = os.getpid()
+                self._poller = threading.Thread(target=self._poll_loop, name="sql-async-poller", daemon=True)
+                self._poller.start()
+
+    def submit(self, sql_query, user_id, thread_id):
+        """
+        Submit a query without waiting for it to run
+
+        Parameters:
+        sql_query (str): The SQL query to execute
+        user_id (str): Owner of the query
+        thread_id (str): Conversation thread the query belongs to
+
+        Returns:
+        dict: Query snapshot with query_id and status 'running', or error information
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute_async(sql_query)
+                    query_id = cursor.sfqid
+                finally:
+                    cursor.close()
+        except Exception as e:
+            return {"error": str(e), "status": "error"}
+
+        record = QueryRecord(query_id, sql_query, user_id, thread_id)
+        with self._lock:
+            self._records[query_id] = record
+        self._count("submitted")
+        self._remember(record)
+        self._ensure_poller()
+        self._wakeup.set()
+        return record.snapshot()
+
+    def _remember(self, record, new=True):
+        """Record ownership and status in the shared cache so other workers can serve the query"""
+        meta = {"sql": record.sql, "user_id": record.user_id, "thread_id": record.thread_id,
+                "submitted_at": record.submitted_at, "status": record.status, "finished_at": record.finished_at}
+        if record.status in ("error", "cancelled"):
+            meta["error"] = (record.result or {}).get("error")
+        shared_cache.set("async_query", record.query_id, meta, self.result_ttl)
+        if new:
+            shared_cache.append("async_thread", f"{record.user_id}:{record.thread_id}", record.query_id,
+                                self.result_ttl)
+
+    def _lookup(self, query_id):
+        """Return the local record, adopting one submitted by another worker if needed"""
+        with self._lock:
+            record = self._records.get(query_id)
+        if record is not None:
+            return record
+        meta = shared_cache.get("async_query", query_id)
+        if meta is None:
+            return None
+        record = QueryRecord(query_id, meta["sql"], meta["user_id"], meta["thread_id"], meta["submitted_at"])
+        if meta.get("status") in ("error", "cancelled"):
+            record.finish(meta["status"], {"error": meta.get("error")})
+            record.finished_at = meta.get("finished_at") or record.finished_at
+        with self._lock:
+            record = self._records.setdefault(query_id, record)
+        if record.status == "running":
+            # Running, or finished elsewhere with results this worker has yet to fetch
+            self._ensure_poller()
+            self._wakeup.set()
+        return record
+
+    def _refresh(self, conn, record):
+        """Check one query's status and fetch its results once it has finished"""
+        try:
+            status = conn.get_query_status(record.query_id)
+            if conn.is_still_running(status):
+                return False
+            if conn.is_an_error(status):
+                # Raises with the warehouse's error message
+                conn.get_query_status_throw_if_error(record.query_id)
+                raise RuntimeError(f"Query {getattr(status, 'name', status)}")
+            cursor = conn.cursor()
+            try:
+                cursor.get_results_from_sfqid(record.query_id)
+                results = cursor.fetchall()
+                column_names = [desc[0] for desc in cursor.description]
+            finally:
+                cursor.close()
+            self._finish(record, "success", {"column_names": column_names, "data": results,
+                                             "row_count": len(results)})
+        except Exception as e:
+            self._finish(record, "error", {"error": str(e)})
+        return True
+
+    def _poll_loop(self):
+        interval = self.poll_interval
+        while True:
+            self._wakeup.wait(interval)
+            if self._wakeup.is_set():
+                # New work: check soon, then back off again
+                self._wakeup.clear()
+                interval = self.poll_interval
+            self._expire()
+            with self._lock:
+                running = [record for record in self._records.values() if record.status == "running"]
+            if not running:
+                interval = self.max_poll_interval
+                continue
+
+            changed = False
+            try:
+                with self.pool.connection() as conn:
+                    for record in running:
+                        if record.status == "running":
+                            self._count("polls")
+                            changed = self._refresh(conn, record) or changed
+            except Exception as e:
+                print(f"Error polling async queries: {str(e)}")
+            interval = self.poll_interval if changed else min(interval * 1.5, self.max_poll_interval)
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for query_id in [q for q, r in self._records.items() if r.finished_at and r.finished_at < cutoff]:
+                del self._records[query_id]
+
+    def get(self, query_id, user_id=None, wait=0):
+        """
+        Return a query's status and, once finished, its results
+
+        Parameters:
+        query_id (str): The Snowflake query ID
+        user_id (str): When given, queries of other users are reported as unknown
+        wait (float): Seconds to wait for a running query to finish
+
+        Returns:
+        dict: The query snapshot, or None if the query is unknown
+        """
+        record = self._lookup(query_id)
+        if record is None or (user_id is not None and record.user_id != user_id):
+            return None
+        if wait > 0:
+            record.done.wait(wait)
+        return record.snapshot()
+
+    def list(self, user_id, thread_id=None):
+        """
+        Return snapshots (without results) of a user's queries
+
+        Queries submitted by other workers are included, as last reported in the
+        shared cache, when thread_id is given; their results are not fetched.
+        """
+        with self._lock:
+            records = [r for r in self._records.values()
+                       if r.user_id == user_id and (thread_id is None or r.thread_id == thread_id)]
+        snapshots = [record.snapshot(include_result=False) for record in records]
+        if thread_id is not None:
+            known = {record.query_id for record in records}
+            for query_id in shared_cache.get("async_thread", f"{user_id}:{thread_id}") or []:
+                meta = None if query_id in known else shared_cache.get("async_query", query_id)
+                if meta is not None and meta["user_id"] == user_id:
+                    snapshots.append({
+                        "query_id": query_id,
+                        "status": meta.get("status", "running"),
+                        "sql": meta["sql"],
+                        "thread_id": meta["thread_id"],
+                        "submitted_at": meta["submitted_at"],
+                        "finished_at": meta.get("finished_at"),
+                    })
+        return sorted(snapshots, key=lambda snapshot: snapshot["submitted_at"])
+
+    def cancel(self, query_id, user_id=None):
+        """
+        Cancel a running query
+
+        Returns:
+        bool: True if a cancellation was sent, False if the query is unknown or already finished
+        """
+        record = self._lookup(query_id)
+        if record is None or (user_id is not None and record.user_id != user_id) or record.status != "running":
+            return False
+        try:
+            with self.pool.connection() as conn:
+                # The local status may lag (e.g. a record adopted from another worker)
+                if not conn.is_still_running(conn.get_query_status(query_id)):
+                    self._wakeup.set()
+                    return False
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (query_id,))
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"Error cancelling query {query_id}: {str(e)}")
+            return False
+        self._finish(record, "cancelled", {"error": "Query cancelled"})
+        return True
+
+    def cancel_thread(self, user_id, thread_id):
+        """Cancel every running query of a conversation thread; returns how many were cancelled"""
+        with self._lock:
+            query_ids = {q for q, r in self._records.items()
+                         if r.user_id == user_id and r.thread_id == thread_id and r.status == "running"}
+        for query_id in shared_cache.get("async_thread", f"{user_id}:{thread_id}") or []:
+            # Only adopt queries of other workers that are still reported as running
+            meta = None if query_id in query_ids else shared_cache.get("async_query", query_id)
+            if meta is not None and meta.get("status", "running") == "running":
+                query_ids.add(query_id)
+        return sum(1 for query_id in query_ids if self.cancel(query_id, user_id))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = sum(1 for r in self._records.values() if r.status == "running")
+            stats["tracked"] = len(self._records)
+        return stats
+
+
+async_queries = AsyncQueryManager()
+
+
+@profiled("snowflake_submit")
+def process_and_submit_sql_query(input_query, user_id, thread_id, wait=0):
+    """
+    Extract, validate and asynchronously submit the SQL in an agent response
+
+    Parameters:
+    input_query (str): The input string containing SQL code
+    user_id (str): Owner of the query
+    thread_id (str): Conversation thread the query belongs to
+    wait (float): Seconds to wait for the query to finish before returning
+
+    Returns:
+    dict: status 'success' with the results, 'running' with the query_id, or error information
+    """
+    sql_query = extract_sql_from_query(input_query)
+    if not sql_query:
+        return {
+            "error": "No SQL code found in the input. Please ensure SQL is wrapped in ```sql ... ``` tags.",
+            "status": "error"
+        }
+
+    validation = validate_sql(sql_query)
+    if validation["status"] == "error":
+        print(f"SQL rejected before execution: {validation['error']}")
+        return validation
+
+    submitted = async_queries.submit(validation["query"], user_id, thread_id)
+    if submitted["status"] == "error" or wait <= 0:
+        return submitted
+    return async_queries.get(submitted["query_id"], wait=wait)
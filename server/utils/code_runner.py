@@ -0,0 +1,268 @@
+"""
+Sandboxed execution of generated code and its tests
+
+Test cases are split out of the QA tester's output and run concurrently. Each
+case runs in a fresh Python interpreter (isolated mode, no site-packages)
+started with an empty environment and no inherited file descriptors, so it
+sees neither the app's credentials nor its memory, sockets or cache files. The
+child applies CPU time, address space, file size and process count limits to
+itself before running the code. Its process group is killed once it exceeds
+the wall-clock limit, and after every case so nothing it started outlives it. Only the
+pass/fail status and a short message come back; whatever the code prints is
+discarded.
+"""
+import ast
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from server.config import (
+    CODE_EXECUTION_CPU_SECONDS, CODE_EXECUTION_MEMORY_MB, CODE_EXECUTION_TIMEOUT,
+    CODE_EXECUTION_WORKERS, CODE_EXECUTION_MAX_CASES, CODE_EXECUTION_MAX_PROCESSES
+)
+
+# Script run by each sandboxed interpreter
+SANDBOX_CHILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_child.py")
+
+
+def extract_python_code(text):
+    """
+    Extract the Python code from an agent response
+
+    Parameters:
+    text (str): Agent response, usually containing ```python blocks
+
+    Returns:
+    str: The code blocks joined together, or the whole text if it has no code blocks
+    """
+    blocks = re.findall(r"```(?:python|py)?[ \t]*\n(.*?)```", text or "", re.DOTALL)
+    return "\n\n".join(block.strip() for block in blocks) if blocks else (text or "")
+
+
+def _is_test_case_class(node):
+    return isinstance(node, ast.ClassDef) and any(
+        (isinstance(base, ast.Attribute) and base.attr == "TestCase")
+        or (isinstance(base, ast.Name) and base.id == "TestCase")
+        for base in node.bases
+    )
+
+
+def split_test_cases(test_code):
+    """
+    Split test code into shared setup and independent test cases
+
+    Top-level assert statements, test_* functions and the test_* methods of
+    unittest.TestCase classes each become one case. Every other top-level
+    statement is setup that runs before each case.
+
+    Parameters:
+    test_code (str): Python source produced by the QA tester
+
+    Returns:
+    tuple: (setup source, list of (case name, case source)); raises SyntaxError if the code does not parse
+    """
+    tree = ast.parse(test_code)
+    setup, cases = [], []
+    for node in tree.body:
+        if isinstance(node, ast.Assert):
+            cases.append((ast.get_source_segment(test_code, node) or ast.unparse(node), ast.unparse(node)))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            setup.append(ast.unparse(node))
+            if isinstance(node, ast.AsyncFunctionDef):
+                cases.append((node.name, f"import asyncio\nasyncio.run({node.name}())"))
+            else:
+                cases.append((node.name, f"{node.name}()"))
+        elif _is_test_case_class(node):
+            setup.append(ast.unparse(node))
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name.startswith("test"):
+                    cases.append((f"{node.name}.{item.name}", f"{node.name}({item.name!r}).debug()"))
+        elif isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+            # Test runners under `if __name__ == "__main__":` would rerun every case
+            continue
+        else:
+            setup.append(ast.unparse(node))
+    return "\n".join(setup), cases
+
+
+def _kill_group(process):
+    """Kill the sandboxed process and everything else in its process group"""
+    # The child leads its own session, so its pid is the group id
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_sandboxed(source, cpu_seconds=CODE_EXECUTION_CPU_SECONDS, memory_mb=CODE_EXECUTION_MEMORY_MB,
+                  timeout=CODE_EXECUTION_TIMEOUT, max_processes=CODE_EXECUTION_MAX_PROCESSES):
+    """
+    Run Python source in a fresh, resource-limited interpreter
+
+    Parameters:
+    source (str): Code to execute
+    cpu_seconds (int): CPU time limit
+    memory_mb (int): Address space the code may use on top of the bare interpreter, in MB (0 for no limit)
+    timeout (float): Wall-clock limit in seconds
+    max_processes (int): Processes or threads the code may start
+
+    Returns:
+    dict: status ('passed', 'failed', 'error' or 'timeout'), message and duration_ms
+    """
+    start = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    request = json.dumps({"source": source, "cpu_seconds": cpu_seconds, "memory_mb": memory_mb,
+                          "max_processes": max_processes}).encode()
+    timed_out = False
+    try:
+        # No preexec_fn: the child sets its own limits, so spawning stays safe from a threaded server
+        process = subprocess.Popen(
+            [sys.executable, "-I", "-S", SANDBOX_CHILD],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=workdir, env={}, close_fds=True, start_new_session=True,
+        )
+        try:
+            stdout, _ = process.communicate(request, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_group(process)
+            process.communicate()
+        finally:
+            # Also after a normal exit: nothing the code started may outlive the case
+            _kill_group(process)
+    except OSError as e:
+        return {"status": "error", "message": f"could not start test process: {str(e)}",
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    if timed_out:
+        return {"status": "timeout", "message": f"exceeded {timeout}s wall-clock limit", "duration_ms": duration_ms}
+    try:
+        result = json.loads(stdout.decode())
+    except ValueError:
+        if -process.returncode in (signal.SIGXCPU, signal.SIGKILL):
+            result = {"status": "timeout", "message": f"exceeded {cpu_seconds}s CPU limit"}
+        else:
+            result = {"status": "error", "message": f"test process exited abnormally ({process.returncode})"}
+    result["duration_ms"] = duration_ms
+    return result
+
+
+class CodeRunner:
+    """
+    Runs test cases concurrently, each in its own sandboxed interpreter
+
+    The sandboxed processes do the work; the threads of the pool only start
+    them and wait for their results. The pool is created on first use and
+    recreated after a fork of the owning process (e.g. into a Gunicorn worker).
+    """
+
+    def __init__(self, max_workers=CODE_EXECUTION_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="code-runner")
+                self._pid = os.getpid()
+            return self._pool
+
+    def run_tests(self, code, tests):
+        """
+        Run generated tests against generated code
+
+        Parameters:
+        code (str): Software engineer response containing the implementation
+        tests (str): QA tester response containing the tests
+
+        Returns:
+        dict: Counts per status, per-case results and total duration_ms, or an error dict
+        """
+        if os.name != "posix":
+            return {"error": "Sandboxed execution requires a POSIX platform", "status": "error"}
+
+        start = time.perf_counter()
+        implementation = extract_python_code(code)
+        try:
+            ast.parse(implementation)
+            setup, cases = split_test_cases(extract_python_code(tests))
+        except SyntaxError as e:
+            return {"error": f"Generated code does not parse: {str(e)}", "status": "error"}
+        if not cases:
+            return {"error": "No test cases found in the QA tester output", "status": "error"}
+        skipped = max(0, len(cases) - CODE_EXECUTION_MAX_CASES)
+        cases = cases[:CODE_EXECUTION_MAX_CASES]
+
+        pool = self._get_pool()
+        prefix = implementation + "\n\n" + setup + "\n\n"
+        futures = [(name, pool.submit(run_sandboxed, prefix + source)) for name, source in cases]
+
+        results = []
+        # Cases may queue behind each other; allow for that on top of the per-case limit
+        waves = -(-len(cases) // self.max_workers)
+        deadline = start + waves * (CODE_EXECUTION_TIMEOUT + 1) + 5
+        for name, future in futures:
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeoutError:
+                future.cancel()
+                result = {"status": "timeout", "message": "not run before the overall deadline"}
+            results.append({"name": name, **result})
+
+        summary = {status: sum(1 for r in results if r["status"] == status)
+                   for status in ("passed", "failed", "error", "timeout")}
+        return {
+            "status": "success",
+            **summary,
+            "skipped": skipped,
+            "cases": results,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def format_test_report(results):
+    """
+    Render test results as a plain-text block for the chat response
+
+    Parameters:
+    results (dict): Output of CodeRunner.run_tests
+
+    Returns:
+    str: The report
+    """
+    if results.get("status") == "error":
+        return f"Test execution: {results['error']}"
+    lines = [
+        f"Test execution: {results['passed']} passed, {results['failed']} failed, "
+        f"{results['error']} errors, {results['timeout']} timed out ({results['duration_ms']:.0f} ms)"
+    ]
+    marks = {"passed": "PASS", "failed": "FAIL", "error": "ERROR", "timeout": "TIMEOUT"}
+    for case in results["cases"]:
+        line = f"{marks[case['status']]:<8}{case['name']}"
+        if case["status"] != "passed" and case.get("message"):
+            line += f"  -- {case['message'][:200]}"
+        lines.append(line)
+    if results.get("skipped"):
+        lines.append(f"({results['skipped']} further cases not run)")
+    return "\n".join(lines)
+
+
+code_runner = CodeRunner()
@@ -0,0 +1,71 @@
+"""
+Response compression and entity tags for the HTTP API
+"""
+import gzip
+import hashlib
+from server.config import RESPONSE_COMPRESSION_LEVEL
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is used when brotli is not installed
+    brotli = None
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the best supported content coding from an Accept-Encoding header
+
+    Parameters:
+    accept_encoding (str): The request's Accept-Encoding header value
+
+    Returns:
+    str: 'br', 'gzip' or None
+    """
+    offered = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding):
+    """
+    Compress a response body
+
+    Parameters:
+    data (bytes): Uncompressed body
+    encoding (str): 'br' or 'gzip'
+
+    Returns:
+    bytes: The compressed body
+    """
+    if encoding == "br":
+        # Brotli quality runs 0-11; map the gzip-style 1-9 level onto it
+        return brotli.compress(data, quality=min(11, RESPONSE_COMPRESSION_LEVEL + 1))
+    return gzip.compress(data, compresslevel=RESPONSE_COMPRESSION_LEVEL)
+
+
+def compute_etag(data, encoding=None):
+    """
+    Strong entity tag of a body; each content coding gets its own tag
+
+    Parameters:
+    data (bytes): Uncompressed body
+    encoding (str): Content coding the body will be sent with, if any
+
+    Returns:
+    str: The tag value (without quotes)
+    """
+    digest = hashlib.sha1(data).hexdigest()[:32]
+    return f"{digest}-{encoding}" if encoding else digest
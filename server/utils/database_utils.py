@@ -1,9 +1,17 @@
 """
 Database utility functions for the multi-agent chatbot system
 """
+import os
+import queue
 import re
-import snowflake.connector
-from server.config import SF_USER, SF_PASSWORD, SF_ACCOUNT, SF_DATABASE, SF_SCHEMA, SF_WAREHOUSE
+import threading
+from contextlib import contextmanager
+from server.profiling import profiled
+from server.utils.shared_cache import shared_cache, make_cache_key
+from server.utils.sql_validation import validate_sql
+from server.config import (
+    SF_USER, SF_PASSWORD, SF_ACCOUNT, SF_DATABASE, SF_SCHEMA, SF_WAREHOUSE, SF_POOL_SIZE, SQL_CACHE_TTL
+)
 
 def extract_sql_from_query(query):
     """
@@ -27,19 +35,26 @@ def extract_sql_from_query(query):
     else:
         return None
 
-def execute_snowflake_query(sql_query):
+class SnowflakeConnectionPool:
     """
-    Execute a SQL query in Snowflake and return the results
-
-    Parameters:
-    sql_query (str): The SQL query to execute
+    Small thread-safe pool of reusable Snowflake connections
 
-    Returns:
-    dict: The query results including column names and data
+    Connections are created lazily up to max_size and handed back after use.
+    The pool is reset in a forked child so processes never share a socket.
     """
-    try:
-        # Connect to Snowflake
-        conn = snowflake.connector.connect(
+
+    def __init__(self, max_size=SF_POOL_SIZE):
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self):
+        # Imported here so loading this module does not pay for the connector
+        import snowflake.connector
+
+        return snowflake.connector.connect(
             user=SF_USER,
             password=SF_PASSWORD,
             account=SF_ACCOUNT,
@@ -48,29 +63,111 @@ def execute_snowflake_query(sql_query):
             warehouse=SF_WAREHOUSE
         )
 
-        # Create a cursor
-        cursor = conn.cursor()
+    def _reset_after_fork(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._created = 0
+                    self._pid = os.getpid()
+
+    @profiled("snowflake_acquire")
+    def acquire(self, timeout=30):
+        """Return an open connection, creating one if the pool is not full"""
+        self._reset_after_fork()
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not conn.is_closed():
+                return conn
+            with self._lock:
+                self._created -= 1
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, closing it instead when discard is set"""
+        if discard or conn.is_closed():
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            # Closed (broken) connections are dropped by release
+            self.release(conn)
+
+connection_pool = SnowflakeConnectionPool()
+
+@profiled("snowflake_query")
+def execute_snowflake_query(sql_query):
+    """
+    Execute a SQL query in Snowflake and return the results
 
-        # Execute the query
-        cursor.execute(sql_query)
+    Parameters:
+    sql_query (str): The SQL query to execute
 
-        # Get column names
-        column_names = [desc[0] for desc in cursor.description]
+    Returns:
+    dict: The query results including column names and data
+    """
+    # Results of identical queries may already be cached by any worker
+    cache_key = None
+    if SQL_CACHE_TTL > 0:
+        cache_key = make_cache_key(SF_ACCOUNT, SF_DATABASE, SF_SCHEMA, sql_query)
+        cached = shared_cache.get("sql", cache_key)
+        if cached is not None:
+            return cached
 
-        # Fetch all results
-        results = cursor.fetchall()
-        
-        # Close cursor and connection
-        cursor.close()
-        conn.close()
+    try:
+        # Borrow a pooled connection instead of connecting per query
+        with connection_pool.connection() as conn:
+            # Create a cursor
+            cursor = conn.cursor()
+            try:
+                # Execute the query
+                cursor.execute(sql_query)
+
+                # Get column names
+                column_names = [desc[0] for desc in cursor.description]
+
+                # Fetch all results
+                results = cursor.fetchall()
+            finally:
+                cursor.close()
 
         # Return results
-        return {
+        result = {
             "column_names": column_names,
             "data": results,
             "row_count": len(results),
             "status": "success"
         }
+        if cache_key is not None:
+            shared_cache.set("sql", cache_key, result, SQL_CACHE_TTL)
+        return result
 
     except Exception as e:
         # Handle any errors
@@ -99,7 +196,13 @@ def process_and_execute_sql_query(input_query):
             "status": "error"
         }
 
+    # Reject malformed or unbounded queries locally before they reach the warehouse
+    validation = validate_sql(sql_query)
+    if validation["status"] == "error":
+        print(f"SQL rejected before execution: {validation['error']}")
+        return validation
+
     # Execute the SQL query
-    result = execute_snowflake_query(sql_query)
+    result = execute_snowflake_query(validation["query"])
 
     return result
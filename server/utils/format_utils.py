@@ -1,7 +1,10 @@
 """
 Formatting utilities for the multi-agent chatbot system
 """
+import re
+from server.profiling import profiled
 
+@profiled("build_table_string")
 def build_table_string(data, headers):
     """
     Build a well-formatted ASCII table string from data and headers
@@ -35,3 +38,44 @@ def build_table_string(data, headers):
         lines.append(top_border)
 
     return "\n".join(lines)
+
+def split_message_blocks(text):
+    """
+    Split an agent message into text and fenced code blocks
+
+    Parameters:
+    text (str): The agent message
+
+    Returns:
+    list: Blocks of the form {"type": "text", "text": ...} or {"type": "code", "language": ..., "code": ...}
+    """
+    blocks = []
+    last_index = 0
+    for match in re.finditer(r"```([\w+-]*)[ \t]*\n?(.*?)```", text, re.DOTALL):
+        before = text[last_index:match.start()].strip()
+        if before:
+            blocks.append({"type": "text", "text": before})
+        blocks.append({"type": "code", "language": match.group(1) or None, "code": match.group(2).strip()})
+        last_index = match.end()
+    rest = text[last_index:].strip()
+    if rest:
+        blocks.append({"type": "text", "text": rest})
+    return blocks
+
+@profiled("build_table_columns")
+def build_table_columns(data, headers):
+    """
+    Build a compact column-oriented table block from data rows and headers
+
+    Each column's values are sent once as an array instead of being padded
+    into an ASCII grid.
+
+    Parameters:
+    data (list): List of data rows
+    headers (list): List of column headers
+
+    Returns:
+    dict: {"type": "table", "columns": headers, "values": one list per column, "row_count": n}
+    """
+    values = [list(column) for column in zip(*data)] if data else [[] for _ in headers]
+    return {"type": "table", "columns": list(headers), "values": values, "row_count": len(data)}
@@ -3,8 +3,19 @@ GitHub integration utilities for the multi-agent chatbot system
 """
 from datetime import datetime
 import re
-from github import Github
 from server.config import GITHUB_TOKEN, GITHUB_REPO, GITHUB_BRANCH
+from server.utils.artifact_store import artifact_store
+
+# PyGithub is imported on first use; the class is cached here
+Github = None
+
+def _get_github_class():
+    """Import PyGithub lazily and return its Github client class"""
+    global Github
+    if Github is None:
+        from github import Github as github_class
+        Github = github_class
+    return Github
 
 def push_md_to_github_with_auto_numbering(
     github_token=GITHUB_TOKEN,
@@ -12,7 +23,8 @@ def push_md_to_github_with_auto_numbering(
     content="",
     commit_message="Daily Status Commits",
     folder_name=None,
-    branch=GITHUB_BRANCH
+    branch=GITHUB_BRANCH,
+    artifact_hash=None
 ):
     """
     Push markdown content to GitHub repository with auto-incremented file names (file1.md, file2.md, etc.)
@@ -24,13 +36,20 @@ def push_md_to_github_with_auto_numbering(
     commit_message (str): Commit message
     folder_name (str): Optional custom folder name (if None, creates date-based folder)
     branch (str): Branch to push to (default is 'main')
+    artifact_hash (str): Optional hash of a stored artifact to push instead of content
     
     Returns:
     str or None: The path of the created file, or None if an error occurred
     """
+    if artifact_hash:
+        content = artifact_store.get(artifact_hash)
+        if content is None:
+            print(f"Error creating file: artifact {artifact_hash} not found")
+            return None
+
     try:
         # Initialize the GitHub instance with your token
-        g = Github(github_token)
+        g = _get_github_class()(github_token)
 
         # Get the repository
         repo = g.get_repo(repo_name)
@@ -0,0 +1,101 @@
+"""
+Entry point of a sandboxed test process, started by code_runner.run_sandboxed
+
+Runs as a script in a fresh interpreter (python -I -S) with an empty
+environment and no inherited file descriptors, so it must only use the
+standard library. Reads {"source", "cpu_seconds", "memory_mb"} as JSON on
+stdin (plus "max_processes") and writes {"status", "message"} as JSON on stdout.
+"""
+import io
+import json
+import os
+import resource
+import sys
+import traceback
+
+# Keep failure messages short enough for the chat response
+MAX_MESSAGE_CHARS = 500
+
+
+def _virtual_memory_bytes():
+    """Current address space size of this process, or None if unknown"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _user_task_count():
+    """Processes and threads currently running under this user, or None if unknown"""
+    uid = str(os.getuid())
+    count = 0
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return None
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            # Exited while we were looking
+            continue
+        if fields.get("Uid", "").split()[:1] == [uid]:
+            count += int(fields.get("Threads", "1"))
+    return count
+
+
+def set_limits(cpu_seconds, memory_mb, max_processes=None):
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_mb:
+        extra = memory_mb * 1024 * 1024
+        # The limit is on top of what the bare interpreter already maps
+        current = _virtual_memory_bytes()
+        if current is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (current + extra, current + extra))
+        else:
+            resource.setrlimit(resource.RLIMIT_DATA, (extra, extra))
+    # Generated code has no business writing files
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if max_processes is not None:
+        # RLIMIT_NPROC counts every process and thread of the user, so allow
+        # max_processes on top of what is already running (ignored for root)
+        running = _user_task_count()
+        if running is not None:
+            limit = running + max_processes
+            resource.setrlimit(resource.RLIMIT_NPROC, (limit, limit))
+
+
+def main():
+    request = json.loads(sys.stdin.read())
+    # Keep a private copy of stdout for the result and send anything the
+    # generated code prints (to either stream) to /dev/null
+    result_stream = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+    sys.stdin = io.StringIO()
+    sys.stdout = sys.stderr = io.StringIO()
+
+    result = {"status": "passed", "message": ""}
+    try:
+        set_limits(request["cpu_seconds"], request["memory_mb"], request.get("max_processes"))
+        exec(compile(request["source"], "<generated>", "exec"), {"__name__": "__sandbox__"})
+    except AssertionError as e:
+        result = {"status": "failed", "message": str(e) or "assertion failed"}
+    except MemoryError:
+        result = {"status": "error", "message": f"memory limit of {request['memory_mb']} MB exceeded"}
+    except BaseException as e:
+        result = {"status": "error", "message": traceback.format_exception_only(type(e), e)[-1].strip()}
+    result["message"] = result["message"][:MAX_MESSAGE_CHARS]
+    result_stream.write(json.dumps(result))
+    result_stream.flush()
+
+
+if __name__ == "__main__":
+    main()
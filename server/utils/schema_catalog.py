@@ -0,0 +1,275 @@
+"""
+Cached schema catalog for the data engineer agent
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from server.config import (
+    DATABASE_SCHEMA, SF_SCHEMA, SCHEMA_CACHE_PATH, SCHEMA_CACHE_TTL, SCHEMA_MAX_TABLES
+)
+
+TABLES_QUERY = """
+SELECT TABLE_NAME, TO_VARCHAR(LAST_ALTERED)
+FROM INFORMATION_SCHEMA.TABLES
+WHERE TABLE_SCHEMA = %s AND TABLE_TYPE IN ('BASE TABLE', 'VIEW')
+"""
+
+COLUMNS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+# Wait this long before retrying introspection after a failure
+FAILURE_BACKOFF_SECONDS = 60
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def parse_schema_text(schema_text):
+    """
+    Parse a "- table (col, col)" schema description such as DATABASE_SCHEMA
+
+    Parameters:
+    schema_text (str): Schema description
+
+    Returns:
+    dict: Mapping of table name to {"columns": [...], "last_altered": None}
+    """
+    tables = {}
+    for match in re.finditer(r"-\s*(\w+)\s*\(([^)]*)\)", schema_text):
+        columns = [c.strip() for c in match.group(2).split(",") if c.strip()]
+        tables[match.group(1)] = {"columns": columns, "last_altered": None}
+    return tables
+
+
+def _words(text):
+    """Split text into lower-case words, also yielding a naive singular form"""
+    words = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+
+class SchemaCatalog:
+    """
+    Introspected table/column catalog cached locally with a TTL and version hash
+
+    The catalog is loaded from the local cache file when present and refreshed
+    through the pooled Snowflake connection once it is older than the TTL.
+    Refreshes are incremental: only tables whose LAST_ALTERED changed (or that
+    are new) have their columns re-read. When introspection is unavailable the
+    static DATABASE_SCHEMA from config is used instead.
+    """
+
+    def __init__(self, cache_path=SCHEMA_CACHE_PATH, ttl=SCHEMA_CACHE_TTL,
+                 schema_name=SF_SCHEMA, connection_factory=None, fallback=DATABASE_SCHEMA):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.schema_name = schema_name
+        self.connection_factory = connection_factory
+        self.fallback_tables = parse_schema_text(fallback)
+        self.tables = {}
+        self.version = ""
+        self.refreshed_at = 0.0
+        self._failed_at = 0.0
+        self._loaded = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self.connection_factory is not None:
+            return self.connection_factory()
+        from server.utils.database_utils import connection_pool
+        return connection_pool.connection()
+
+    def _compute_version(self, tables):
+        canonical = json.dumps(
+            {name: tables[name]["columns"] for name in sorted(tables)}, sort_keys=True
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self.tables = cached["tables"]
+            self.version = cached["version"]
+            self.refreshed_at = cached["refreshed_at"]
+        except (OSError, ValueError, KeyError):
+            pass
+        self._loaded = True
+
+    def _save_cache(self):
+        with self._lock:
+            snapshot = {
+                "version": self.version,
+                "refreshed_at": self.refreshed_at,
+                "tables": self.tables,
+            }
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def refresh(self, force=False):
+        """
+        Refresh the catalog if it is stale (or always when force is set)
+
+        Introspection runs outside the lock and only in one thread at a time;
+        other callers keep using the current snapshot until it completes.
+
+        Returns:
+            bool: True when the catalog holds introspected tables afterwards
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load_cache()
+
+            now = time.time()
+            if not force:
+                # An empty schema is a valid result and is cached like any other
+                if self.refreshed_at and now - self.refreshed_at < self.ttl:
+                    return bool(self.tables)
+                if now - self._failed_at < FAILURE_BACKOFF_SECONDS:
+                    return bool(self.tables)
+            if self._refreshing:
+                return bool(self.tables)
+            self._refreshing = True
+            known = self.tables
+
+        try:
+            altered, changed, columns = self._introspect(known)
+        except Exception as e:
+            print(f"Error refreshing schema catalog: {str(e)}")
+            with self._lock:
+                self._failed_at = now
+                self._refreshing = False
+                return bool(self.tables)
+
+        tables = {name: known[name] for name in altered if name not in changed}
+        for name in changed:
+            tables[name] = {"columns": columns.get(name, []), "last_altered": altered[name]}
+
+        version = self._compute_version(tables)
+        with self._lock:
+            if version != self.version:
+                print(f"Schema catalog updated: {len(changed)} table(s) changed, version {version}")
+            self.tables = tables
+            self.version = version
+            self.refreshed_at = now
+            self._refreshing = False
+        try:
+            self._save_cache()
+        except OSError as e:
+            print(f"Error writing schema cache: {str(e)}")
+        return bool(tables)
+
+    def _introspect(self, known):
+        """
+        Read LAST_ALTERED of every table and the columns of new or altered ones
+
+        Returns:
+            tuple: ({table: last_altered}, [changed tables], {table: [columns]})
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(TABLES_QUERY, (self.schema_name,))
+                altered = {name: last_altered for name, last_altered in cursor.fetchall()}
+
+                # Only re-read columns of new or altered tables
+                changed = [
+                    name for name, last_altered in altered.items()
+                    if name not in known or known[name].get("last_altered") != last_altered
+                ]
+                columns = {}
+                if changed:
+                    placeholders = ", ".join(["%s"] * len(changed))
+                    cursor.execute(
+                        COLUMNS_QUERY.format(placeholders=placeholders),
+                        (self.schema_name, *changed),
+                    )
+                    for table_name, column_name, _ in cursor.fetchall():
+                        columns.setdefault(table_name, []).append(column_name)
+            finally:
+                cursor.close()
+        return altered, changed, columns
+
+    def get_tables(self):
+        """Return the current table mapping, falling back to the static schema"""
+        self.refresh()
+        tables = self.tables
+        return tables or self.fallback_tables
+
+    def relevant_tables(self, query, max_tables=SCHEMA_MAX_TABLES, tables=None):
+        """
+        Pick the tables most relevant to a natural-language query
+
+        Tables score for words matching their name (weighted) or their columns.
+        Tables that share an *_id column with two or more selected tables are
+        added so the model can still join them. Without any match, all tables
+        are returned up to max_tables.
+
+        Parameters:
+        query (str): The user request
+        max_tables (int): Upper bound on the number of tables returned
+        tables (dict): Table mapping to choose from; defaults to get_tables()
+
+        Returns:
+        list: Selected table names
+        """
+        if tables is None:
+            tables = self.get_tables()
+        words = _words(query)
+
+        scores = {}
+        for name, info in tables.items():
+            score = 3 * len(_words(name.replace("_", " ")) & words)
+            score += sum(1 for column in info["columns"] if column.lower() in words)
+            if score:
+                scores[name] = score
+
+        if not scores:
+            return sorted(tables)[:max_tables]
+
+        selected = sorted(scores, key=lambda name: (-scores[name], name))[:max_tables]
+        selected_keys = [
+            {c.lower() for c in tables[name]["columns"] if c.lower().endswith("_id")} for name in selected
+        ]
+        for name, info in sorted(tables.items()):
+            if len(selected) >= max_tables:
+                break
+            if name in selected:
+                continue
+            keys = {c.lower() for c in info["columns"] if c.lower().endswith("_id")}
+            if sum(1 for other in selected_keys if keys & other) >= 2:
+                selected.append(name)
+        return selected
+
+    def format_schema(self, table_names=None, tables=None):
+        """Render tables in the same "- table (col, col)" form as DATABASE_SCHEMA"""
+        if tables is None:
+            tables = self.get_tables()
+        names = table_names if table_names is not None else sorted(tables)
+        lines = ["Tables:"]
+        for name in names:
+            lines.append(f"- {name} ({', '.join(tables[name]['columns'])})")
+        return "\n".join(lines)
+
+    def schema_for_query(self, query):
+        """Return the schema text restricted to the tables relevant to query"""
+        tables = self.get_tables()
+        return self.format_schema(self.relevant_tables(query, tables=tables), tables=tables)
+
+
+schema_catalog = SchemaCatalog()
@@ -0,0 +1,127 @@
+"""
+SQLite-backed cache shared between worker processes on the same host
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from server.config import SHARED_CACHE_PATH, SHARED_CACHE_MAX_ENTRIES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+
+# Prune expired and excess entries roughly once every this many writes
+PRUNE_INTERVAL = 200
+
+
+def make_cache_key(*parts):
+    """Hash arbitrary JSON-serialisable parts into a fixed-length cache key"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SharedCache:
+    """
+    Key/value cache with per-entry TTL stored in a local SQLite database
+
+    Every process (and thread) opens its own connection, so the cache can be
+    used from preforked workers: what one worker stores, the others can read.
+    WAL mode keeps readers from blocking the writer.
+    """
+
+    def __init__(self, path=SHARED_CACHE_PATH, max_entries=SHARED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.stats = {"hits": 0, "misses": 0, "sets": 0}
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        """Return the cached value or None when missing or expired"""
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading shared cache: {str(e)}")
+            return None
+
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return pickle.loads(row[0])
+
+    def set(self, namespace, key, value, ttl):
+        """Store value for ttl seconds"""
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, pickle.dumps(value), time.time() + ttl),
+            )
+            self.stats["sets"] += 1
+            self._writes += 1
+            if self._writes % PRUNE_INTERVAL == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            print(f"Error writing shared cache: {str(e)}")
+
+    def append(self, namespace, key, item, ttl):
+        """Append item to the list stored under key in one transaction, so concurrent writers lose nothing"""
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+            items = pickle.loads(row[0]) if row else []
+            items.append(item)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, pickle.dumps(items), time.time() + ttl),
+            )
+            conn.execute("COMMIT")
+            self.stats["sets"] += 1
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Error writing shared cache: {str(e)}")
+
+    def prune(self):
+        """Delete expired entries and the soonest-expiring ones beyond max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM cache WHERE rowid IN ("
+            " SELECT rowid FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+shared_cache = SharedCache()
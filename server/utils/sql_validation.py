@@ -0,0 +1,207 @@
+"""
+Local validation of generated SQL before it is sent to Snowflake
+"""
+import json
+import sqlparse
+from sqlparse.sql import Identifier, IdentifierList, Parenthesis
+from sqlparse.tokens import CTE, Keyword
+from server.profiling import profiled
+from server.config import SCHEMA_CATALOG_ENABLED, SQL_DEFAULT_LIMIT, SQL_MAX_SCAN_BYTES
+
+ROW_LIMIT_KEYWORDS = {"LIMIT", "FETCH", "TOP"}
+
+
+def _is_table_keyword(token):
+    return token.ttype is Keyword and (token.normalized == "FROM" or token.normalized.endswith("JOIN"))
+
+
+def _collect_references(statement, tables, aliases, ctes):
+    """
+    Walk a parsed statement collecting referenced tables, aliases and CTE names
+
+    Parameters:
+    statement (TokenList): Parsed statement or sub-group
+    tables (set): Receives referenced table names (upper case)
+    aliases (dict): Receives alias -> table name (upper case)
+    ctes (set): Receives names defined in WITH clauses (upper case)
+    """
+    expecting_table = False
+    expecting_cte = False
+    for token in statement.tokens:
+        if token.is_whitespace or token.ttype in sqlparse.tokens.Comment:
+            continue
+
+        if token.ttype is CTE:
+            expecting_cte = True
+            continue
+        if expecting_cte:
+            identifiers = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+            for identifier in identifiers:
+                if isinstance(identifier, Identifier):
+                    ctes.add(identifier.get_real_name().upper())
+                    _collect_references(identifier, tables, aliases, ctes)
+            expecting_cte = False
+            continue
+
+        if _is_table_keyword(token):
+            expecting_table = True
+            continue
+
+        if expecting_table:
+            identifiers = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+            for identifier in identifiers:
+                if isinstance(identifier, Identifier) and not any(isinstance(t, Parenthesis) for t in identifier.tokens):
+                    name = identifier.get_real_name()
+                    if name:
+                        tables.add(name.upper())
+                        aliases[(identifier.get_alias() or name).upper()] = name.upper()
+                elif identifier.is_group:
+                    _collect_references(identifier, tables, aliases, ctes)
+            expecting_table = False
+            continue
+
+        if token.is_group:
+            _collect_references(token, tables, aliases, ctes)
+
+
+def _qualified_columns(statement):
+    """Yield (qualifier, column) pairs for every "qualifier.column" reference"""
+    for token in _walk_identifiers(statement):
+        parent = token.get_parent_name()
+        name = token.get_real_name()
+        if parent and name and name != "*":
+            yield parent.upper(), name.upper()
+
+
+def _walk_identifiers(token_list):
+    for token in token_list.tokens:
+        if isinstance(token, Identifier):
+            yield token
+        if token.is_group:
+            yield from _walk_identifiers(token)
+
+
+def _has_row_limit(statement):
+    """Return True when the top-level statement already bounds its row count"""
+    for token in statement.tokens:
+        if token.ttype in Keyword and token.normalized in ROW_LIMIT_KEYWORDS:
+            return True
+        # Snowflake's "SELECT TOP n" is parsed as an identifier named TOP
+        if isinstance(token, (Identifier, IdentifierList)) and token.value.upper().split()[0] == "TOP":
+            return True
+    return False
+
+
+def _check_schema(statement, catalog):
+    """Return an error message if the statement references unknown tables or columns"""
+    tables, aliases, ctes = set(), {}, set()
+    _collect_references(statement, tables, aliases, ctes)
+
+    known = {name.upper(): {c.upper() for c in info["columns"]} for name, info in catalog.tables.items()}
+    unknown = sorted(name for name in tables - ctes if name not in known)
+    if unknown:
+        return f"Unknown table(s): {', '.join(unknown)}. Known tables: {', '.join(sorted(known))}"
+
+    for qualifier, column in _qualified_columns(statement):
+        table = aliases.get(qualifier, qualifier if qualifier in known else None)
+        if table in known and column not in known[table]:
+            return f"Unknown column {column} in table {table}"
+    return None
+
+
+@profiled("validate_sql")
+def validate_sql(sql_query, catalog=None, default_limit=SQL_DEFAULT_LIMIT, max_scan_bytes=SQL_MAX_SCAN_BYTES):
+    """
+    Validate a generated SQL query locally and make it safe to execute
+
+    The query must be a single SELECT statement (CTEs allowed). When the schema
+    catalog holds introspected tables, referenced tables and qualified columns
+    are checked against it. A LIMIT is appended when the query has no row bound,
+    and when max_scan_bytes is set an EXPLAIN estimate must stay under it.
+
+    Parameters:
+    sql_query (str): The SQL extracted from the model output
+    catalog (SchemaCatalog): Catalog to check against (defaults to the shared one)
+    default_limit (int): LIMIT appended to unbounded queries (0 disables)
+    max_scan_bytes (int): Maximum estimated bytes scanned (0 disables EXPLAIN)
+
+    Returns:
+    dict: {"status": "success", "query": ...} or {"status": "error", "error": ...}
+    """
+    sql_query = sql_query.strip().rstrip(";").strip()
+    statements = [s for s in sqlparse.parse(sql_query) if s.value.strip().strip(";")]
+    if len(statements) != 1:
+        return {
+            "error": f"Expected exactly one SQL statement, found {len(statements)}",
+            "status": "error"
+        }
+
+    statement = statements[0]
+    statement_type = statement.get_type()
+    if statement_type != "SELECT":
+        return {
+            "error": f"Only SELECT statements can be executed, got {statement_type}",
+            "status": "error"
+        }
+
+    if catalog is None and SCHEMA_CATALOG_ENABLED:
+        from server.utils.schema_catalog import schema_catalog
+        catalog = schema_catalog
+    if catalog is not None and catalog.refresh() and catalog.tables:
+        error = _check_schema(statement, catalog)
+        if error:
+            return {"error": error, "status": "error"}
+
+    if default_limit and not _has_row_limit(statement):
+        sql_query = f"{sql_query}\nLIMIT {int(default_limit)}"
+
+    if max_scan_bytes:
+        estimate = estimate_query_cost(sql_query)
+        if estimate["status"] == "error":
+            return estimate
+        if estimate["bytes_assigned"] > max_scan_bytes:
+            return {
+                "error": (
+                    f"Query would scan an estimated {estimate['bytes_assigned']} bytes "
+                    f"({estimate['partitions_assigned']} of {estimate['partitions_total']} partitions), "
+                    f"over the limit of {max_scan_bytes} bytes"
+                ),
+                "status": "error"
+            }
+
+    return {"query": sql_query, "status": "success"}
+
+
+def estimate_query_cost(sql_query):
+    """
+    Estimate the cost of a query with Snowflake's EXPLAIN USING JSON
+
+    Parameters:
+    sql_query (str): The SQL query to estimate
+
+    Returns:
+    dict: Partition and byte estimates, or error information
+    """
+    from server.utils.database_utils import connection_pool
+
+    try:
+        with connection_pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"EXPLAIN USING JSON {sql_query}")
+                plan = json.loads(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+    except Exception as e:
+        return {
+            "error": f"Could not estimate query cost: {str(e)}",
+            "status": "error"
+        }
+
+    stats = plan.get("GlobalStats", {})
+    return {
+        "bytes_assigned": stats.get("bytesAssigned", 0),
+        "partitions_assigned": stats.get("partitionsAssigned", 0),
+        "partitions_total": stats.get("partitionsTotal", 0),
+        "status": "success"
+    }
@@ -0,0 +1,19 @@
+"""
+Small statistics helpers shared by the latency and budget trackers
+"""
+import math
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a non-empty collection of numbers
+
+    Parameters:
+    values (iterable): The samples
+    pct (float): Percentile between 0 and 100
+
+    Returns:
+    The smallest sample with at least pct percent of the samples at or below it
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1))]
@@ -82,6 +82,92 @@ document.addEventListener('DOMContentLoaded', function() {
         chatContainer.scrollTop = chatContainer.scrollHeight;
     }
     
+    function renderBlock(block) {
+        if (block.type === 'code') {
+            const pre = document.createElement('pre');
+            const code = document.createElement('code');
+            code.textContent = block.code;
+            pre.appendChild(code);
+            return pre;
+        }
+        
+        if (block.type === 'table') {
+            // Columns arrive as one array of values per column
+            const table = document.createElement('table');
+            table.className = 'result-table';
+            const headerRow = table.createTHead().insertRow();
+            block.columns.forEach(column => {
+                const th = document.createElement('th');
+                th.textContent = column;
+                headerRow.appendChild(th);
+            });
+            const body = table.createTBody();
+            for (let row = 0; row < block.row_count; row++) {
+                const tr = body.insertRow();
+                block.values.forEach(values => {
+                    tr.insertCell().textContent = values[row] === null ? 'NULL' : String(values[row]);
+                });
+            }
+            const wrapper = document.createElement('div');
+            wrapper.className = 'table-wrapper';
+            wrapper.appendChild(table);
+            return wrapper;
+        }
+        
+        if (block.type === 'tests') {
+            const pre = document.createElement('pre');
+            const code = document.createElement('code');
+            if (block.status === 'error') {
+                code.textContent = 'Test execution: ' + block.error;
+            } else {
+                const lines = [`Test execution: ${block.passed} passed, ${block.failed} failed, ` +
+                               `${block.error} errors, ${block.timeout} timed out`];
+                block.cases.forEach(testCase => {
+                    let line = testCase.status.toUpperCase().padEnd(8) + testCase.name;
+                    if (testCase.status !== 'passed' && testCase.message) {
+                        line += '  -- ' + testCase.message;
+                    }
+                    lines.push(line);
+                });
+                code.textContent = lines.join('\n');
+            }
+            pre.appendChild(code);
+            return pre;
+        }
+        
+        if (block.type === 'query') {
+            const div = document.createElement('div');
+            div.textContent = `Query ${block.query_id} is still running. ` +
+                              `Fetch its results from /api/queries/${block.query_id}.`;
+            return div;
+        }
+        
+        const div = document.createElement('div');
+        div.textContent = block.text || '';
+        return div;
+    }
+    
+    function addSections(sections) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message agent-message';
+        
+        sections.forEach(section => {
+            const agentName = document.createElement('div');
+            agentName.className = 'agent-name';
+            agentName.textContent = section.agent;
+            
+            const messageContent = document.createElement('div');
+            messageContent.className = 'message-content';
+            section.blocks.forEach(block => messageContent.appendChild(renderBlock(block)));
+            
+            messageDiv.appendChild(agentName);
+            messageDiv.appendChild(messageContent);
+        });
+        
+        chatContainer.appendChild(messageDiv);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+    
     function sendMessage() {
         const message = userInput.value.trim();
         if (!message) return;
@@ -102,7 +188,8 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({
                 message: message,
                 user_id: userId,
-                thread_id: threadId
+                thread_id: threadId,
+                format: 'structured'
             })
         })
         .then(response => {
@@ -121,7 +208,9 @@ document.addEventListener('DOMContentLoaded', function() {
             loadingIndicator.style.display = 'none';
             
             // Add agent response
-            if (data.response) {
+            if (data.sections && data.sections.length) {
+                addSections(data.sections);
+            } else if (data.response) {
                 addMessage(data.response, false);
             } else {
                 addMessage("Sorry, I couldn't process your request.", false);
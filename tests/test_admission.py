@@ -0,0 +1,160 @@
+"""
+Tests for admission control and fair scheduling of chat requests
+"""
+import threading
+import time
+
+import pytest
+
+from server.admission import AdmissionController, AdmissionRejected
+
+
+def make_controller(**kwargs):
+    options = {"max_concurrent": 1, "per_user_limit": 1, "max_queue_depth": 10, "per_user_queue": 5,
+               "queue_timeout": 5.0}
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def wait_for_queue(controller, count):
+    deadline = time.time() + 5
+    while sum(controller.get_stats()["queued"].values()) < count:
+        assert time.time() < deadline, "requests were not queued"
+        time.sleep(0.005)
+
+
+def queue_requests(controller, requests):
+    """
+    Queue (user, lane, cost) requests one at a time behind a held slot
+
+    Returns:
+        tuple: (held ticket, list receiving the users in admission order, threads)
+    """
+    held = controller.acquire("holder")
+    order = []
+    lock = threading.Lock()
+
+    def run(user_id, lane, cost):
+        ticket = controller.acquire(user_id, lane, cost)
+        with lock:
+            order.append(user_id)
+        controller.release(ticket)
+
+    threads = []
+    for i, (user_id, lane, cost) in enumerate(requests):
+        thread = threading.Thread(target=run, args=(user_id, lane, cost))
+        thread.start()
+        threads.append(thread)
+        wait_for_queue(controller, i + 1)
+    return held, order, threads
+
+
+def finish(controller, held, threads):
+    controller.release(held)
+    for thread in threads:
+        thread.join(5)
+
+
+def test_users_are_served_fairly():
+    controller = make_controller()
+    # Alice queues three requests before Bob's single one
+    held, order, threads = queue_requests(controller, [
+        ("alice", "short", 1.0), ("alice", "short", 1.0), ("alice", "short", 1.0), ("bob", "short", 1.0),
+    ])
+
+    finish(controller, held, threads)
+
+    assert order == ["alice", "bob", "alice", "alice"]
+
+
+def test_user_weights_scale_the_share():
+    controller = make_controller(user_weights={"bob": 4.0})
+    held, order, threads = queue_requests(controller, [
+        ("alice", "short", 1.0), ("alice", "short", 1.0), ("bob", "short", 1.0), ("bob", "short", 1.0),
+    ])
+
+    finish(controller, held, threads)
+
+    assert order == ["bob", "bob", "alice", "alice"]
+
+
+def test_lanes_share_slots_by_weight():
+    controller = make_controller(lane_weights={"short": 2, "long": 1})
+    held, order, threads = queue_requests(controller, [
+        ("long-1", "long", 1.0), ("long-2", "long", 1.0), ("long-3", "long", 1.0),
+        ("short-1", "short", 1.0), ("short-2", "short", 1.0), ("short-3", "short", 1.0),
+    ])
+
+    finish(controller, held, threads)
+
+    assert order[:3] == ["long-1", "short-1", "short-2"]
+    assert sorted(order) == sorted(["long-1", "long-2", "long-3", "short-1", "short-2", "short-3"])
+
+
+def test_full_queue_is_shed():
+    controller = make_controller(max_queue_depth=1)
+    held, order, threads = queue_requests(controller, [("alice", "short", 1.0)])
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("bob")
+    assert excinfo.value.retry_after >= 1
+    finish(controller, held, threads)
+    assert controller.get_stats()["shed_queue_full"] == 1
+
+
+def test_per_user_queue_is_shed():
+    controller = make_controller(per_user_queue=1)
+    held, order, threads = queue_requests(controller, [("alice", "short", 1.0)])
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("alice")
+    finish(controller, held, threads)
+    assert controller.get_stats()["shed_user_queue"] == 1
+
+
+def test_waiting_too_long_is_shed():
+    controller = make_controller(queue_timeout=0.05)
+    held = controller.acquire("holder")
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("alice")
+    controller.release(held)
+    stats = controller.get_stats()
+    assert stats["shed_timeout"] == 1
+    assert stats["queued"] == {"short": 0, "long": 0}
+
+
+def test_try_acquire_only_takes_an_idle_slot():
+    controller = make_controller(max_concurrent=2, per_user_limit=2)
+
+    ticket = controller.try_acquire("alice", "long")
+    assert ticket is not None
+    held, order, threads = queue_requests(controller, [])
+    assert controller.try_acquire("bob") is None
+
+    controller.release(ticket)
+    finish(controller, held, threads)
+    stats = controller.get_stats()
+    assert (stats["background_admitted"], stats["background_refused"]) == (1, 1)
+    assert stats["active"] == 0
+
+
+def test_unknown_lane_uses_the_default_lane():
+    controller = make_controller()
+
+    ticket = controller.acquire("alice", "bulk")
+    controller.release(ticket, 1.0)
+
+    assert ticket.lane == "short"
+    assert controller.try_acquire("alice", "bulk").lane == "short"
+    assert make_controller(lane_weights={"fast": 1, "slow": 1}).default_lane == "fast"
+
+
+@pytest.mark.parametrize("options", [
+    {"lane_weights": {"short": 0, "long": 1}},
+    {"lane_weights": {"short": -1}},
+    {"user_weights": {"alice": 0}},
+])
+def test_weights_must_be_positive(options):
+    with pytest.raises(ValueError):
+        make_controller(**options)
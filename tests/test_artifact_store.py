@@ -0,0 +1,117 @@
+"""
+Tests for the content-addressed artifact store
+"""
+import hashlib
+import os
+
+import pytest
+
+from server.utils.artifact_store import ArtifactStore, make_reference
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(path=str(tmp_path / "artifacts"), max_bytes=1000)
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def test_put_and_get_by_hash_prefix_and_reference(store):
+    artifact_hash = store.put("def add(a, b):\n    return a + b\n", "code", "alice", "t1", "se")
+
+    assert artifact_hash == sha256("def add(a, b):\n    return a + b\n")
+    assert store.get(artifact_hash) == "def add(a, b):\n    return a + b\n"
+    assert store.get(artifact_hash[:8]) == store.get(make_reference(artifact_hash, "code"))
+    assert store.info(artifact_hash)["kind"] == "code"
+
+
+def test_identical_content_is_stored_once(store):
+    first = store.put("SELECT 1", "sql", "alice", "t1", "de")
+    second = store.put("SELECT 1", "sql", "bob", "t2", "de")
+
+    assert first == second
+    stats = store.get_stats()
+    assert (stats["stored"], stats["deduplicated"], stats["artifacts"]) == (1, 1, 1)
+    assert store.is_owner(first, "alice") and store.is_owner(first, "bob")
+
+
+def test_unknown_or_short_references_miss(store):
+    assert store.put("", "code") is None
+    assert store.get("artifact:code:0123456789abcdef") is None
+    assert store.get("abc") is None
+    assert store.get_stats()["misses"] == 2
+
+
+def test_list_is_per_user_and_newest_first(store):
+    code = store.put("code", "code", "alice", "t1", "se")
+    tests = store.put("tests", "tests", "alice", "t1", "qa")
+    store.put("docs", "docs", "bob", "t1", "dp")
+
+    assert [entry["hash"] for entry in store.list("alice")] == [tests, code]
+    assert [entry["hash"] for entry in store.list("alice", kind="code")] == [code]
+    assert store.list("alice", thread_id="t2") == []
+
+
+def test_least_recently_used_blobs_are_evicted(store):
+    old = store.put("a" * 400, "code")
+    recent = store.put("b" * 400, "code")
+    # Reading the older blob makes it the most recently used one
+    store._connection().execute("UPDATE artifacts SET last_access = 0 WHERE hash = ?", (recent,))
+    store.get(old)
+
+    newest = store.put("c" * 400, "code")
+
+    assert store.get(recent) is None
+    assert store.get(old) == "a" * 400
+    assert store.get(newest) == "c" * 400
+    assert store.get_stats()["evicted"] == 1
+    assert store.get_stats()["bytes"] <= store.max_bytes
+
+
+def test_blob_removed_from_disk_is_forgotten(store):
+    artifact_hash = store.put("text", "docs", "alice", "t1", "dp")
+    os.remove(store._blob_path(artifact_hash))
+
+    assert store.get(artifact_hash) is None
+    assert store.info(artifact_hash) is None
+    assert store.list("alice") == []
+
+
+def test_publications_are_recorded_per_user(store):
+    artifact_hash = store.put("# Docs", "docs", "alice", "t1", "dp")
+
+    store.record_publication(artifact_hash, "alice", "docs/1.md")
+
+    assert store.get_publication(artifact_hash, "alice") == "docs/1.md"
+    assert store.get_publication(artifact_hash, "bob") is None
+
+
+def test_eviction_drops_publications(store):
+    artifact_hash = store.put("x" * 600, "docs", "alice", "t1", "dp")
+    store.record_publication(artifact_hash, "alice", "docs/1.md")
+    store._connection().execute("UPDATE artifacts SET last_access = 0 WHERE hash = ?", (artifact_hash,))
+
+    store.put("y" * 600, "docs")
+
+    assert store.get_publication(artifact_hash, "alice") is None
+
+
+def test_eviction_forgets_the_index_rows_before_unlinking_blobs(store, monkeypatch):
+    artifact_hash = store.put("x" * 600, "docs", "alice", "t1", "dp")
+    store._connection().execute("UPDATE artifacts SET last_access = 0 WHERE hash = ?", (artifact_hash,))
+    indexed_at_unlink = []
+    remove = os.remove
+
+    def checked_remove(path):
+        # A second connection, as another worker would see the index
+        other = ArtifactStore(path=store.path, max_bytes=store.max_bytes)
+        indexed_at_unlink.append(other.info(artifact_hash) is not None)
+        remove(path)
+
+    monkeypatch.setattr(os, "remove", checked_remove)
+    store.put("y" * 600, "docs")
+
+    assert indexed_at_unlink == [False]
+    assert not os.path.exists(store._blob_path(artifact_hash))
@@ -0,0 +1,201 @@
+"""
+Tests for test case extraction and sandboxed execution of generated code
+"""
+import os
+import time
+
+import pytest
+
+from server.utils.code_runner import (
+    CodeRunner, extract_python_code, format_test_report, run_sandboxed, split_test_cases
+)
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="sandboxed execution requires POSIX")
+
+
+def _is_running(pid):
+    """Whether pid exists and is not a zombie waiting to be reaped"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+    except OSError:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+CODE = """Here is the function:
+
+```python
+def add(a, b):
+    return a + b
+```
+"""
+
+TESTS = """```python
+import unittest
+
+assert add(1, 2) == 3
+assert add(1, 1) == 3, "one plus one"
+
+def test_negative():
+    assert add(-1, -1) == -2
+
+class TestAdd(unittest.TestCase):
+    def test_zero(self):
+        self.assertEqual(add(0, 0), 0)
+
+    def helper(self):
+        pass
+
+if __name__ == "__main__":
+    unittest.main()
+```"""
+
+
+def test_extract_python_code_joins_blocks():
+    text = "a\n```python\nx = 1\n```\nb\n```py\ny = 2\n```"
+
+    assert extract_python_code(text) == "x = 1\n\ny = 2"
+    assert extract_python_code("x = 1") == "x = 1"
+    assert extract_python_code(None) == ""
+
+
+def test_split_test_cases():
+    setup, cases = split_test_cases(extract_python_code(TESTS))
+
+    assert [name for name, _ in cases] == [
+        "assert add(1, 2) == 3",
+        'assert add(1, 1) == 3, "one plus one"',
+        "test_negative",
+        "TestAdd.test_zero",
+    ]
+    assert dict(cases)["TestAdd.test_zero"] == "TestAdd('test_zero').debug()"
+    assert "import unittest" in setup
+    assert "def test_negative" in setup
+    assert "unittest.main()" not in setup
+
+
+def test_split_test_cases_rejects_invalid_code():
+    with pytest.raises(SyntaxError):
+        split_test_cases("assert (")
+
+
+@posix_only
+@pytest.mark.parametrize("source, status, message", [
+    ("assert 1 + 1 == 2", "passed", ""),
+    ("assert 1 == 2, 'mismatch'", "failed", "mismatch"),
+    ("raise ValueError('bad input')", "error", "ValueError: bad input"),
+])
+def test_run_sandboxed_reports_the_outcome(source, status, message):
+    result = run_sandboxed(source, cpu_seconds=5, memory_mb=256, timeout=10)
+
+    assert result["status"] == status
+    assert result["message"] == message
+    assert result["duration_ms"] > 0
+
+
+@posix_only
+def test_run_sandboxed_hides_the_environment(monkeypatch):
+    monkeypatch.setenv("SANDBOX_TEST_SECRET", "hunter2")
+
+    result = run_sandboxed("import os\nassert 'SANDBOX_TEST_SECRET' not in os.environ, dict(os.environ)",
+                           cpu_seconds=5, memory_mb=256, timeout=10)
+
+    assert result["status"] == "passed", result["message"]
+
+
+@posix_only
+def test_run_sandboxed_cannot_write_files():
+    result = run_sandboxed("with open('out.txt', 'w') as f:\n    f.write('x' * 10)",
+                           cpu_seconds=5, memory_mb=256, timeout=10)
+
+    assert result["status"] == "error"
+    assert "File too large" in result["message"]
+
+
+@posix_only
+def test_run_sandboxed_enforces_the_memory_limit():
+    result = run_sandboxed("data = bytearray(512 * 1024 * 1024)", cpu_seconds=5, memory_mb=64, timeout=10)
+
+    assert result["status"] == "error"
+    assert "memory limit" in result["message"]
+
+
+@posix_only
+def test_run_sandboxed_enforces_the_wall_clock_limit():
+    result = run_sandboxed("import time\ntime.sleep(30)", cpu_seconds=5, memory_mb=256, timeout=1)
+
+    assert result["status"] == "timeout"
+
+
+@posix_only
+def test_run_sandboxed_discards_output(capfd):
+    result = run_sandboxed("import sys\nprint('to stdout')\nprint('to stderr', file=sys.stderr)",
+                           cpu_seconds=5, memory_mb=256, timeout=10)
+
+    assert result["status"] == "passed"
+    assert "output" not in result
+    captured = capfd.readouterr()
+    assert "to stdout" not in captured.out and "to stderr" not in captured.err
+
+
+@posix_only
+def test_run_tests_runs_every_case():
+    runner = CodeRunner(max_workers=2)
+    try:
+        results = runner.run_tests(CODE, TESTS)
+    finally:
+        runner.shutdown()
+
+    assert results["status"] == "success"
+    assert (results["passed"], results["failed"], results["error"], results["timeout"]) == (3, 1, 0, 0)
+    assert [case["status"] for case in results["cases"]] == ["passed", "failed", "passed", "passed"]
+    report = format_test_report(results)
+    assert report.startswith("Test execution: 3 passed, 1 failed")
+    assert 'FAIL    assert add(1, 1) == 3, "one plus one"  -- one plus one' in report
+
+
+def test_run_tests_reports_missing_cases():
+    runner = CodeRunner(max_workers=1)
+
+    results = runner.run_tests(CODE, "```python\nx = 1\n```")
+
+    assert results == {"error": "No test cases found in the QA tester output", "status": "error"}
+    assert format_test_report(results) == "Test execution: No test cases found in the QA tester output"
+
+
+@posix_only
+def test_run_sandboxed_kills_processes_the_code_started():
+    # The case leaves a background grandchild behind and reports its pid as the failure message
+    source = ("import subprocess\n"
+              "child = subprocess.Popen(['/bin/sleep', '137'])\n"
+              "assert False, str(child.pid)")
+
+    result = run_sandboxed(source, cpu_seconds=5, memory_mb=256, timeout=10)
+
+    if result["status"] == "error":
+        # Starting the process was refused by the process limit
+        return
+    assert result["status"] == "failed"
+    pid = int(result["message"])
+    deadline = time.time() + 5
+    while _is_running(pid):
+        assert time.time() < deadline, f"process {pid} started by the sandboxed code is still running"
+        time.sleep(0.05)
+
+
+@posix_only
+def test_run_sandboxed_limits_the_number_of_processes():
+    if os.getuid() == 0:
+        pytest.skip("RLIMIT_NPROC does not apply to root")
+    source = ("import subprocess\n"
+              "children = [subprocess.Popen(['/bin/sleep', '5']) for _ in range(50)]")
+
+    result = run_sandboxed(source, cpu_seconds=5, memory_mb=256, timeout=10, max_processes=4)
+
+    assert result["status"] == "error"
+    assert "Resource temporarily unavailable" in result["message"]
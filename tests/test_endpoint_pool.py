@@ -0,0 +1,165 @@
+"""
+Tests for replica pools, circuit breakers and hedged requests
+"""
+import threading
+import time
+
+import pytest
+
+from server.agents import endpoint_pool
+from server.agents.endpoint_pool import AttemptCancelled, CircuitBreaker, EndpointPool
+
+
+def open_breaker(reset_seconds=60.0):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=reset_seconds)
+    breaker.record_failure()
+    assert breaker.record_failure() is True
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60.0)
+
+    assert breaker.record_failure() is False
+    assert breaker.state == "closed"
+    assert breaker.record_failure() is True
+    assert breaker.state == "open"
+    assert not breaker.available()
+    assert not breaker.allow_request()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60.0)
+    breaker.record_failure()
+    breaker.record_success()
+
+    assert breaker.record_failure() is False
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = open_breaker(reset_seconds=0.0)
+
+    assert breaker.available()
+    assert breaker.allow_request()
+    assert breaker.state == "half_open"
+    assert not breaker.available()
+    assert not breaker.allow_request()
+
+
+def test_probe_success_closes_the_breaker():
+    breaker = open_breaker(reset_seconds=0.0)
+    breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == "closed"
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_probe_failure_opens_the_breaker_again():
+    breaker = open_breaker(reset_seconds=0.0)
+    breaker.allow_request()
+    breaker.reset_seconds = 60.0
+
+    assert breaker.record_failure() is True
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+
+
+def test_released_probe_can_be_claimed_again():
+    breaker = open_breaker(reset_seconds=0.0)
+    breaker.allow_request()
+
+    breaker.release()
+
+    assert breaker.allow_request()
+
+
+def test_single_replica_calls_through():
+    pool = EndpointPool(["a"])
+
+    assert pool.execute(lambda url, cancelled: f"answer from {url}") == "answer from a"
+    assert pool.stats["requests"] == 1
+
+
+def test_failed_request_fails_over_to_the_next_replica():
+    pool = EndpointPool(["a", "b"])
+    pool._round_robin = iter([0])
+
+    def fn(url, cancelled):
+        if url == "a":
+            raise RuntimeError("replica down")
+        return url
+
+    assert pool.execute(fn) == "b"
+    assert pool.stats["failovers"] == 1
+    assert pool.replicas[0].failures == 1
+
+
+def test_error_is_raised_when_every_replica_fails():
+    pool = EndpointPool(["a", "b"])
+
+    def fn(url, cancelled):
+        raise RuntimeError(f"{url} down")
+
+    with pytest.raises(RuntimeError):
+        pool.execute(fn)
+    assert pool.stats["errors"] == 1
+
+
+def test_ejected_replicas_are_skipped():
+    pool = EndpointPool(["a", "b"])
+    pool.replicas[0].breaker = open_breaker()
+    calls = []
+
+    def fn(url, cancelled):
+        calls.append(url)
+        return url
+
+    assert [pool.execute(fn) for _ in range(3)] == ["b", "b", "b"]
+    assert calls == ["b", "b", "b"]
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled(monkeypatch):
+    monkeypatch.setattr(endpoint_pool, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(endpoint_pool, "HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(endpoint_pool, "HEDGE_MIN_DELAY_MS", 20)
+    pool = EndpointPool(["slow", "fast"])
+    pool._latencies.append(0.02)
+    pool._round_robin = iter([0])
+    loser_cancelled = threading.Event()
+
+    def fn(url, cancelled):
+        if url == "fast":
+            return url
+        if cancelled.wait(5):
+            loser_cancelled.set()
+            raise AttemptCancelled()
+        return url
+
+    assert pool.execute(fn) == "fast"
+    assert loser_cancelled.wait(5)
+    assert pool.stats["hedges"] == 1
+    assert pool.stats["hedge_wins"] == 1
+    assert pool.stats["cancelled"] == 1
+    # Cancelling is not a failure of the replica
+    time.sleep(0.05)
+    assert pool.replicas[0].failures == 0
+    assert pool.replicas[0].breaker.state == "closed"
+
+
+def test_hedging_is_skipped_inside_without_hedging(monkeypatch):
+    monkeypatch.setattr(endpoint_pool, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(endpoint_pool, "HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(endpoint_pool, "HEDGE_MIN_DELAY_MS", 1)
+    pool = EndpointPool(["a", "b"])
+    pool._latencies.append(0.001)
+
+    def fn(url, cancelled):
+        time.sleep(0.05)
+        return url
+
+    with endpoint_pool.without_hedging():
+        pool.execute(fn)
+    assert pool.stats["hedges"] == 0
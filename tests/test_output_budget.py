@@ -0,0 +1,80 @@
+"""
+Tests for the learned per-agent output token budgets
+"""
+from server.agents.output_budget import OutputBudget, estimate_tokens, get_output_budget
+
+
+def make_budget(**kwargs):
+    options = {"ceiling": 4096, "margin": 0.25, "min_samples": 5, "floor": 100, "window": 50}
+    options.update(kwargs)
+    return OutputBudget(**options)
+
+
+def test_uses_the_ceiling_until_enough_samples():
+    budget = make_budget()
+    for _ in range(4):
+        budget.observe(200)
+
+    assert budget.current() == 4096
+
+
+def test_budget_is_p95_plus_margin():
+    budget = make_budget()
+    for tokens in range(1, 21):
+        budget.observe(tokens * 100)
+
+    # p95 of 100..2000 is 1900, plus 25%
+    assert budget.current() == 2375
+
+
+def test_budget_is_clamped_between_floor_and_ceiling():
+    short = make_budget()
+    long = make_budget(ceiling=1000)
+    for _ in range(5):
+        short.observe(10)
+        long.observe(5000)
+
+    assert short.current() == 100
+    assert long.current() == 1000
+
+
+def test_floor_never_exceeds_the_ceiling():
+    assert make_budget(ceiling=64, floor=256).floor == 64
+
+
+def test_only_the_recent_window_counts():
+    budget = make_budget(window=5)
+    for _ in range(5):
+        budget.observe(3000)
+    for _ in range(5):
+        budget.observe(400)
+
+    assert budget.current() == 500
+
+
+def test_snapshot_counts_outcomes():
+    budget = make_budget()
+    budget.observe(300)
+    budget.record("truncated")
+    budget.record("stop_sequence")
+    budget.record("stop_sequence")
+
+    snapshot = budget.snapshot()
+
+    assert snapshot["calls"] == 1
+    assert snapshot["truncated"] == 1
+    assert snapshot["stop_sequence"] == 2
+    assert snapshot["samples"] == 1
+    assert snapshot["budget"] == snapshot["ceiling"] == 4096
+
+
+def test_get_output_budget_is_shared_per_agent():
+    budget = get_output_budget("test_output_budget_agent", 2048)
+
+    assert get_output_budget("test_output_budget_agent", 2048) is budget
+    assert get_output_budget("test_output_budget_other", 2048) is not budget
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 401) == 101
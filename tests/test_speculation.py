@@ -0,0 +1,96 @@
+"""
+Tests for the speculative prefetch of downstream agent stages
+"""
+import threading
+
+import pytest
+
+from server.speculation import SpeculativeExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = SpeculativeExecutor(max_workers=1)
+    yield executor
+    executor._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def blocker():
+    """Occupy the single worker until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+        return "blocker"
+    return run, started, release
+
+
+def test_claim_with_same_input_returns_the_result(executor):
+    executor.schedule("u:t", "qa", "input", lambda: "tests")
+
+    future = executor.claim("u:t", "qa", "input")
+
+    assert future.result(timeout=5) == "tests"
+    assert executor.get_stats()["hits"] == 1
+
+
+def test_claim_with_different_input_discards_the_speculation(executor):
+    discarded = []
+    executor.schedule("u:t", "qa", "old input", lambda: "tests", on_discard=discarded.append)
+
+    assert executor.claim("u:t", "qa", "new input") is None
+    assert executor.claim("u:t", "qa", "old input") is None
+    assert len(discarded) == 1
+    assert executor.get_stats()["misses"] == 1
+
+
+def test_claim_cancels_a_speculation_that_has_not_started(executor):
+    run, started, release = blocker()
+    executor.schedule("u:t", "se", "a", run)
+    assert started.wait(5)
+    discarded = []
+    executor.schedule("u:t", "qa", "b", lambda: "tests", on_discard=discarded.append)
+
+    # Queued behind the blocker: the real stage runs inline instead of waiting
+    assert executor.claim("u:t", "qa", "b") is None
+    assert len(discarded) == 1 and discarded[0].cancelled()
+    assert executor.get_stats()["not_started"] == 1
+    release.set()
+
+
+def test_schedule_with_same_input_reuses_the_future(executor):
+    first = executor.schedule("u:t", "qa", "input", lambda: "tests")
+
+    assert executor.schedule("u:t", "qa", "input", lambda: "other") is first
+    assert executor.get_stats()["scheduled"] == 1
+
+
+def test_retain_drops_other_stages(executor):
+    run, started, release = blocker()
+    executor.schedule("u:t", "se", "a", run)
+    assert started.wait(5)
+    qa = executor.schedule("u:t", "qa", "b", lambda: "tests")
+    dp = executor.schedule("u:t", "dp", "c", lambda: "docs")
+
+    executor.retain("u:t", {"qa"})
+
+    assert dp.cancelled()
+    assert not qa.cancelled()
+    assert executor.claim("u:t", "dp", "c") is None
+    release.set()
+
+
+def test_cancel_drops_every_stage_of_the_thread(executor):
+    run, started, release = blocker()
+    executor.schedule("u:t", "se", "a", run)
+    assert started.wait(5)
+    other_thread = executor.schedule("u:other", "qa", "b", lambda: "tests")
+
+    executor.cancel("u:t")
+    release.set()
+
+    assert executor.claim("u:t", "se", "a") is None
+    assert other_thread.result(timeout=5) == "tests"
+    assert executor.claim("u:other", "qa", "b") is other_thread
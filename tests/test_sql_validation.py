@@ -0,0 +1,122 @@
+"""
+Tests for local validation of generated SQL
+"""
+import json
+from contextlib import contextmanager
+
+import pytest
+
+from server.utils import database_utils
+from server.utils.sql_validation import estimate_query_cost, validate_sql
+
+
+class FakeCatalog:
+    """Schema catalog holding a fixed set of introspected tables"""
+
+    def __init__(self, tables):
+        self.tables = {name: {"columns": columns, "last_altered": None} for name, columns in tables.items()}
+
+    def refresh(self):
+        return True
+
+
+class FakeCursor:
+    def __init__(self, plan=None, error=None):
+        self.plan = plan
+        self.error = error
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+        if self.error:
+            raise self.error
+
+    def fetchone(self):
+        return (json.dumps(self.plan),)
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @contextmanager
+    def connection(self):
+        conn = type("Connection", (), {"cursor": lambda _: self.cursor})()
+        yield conn
+
+
+CATALOG = FakeCatalog({
+    "CUSTOMERS": ["CUSTOMER_ID", "NAME", "COUNTRY"],
+    "ORDERS": ["ORDER_ID", "CUSTOMER_ID", "TOTAL"],
+})
+
+
+def validate(sql, **kwargs):
+    kwargs.setdefault("catalog", CATALOG)
+    kwargs.setdefault("default_limit", 0)
+    kwargs.setdefault("max_scan_bytes", 0)
+    return validate_sql(sql, **kwargs)
+
+
+def test_accepts_known_tables_and_columns():
+    sql = ("SELECT c.name, SUM(o.total) FROM customers c JOIN orders o ON o.customer_id = c.customer_id "
+           "GROUP BY c.name")
+    assert validate(sql) == {"query": sql, "status": "success"}
+
+
+def test_accepts_cte_names_as_tables():
+    sql = "WITH big AS (SELECT * FROM orders WHERE total > 100) SELECT * FROM big"
+    assert validate(sql)["status"] == "success"
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM orders", "Only SELECT statements"),
+    ("SELECT 1; SELECT 2", "exactly one SQL statement"),
+    ("SELECT * FROM invoices", "Unknown table(s): INVOICES"),
+    ("SELECT o.discount FROM orders o", "Unknown column DISCOUNT in table ORDERS"),
+])
+def test_rejects_invalid_queries(sql, message):
+    result = validate(sql)
+    assert result["status"] == "error"
+    assert message in result["error"]
+
+
+def test_appends_limit_only_to_unbounded_queries():
+    assert validate("SELECT * FROM orders;", default_limit=100)["query"] == "SELECT * FROM orders\nLIMIT 100"
+    assert validate("SELECT * FROM orders LIMIT 5", default_limit=100)["query"] == "SELECT * FROM orders LIMIT 5"
+    assert validate("SELECT TOP 5 * FROM orders", default_limit=100)["query"] == "SELECT TOP 5 * FROM orders"
+
+
+def test_estimate_query_cost_reads_explain_plan(monkeypatch):
+    cursor = FakeCursor(plan={"GlobalStats": {"bytesAssigned": 2048, "partitionsAssigned": 2,
+                                              "partitionsTotal": 10}})
+    monkeypatch.setattr(database_utils, "connection_pool", FakePool(cursor))
+
+    estimate = estimate_query_cost("SELECT * FROM orders")
+
+    assert cursor.executed == ["EXPLAIN USING JSON SELECT * FROM orders"]
+    assert estimate == {"bytes_assigned": 2048, "partitions_assigned": 2, "partitions_total": 10,
+                        "status": "success"}
+
+
+def test_estimate_query_cost_reports_errors(monkeypatch):
+    monkeypatch.setattr(database_utils, "connection_pool", FakePool(FakeCursor(error=RuntimeError("no warehouse"))))
+
+    estimate = estimate_query_cost("SELECT 1")
+
+    assert estimate["status"] == "error"
+    assert "no warehouse" in estimate["error"]
+
+
+def test_rejects_queries_over_the_scan_limit(monkeypatch):
+    cursor = FakeCursor(plan={"GlobalStats": {"bytesAssigned": 5000, "partitionsAssigned": 4,
+                                              "partitionsTotal": 4}})
+    monkeypatch.setattr(database_utils, "connection_pool", FakePool(cursor))
+
+    assert validate("SELECT * FROM orders", max_scan_bytes=10000)["status"] == "success"
+    result = validate("SELECT * FROM orders", max_scan_bytes=1000)
+    assert result["status"] == "error"
+    assert "5000 bytes" in result["error"]